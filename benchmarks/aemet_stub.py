@@ -0,0 +1,233 @@
+"""
+Local stand-in for the AEMET OpenData API, used by the benchmark harness.
+
+It speaks the same two-step protocol as the real service:
+  1. /opendata/api/... answers with metadata whose 'datos' field points to the payload.
+  2. /opendata/sh/... returns the payload (forecast or daily observed values).
+
+Latency, 429 / 5xx injection and payload size are configurable, so the pipeline
+can be measured under conditions close to a bad night at AEMET.
+
+Usage (standalone, e.g. to point a manual run at it through [pipeline] base_url)
+-----
+    python -m benchmarks.aemet_stub --port 8080 --latency 0.1 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+FORECAST_RE = re.compile(r'^/opendata/api/prediccion/especifica/municipio/horaria/(?P<postal>[^/]+)$')
+OBSERVED_RE = re.compile(
+    r'^/opendata/api/valores/climatologicos/diarios/datos/fechaini/(?P<start>[^/]+)/fechafin/(?P<end>[^/]+)'
+    r'/(?:estacion/(?P<station>[^/]+)|todasestaciones)$'
+)
+
+class StubAemet:
+    """
+    Threaded HTTP server imitating AEMET OpenData.
+
+    Parameters:
+        latency (float): Mean seconds added to every response.
+        jitter (float): Fraction of `latency` randomly added or removed (0.5 = +-50%).
+        error_rate (float): Probability of answering a request with a 503.
+        rate_limit_rate (float): Probability of answering a request with a 429.
+        retry_after (int or None): Retry-After header sent with 429 responses.
+        payload_kb (int): Extra kilobytes of padding added to every payload.
+        stations (iterable): Station codes returned by the 'todasestaciones' endpoint.
+        seed (int): Seed for the injected faults and generated values.
+    """
+    def __init__(self, latency=0.05, jitter=0.5, error_rate=0.0, rate_limit_rate=0.0, retry_after=None,
+                 payload_kb=0, stations=(), seed=None, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.padding = 'x' * (payload_kb * 1024)
+        self.stations = list(stations)
+        self.requests = 0
+        self.injected = {429: 0, 503: 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output clean
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/opendata/api"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='aemet-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # Request handling
+    # ------------------------------------------------------------------
+    def handle(self, request):
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            delay = self.latency * (1 + self.jitter * (2 * self._random.random() - 1))
+        time.sleep(max(delay, 0))
+
+        # Injected faults apply to both steps, like the real service
+        if roll < self.rate_limit_rate:
+            self._count_fault(429)
+            headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+            return self._send(request, 429, {'descripcion': 'Too Many Requests', 'estado': 429}, headers)
+        if roll < self.rate_limit_rate + self.error_rate:
+            self._count_fault(503)
+            return self._send(request, 503, {'descripcion': 'Service Unavailable', 'estado': 503})
+
+        path = unquote(request.path.split('?', 1)[0])
+        if path.startswith('/opendata/sh/'):
+            body = self.payload(path[len('/opendata/sh/'):])
+            if body is None:
+                return self._send(request, 404, {'descripcion': 'No hay datos', 'estado': 404})
+            return self._send(request, 200, body)
+
+        if FORECAST_RE.match(path) or OBSERVED_RE.match(path):
+            host, port = self.server.server_address[:2]
+            # The payload token is the metadata path itself, so step two needs no server-side state
+            token = path[len('/opendata/api/'):]
+            return self._send(request, 200, {
+                'descripcion': 'exito',
+                'estado': 200,
+                'datos': f"http://{host}:{port}/opendata/sh/{token}",
+                'metadatos': f"http://{host}:{port}/opendata/sh/metadatos",
+            })
+        return self._send(request, 404, {'descripcion': 'Not Found', 'estado': 404})
+
+    def payload(self, token):
+        """
+        Build the payload for a metadata path, or None when it is not a known endpoint.
+        """
+        path = '/opendata/api/' + token
+        match = FORECAST_RE.match(path)
+        if match:
+            return self.forecast_payload(match['postal'])
+        match = OBSERVED_RE.match(path)
+        if match:
+            stations = [match['station']] if match['station'] else self.stations
+            return self.observed_payload(stations, _parse_day(match['start']), _parse_day(match['end']))
+        return None
+
+    def forecast_payload(self, postal_code):
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        days = []
+        for offset in range(3):
+            day = today + timedelta(days=offset)
+            hours = [f"{h:02d}" for h in range(24)]
+            days.append({
+                'fecha': day.strftime('%Y-%m-%dT00:00:00'),
+                'temperatura': [{'value': str(self._value(8, 30)), 'periodo': h} for h in hours],
+                'humedadRelativa': [{'value': str(round(self._value(30, 95))), 'periodo': h} for h in hours],
+                'precipitacion': [{'value': '0', 'periodo': h} for h in hours],
+                'probPrecipitacion': [{'value': str(round(self._value(0, 100))), 'periodo': p}
+                                      for p in ('0208', '0814', '1420', '2002')],
+                'probTormenta': [{'value': '0', 'periodo': p} for p in ('0208', '0814', '1420', '2002')],
+            })
+        return [{
+            'origen': {'productor': 'Agencia Estatal de Meteorología - AEMET. Gobierno de España'},
+            'elaborado': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+            'nombre': f"Municipio {postal_code}",
+            'id': postal_code,
+            'prediccion': {'dia': days},
+            'padding': self.padding,
+        }]
+
+    def observed_payload(self, stations, start, end):
+        records = []
+        day = start
+        while day <= end:
+            for station in stations:
+                records.append({
+                    'fecha': day.strftime('%Y-%m-%d'),
+                    'indicativo': station,
+                    'nombre': f"ESTACION {station}",
+                    'tmed': _comma(self._value(10, 25)),
+                    'prec': _comma(self._value(0, 5)),
+                    'tmin': _comma(self._value(2, 12)),
+                    'tmax': _comma(self._value(20, 35)),
+                    'hrMedia': str(round(self._value(40, 80))),
+                    'hrMax': str(round(self._value(80, 100))),
+                    'hrMin': str(round(self._value(10, 40))),
+                })
+            day += timedelta(days=1)
+        if records and self.padding:
+            records[0]['padding'] = self.padding
+        return records
+
+    def _value(self, low, high):
+        with self._lock:
+            return round(self._random.uniform(low, high), 1)
+
+    def _count_fault(self, status):
+        with self._lock:
+            self.injected[status] += 1
+
+    @staticmethod
+    def _send(request, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode('latin-1', errors='replace')
+        request.send_response(status)
+        # AEMET serves ISO-8859-15 JSON
+        request.send_header('Content-Type', 'application/json;charset=ISO-8859-15')
+        request.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(data)
+
+def _parse_day(value):
+    return datetime.strptime(value[:10], '%Y-%m-%d')
+
+def _comma(value):
+    # AEMET uses a decimal comma in observed values
+    return f"{value:.1f}".replace('.', ',')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local AEMET OpenData stand-in.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 503 response")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probability of a 429 response")
+    parser.add_argument("--payload-kb", type=int, default=0, help="Extra padding per payload in KB")
+    parser.add_argument("--stations", nargs="*", default=[], help="Stations returned by 'todasestaciones'")
+    args = parser.parse_args()
+
+    stub = StubAemet(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                     payload_kb=args.payload_kb, stations=args.stations, port=args.port)
+    print(f"AEMET stand-in listening on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
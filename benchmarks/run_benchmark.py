@@ -0,0 +1,239 @@
+"""
+End-to-end throughput benchmark of run_pipeline against the local AEMET stand-in.
+
+Each scale runs in its own process with a throwaway PostgreSQL database created from
+southeast_spain_weather_db.sql and seeded with synthetic municipalities. The
+database is dropped afterwards. The server in --dsn must allow CREATE DATABASE
+and be PostgreSQL 12+ (the schema uses declarative partitioning with primary and
+foreign keys, and the loaders create partitions with bound expressions such as
+'2025-01-01'::date; the load stage COPYs into a staging table, then upserts with
+INSERT ... ON CONFLICT).
+
+Reported per scale: municipalities per minute, p50/p99 per-call HTTP latency and
+peak resident memory.
+
+Usage
+-----
+# Default scales (50, 200, 800 municipalities), server taken from config.ini [database]
+python -m benchmarks.run_benchmark
+
+# Slow, flaky AEMET, save results as a baseline
+python -m benchmarks.run_benchmark --municipalities 100 400 --latency 0.2 --error-rate 0.02 --output baseline.json
+
+# Compare against a saved baseline (exit code 1 on a throughput regression)
+python -m benchmarks.run_benchmark --municipalities 100 400 --compare baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import psycopg2
+from psycopg2.extensions import make_dsn
+
+from benchmarks.aemet_stub import StubAemet
+from src.db import ConnectionPool
+from src.metrics import Histogram
+from src.pipeline import read_db_config, run_pipeline
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SCHEMA_FILE = PROJECT_ROOT / 'southeast_spain_weather_db.sql'
+
+def default_dsn():
+    """
+    Maintenance-database DSN built from the [database] section of config.ini.
+    """
+    _, user, pwd, host, port = read_db_config()
+    return f"dbname=postgres user={user} password={pwd} host={host} port={port}"
+
+def create_scratch_db(dsn, name, municipalities):
+    """
+    Create database `name` with the project schema and `municipalities` synthetic rows.
+    Returns the DSN of the new database.
+    """
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {name};")
+        cur.execute(f"CREATE DATABASE {name};")
+    admin.close()
+
+    scratch_dsn = make_dsn(dsn, dbname=name)
+    conn = psycopg2.connect(scratch_dsn)
+    schema = SCHEMA_FILE.read_text(encoding='utf-8').replace('CREATE DATABASE southeast_spain_weather;', '')
+    with conn.cursor() as cur:
+        cur.execute(schema)
+        # Replace the real municipalities with as many synthetic ones as the scale needs
+        cur.execute("DELETE FROM municipalities;")
+        cur.executemany(
+            "INSERT INTO municipalities (postal_code, station_code, municipality_name, station_name, "
+            "latitude, longitude, province_id) VALUES (%s, %s, %s, %s, 38.0, -1.0, 1);",
+            [(f"{n:05d}", f"B{n:04d}", f"Bench {n}", f"BENCH {n}") for n in range(1, municipalities + 1)],
+        )
+    conn.commit()
+    conn.close()
+    return scratch_dsn
+
+def drop_scratch_db(dsn, name):
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE);")
+    admin.close()
+
+def peak_memory_mb():
+    """
+    Peak resident set size of this process in MB, or None where unsupported (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def http_latency(metrics):
+    """
+    Merge the per-endpoint latency histograms of a run into one.
+    """
+    merged = Histogram()
+    for histogram in metrics.http_latency.values():
+        merged.count += histogram.count
+        merged.sum += histogram.sum
+        merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+    return merged
+
+def run_scale(municipalities, args, results):
+    """
+    Benchmark one scale. Runs in a child process so peak memory is per scale.
+    """
+    name = f"weather_bench_{os.getpid()}"
+    scratch_dsn = create_scratch_db(args.dsn, name, municipalities)
+    stations = [f"B{n:04d}" for n in range(1, municipalities + 1)]
+
+    # run_pipeline writes its log and metrics files under ./logs
+    workdir = tempfile.mkdtemp(prefix='weather_bench_')
+    os.makedirs(os.path.join(workdir, 'logs'))
+    os.chdir(workdir)
+    os.environ['API_KEY_WEATHER'] = 'benchmark'
+
+    pool = ConnectionPool(maxconn=args.loaders + 1, dsn=scratch_dsn)
+
+    try:
+        with StubAemet(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                       retry_after=args.retry_after, payload_kb=args.payload_kb, stations=stations,
+                       seed=args.seed) as stub:
+            settings = {
+                'base_url': stub.base_url,
+                'workers': args.workers,
+                'request_interval': args.request_interval,
+                'observed_mode': args.observed_mode,
+                'loaders': args.loaders,
+            }
+            started = time.perf_counter()
+            metrics = run_pipeline(settings=settings, pool=pool, use_cache=False)
+            elapsed = time.perf_counter() - started
+
+        with pool.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT count(temperature_forecast_max), count(temperature_observed_max) "
+                        "FROM weather_records;")
+            forecast_rows, observed_rows = cur.fetchone()
+        pool_stats = pool.stats()
+
+        latency = http_latency(metrics)
+        results.put({
+            'municipalities': municipalities,
+            'seconds': round(elapsed, 2),
+            'municipalities_per_minute': round(municipalities / elapsed * 60, 1),
+            'http_requests': latency.count,
+            'http_p50_ms': _ms(latency.quantile(0.5)),
+            'http_p99_ms': _ms(latency.quantile(0.99)),
+            'retries': sum(metrics.http_retries.values()),
+            'injected_faults': dict(stub.injected),
+            'forecast_rows': forecast_rows,
+            'observed_rows': observed_rows,
+            'peak_memory_mb': peak_memory_mb(),
+            'db_pool_max_wait_ms': _ms(pool_stats['max_wait_seconds']),
+        })
+    finally:
+        pool.close()
+        drop_scratch_db(args.dsn, name)
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+def compare(results, baseline, tolerance):
+    """
+    Print throughput changes against a baseline and return the scales that regressed.
+    """
+    previous = {entry['municipalities']: entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        before = previous.get(entry['municipalities'])
+        if not before:
+            continue
+        change = entry['municipalities_per_minute'] / before['municipalities_per_minute'] - 1
+        print(f"{entry['municipalities']:>6} municipalities: {change:+.1%} throughput vs baseline")
+        if change < -tolerance:
+            regressions.append(entry['municipalities'])
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark run_pipeline against a local AEMET stand-in.")
+    parser.add_argument("--municipalities", type=int, nargs="+", default=[50, 200, 800],
+                        help="Municipality counts to benchmark")
+    parser.add_argument("--dsn", default=None,
+                        help="libpq DSN of a maintenance database (default: config.ini server, dbname=postgres)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--request-interval", type=float, default=0.0,
+                        help="Client rate limit in seconds between requests (AEMET needs ~1.2)")
+    parser.add_argument("--observed-mode", choices=["bulk", "station"], default="bulk")
+    parser.add_argument("--loaders", type=int, default=1, help="Concurrent load threads")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean stand-in latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 503 response")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probability of a 429 response")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After header sent with 429s")
+    parser.add_argument("--payload-kb", type=int, default=0, help="Extra padding per payload in KB")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON file from a previous --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed throughput drop against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+    args.dsn = args.dsn or default_dsn()
+
+    results = []
+    queue = multiprocessing.Queue()
+    for municipalities in args.municipalities:
+        process = multiprocessing.Process(target=run_scale, args=(municipalities, args, queue))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"{municipalities} municipalities: benchmark failed (exit code {process.exitcode})")
+            continue
+        results.append(queue.get())
+
+    print(f"{'munis':>6} {'secs':>8} {'munis/min':>10} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'retries':>8} {'peak MB':>8}")
+    for r in results:
+        print(f"{r['municipalities']:>6} {r['seconds']:>8} {r['municipalities_per_minute']:>10} "
+              f"{r['http_requests']:>9} {r['http_p50_ms']!s:>8} {r['http_p99_ms']!s:>8} "
+              f"{r['retries']:>8} {r['peak_memory_mb']!s:>8}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Throughput regression at {regressions} municipalities")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+-- Add the run_ledger table to an existing database.
+--
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/001_run_ledger.sql
+--
+-- Needed by every run (work registration, per-batch results) and by --resume.
+-- IF NOT EXISTS: the table may have been created by hand from the schema file.
+
+-- One row per run date, municipality and kind of data: lets an interrupted run resume
+CREATE TABLE IF NOT EXISTS run_ledger (
+    run_date DATE NOT NULL,
+    municipality_id INTEGER NOT NULL,
+    kind VARCHAR(8) NOT NULL CHECK (kind IN ('forecast', 'observed')),
+    status VARCHAR(7) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    last_error TEXT,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (run_date, municipality_id, kind)
+);
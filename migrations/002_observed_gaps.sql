@@ -0,0 +1,21 @@
+-- Add the observed_gaps table to an existing database.
+--
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/002_observed_gaps.sql
+--
+-- Needed by the gap re-poll of every run and by --gaps-only. The queue fills itself
+-- on the next run, which scans the lookback window for missing observed days.
+-- IF NOT EXISTS: the table may have been created by hand from the schema file.
+
+-- Re-poll queue of (municipality, day) pairs still without observed data
+CREATE TABLE IF NOT EXISTS observed_gaps (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    first_seen TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_attempt TIMESTAMPTZ,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, date)
+);
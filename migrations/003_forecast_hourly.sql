@@ -0,0 +1,49 @@
+-- Add the forecast_hourly table to an existing database.
+--
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/003_forecast_hourly.sql
+--
+-- Must run before 004_partition_weather_records.sql, which expects the table.
+-- Partitions for the current and the next month are created here; the pipeline creates
+-- the following ones ahead of time and the loaders any other they need (e.g. backfills).
+-- IF NOT EXISTS: the table may have been created by hand from the schema file, and a
+-- partial run of this file can be repeated.
+
+BEGIN;
+
+-- Typed hourly forecast for the next day, partitioned by month on date.
+-- prob_precipitation / prob_storm hold the probability of the AEMET period covering the hour.
+CREATE TABLE IF NOT EXISTS forecast_hourly (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    hour SMALLINT NOT NULL CHECK (hour BETWEEN 0 AND 23),
+    temperature REAL,
+    humidity REAL,
+    precipitation REAL,
+    prob_precipitation SMALLINT,
+    prob_storm SMALLINT,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, date, hour)
+) PARTITION BY RANGE (date);
+
+-- Threshold queries ("hours above 40 °C") and date-range scans
+CREATE INDEX IF NOT EXISTS forecast_hourly_temperature_idx ON forecast_hourly (temperature);
+CREATE INDEX IF NOT EXISTS forecast_hourly_date_brin ON forecast_hourly USING brin (date);
+
+-- forecast_hourly_YYYY_MM partitions for this month and the next
+DO $$
+DECLARE
+  month_start DATE;
+BEGIN
+  FOR i IN 0..1 LOOP
+    month_start := (date_trunc('month', current_date) + make_interval(months => i))::date;
+    EXECUTE format('CREATE TABLE IF NOT EXISTS forecast_hourly_%s PARTITION OF forecast_hourly '
+                   'FOR VALUES FROM (%L) TO (%L)',
+                   to_char(month_start, 'YYYY_MM'), month_start, (month_start + interval '1 month')::date);
+  END LOOP;
+END
+$$;
+
+COMMIT;
@@ -0,0 +1,78 @@
+-- Migrate an existing unpartitioned weather_records table to yearly range partitions on date.
+--
+-- Run once, in a maintenance window (the pipeline must not be running):
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/004_partition_weather_records.sql
+--
+-- Everything happens in one transaction: on any error the database is left untouched.
+
+BEGIN;
+
+-- Keep the old heap aside; its primary key index is renamed so the new table can take the name
+ALTER TABLE weather_records RENAME TO weather_records_unpartitioned;
+ALTER INDEX weather_records_pkey RENAME TO weather_records_unpartitioned_pkey;
+
+CREATE TABLE weather_records (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+
+    -- Forecast data (forecast for next 24 hours)
+    temperature_forecast_avg REAL,
+    temperature_forecast_max REAL,
+    temperature_forecast_min REAL,
+    humidity_forecast_avg REAL,
+    humidity_forecast_max REAL,
+    humidity_forecast_min REAL,
+    precipitations JSONB,
+    prob_precipitation JSONB,
+    prob_storm JSONB,
+
+    -- Observed data (measurements available after a few days)
+    temperature_observed_avg REAL,
+    temperature_observed_max REAL,
+    temperature_observed_min REAL,
+    humidity_observed_avg REAL,
+    humidity_observed_max REAL,
+    humidity_observed_min REAL,
+    precipitation REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, date)
+) PARTITION BY RANGE (date);
+
+CREATE INDEX weather_records_date_brin ON weather_records USING brin (date);
+
+-- One partition per year from the oldest stored day up to next year
+DO $$
+DECLARE
+  first_year INTEGER;
+  last_year INTEGER;
+  y INTEGER;
+BEGIN
+  SELECT extract(year FROM coalesce(min(date), current_date))::integer,
+         extract(year FROM greatest(max(date), current_date))::integer + 1
+  INTO first_year, last_year
+  FROM weather_records_unpartitioned;
+
+  FOR y IN first_year..last_year LOOP
+    EXECUTE format('CREATE TABLE weather_records_%s PARTITION OF weather_records FOR VALUES FROM (%L) TO (%L)',
+                   y, make_date(y, 1, 1), make_date(y + 1, 1, 1));
+  END LOOP;
+END
+$$;
+
+-- Rows are routed to their partition; inserting in date order keeps the BRIN index tight
+INSERT INTO weather_records
+SELECT * FROM weather_records_unpartitioned
+ORDER BY date, municipality_id;
+
+DROP TABLE weather_records_unpartitioned;
+
+-- forecast_hourly is already partitioned: only its date index changes to BRIN
+DROP INDEX IF EXISTS forecast_hourly_date_idx;
+CREATE INDEX IF NOT EXISTS forecast_hourly_date_brin ON forecast_hourly USING brin (date);
+
+COMMIT;
+
+ANALYZE weather_records;
@@ -0,0 +1,45 @@
+-- Add the forecast_errors table to an existing database.
+--
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/005_forecast_errors.sql
+--
+-- Then fill it from the stored history once:
+--   python -m src.pipeline --rebuild-forecast-errors
+
+-- Forecast skill per municipality and day: observed minus forecast, plus rolling mean
+-- absolute error (mae) and mean error (bias) over the last 7 / 30 days. Maintained
+-- incrementally by the loads (src/skill.py).
+CREATE TABLE forecast_errors (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+
+    -- Daily errors (observed - forecast)
+    temperature_avg_error REAL,
+    temperature_max_error REAL,
+    temperature_min_error REAL,
+    humidity_avg_error REAL,
+    humidity_max_error REAL,
+    humidity_min_error REAL,
+
+    -- Rolling windows over the days with errors, the day itself included
+    temperature_avg_mae_7d REAL,
+    temperature_avg_bias_7d REAL,
+    temperature_avg_mae_30d REAL,
+    temperature_avg_bias_30d REAL,
+    temperature_max_mae_7d REAL,
+    temperature_max_bias_7d REAL,
+    temperature_max_mae_30d REAL,
+    temperature_max_bias_30d REAL,
+    temperature_min_mae_7d REAL,
+    temperature_min_bias_7d REAL,
+    temperature_min_mae_30d REAL,
+    temperature_min_bias_30d REAL,
+    humidity_avg_mae_7d REAL,
+    humidity_avg_bias_7d REAL,
+    humidity_avg_mae_30d REAL,
+    humidity_avg_bias_30d REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, date)
+);
@@ -0,0 +1,49 @@
+-- Add the rollup tables to an existing database.
+--
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/006_rollups.sql
+--
+-- Then fill them from the stored history once:
+--   python -m src.pipeline --rebuild-rollups
+
+-- CREATE municipality_rollups TABLE
+-- Observed totals and extremes per municipality and period: 'month' (period_start = first
+-- day of the month) or 'hydro_year' (October to September, period_start = October 1st).
+-- Maintained incrementally by the loads (src/rollups.py): days -> months -> hydrological years.
+CREATE TABLE municipality_rollups (
+    municipality_id INTEGER NOT NULL,
+    period VARCHAR(10) NOT NULL CHECK (period IN ('month', 'hydro_year')),
+    period_start DATE NOT NULL,
+    precipitation_days INTEGER NOT NULL,     -- Days with a precipitation value
+    precipitation_sum REAL,                  -- Accumulated precipitation (mm)
+    precipitation_max REAL,                  -- Wettest day (mm)
+    rainy_days INTEGER NOT NULL,             -- Days with at least 1 mm
+    temperature_days INTEGER NOT NULL,       -- Days with an average temperature
+    temperature_avg REAL,
+    temperature_max REAL,
+    temperature_min REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, period, period_start)
+);
+
+-- CREATE province_rollups TABLE
+-- The same periods per province, over the rollups of its municipalities
+CREATE TABLE province_rollups (
+    province_id INTEGER NOT NULL,
+    period VARCHAR(10) NOT NULL CHECK (period IN ('month', 'hydro_year')),
+    period_start DATE NOT NULL,
+    municipalities INTEGER NOT NULL,         -- Municipalities with data in the period
+    precipitation_avg REAL,                  -- Mean of the municipality totals (mm)
+    precipitation_max REAL,                  -- Highest municipality total (mm)
+    precipitation_day_max REAL,              -- Wettest day in any municipality (mm)
+    temperature_avg REAL,
+    temperature_max REAL,
+    temperature_min REAL,
+
+    FOREIGN KEY (province_id) REFERENCES provinces(province_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (province_id, period, period_start)
+);
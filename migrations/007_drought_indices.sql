@@ -0,0 +1,27 @@
+-- Add the drought_indices table to an existing database.
+--
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/007_drought_indices.sql
+--
+-- Then compute the indices over the stored history once:
+--   python -m src.pipeline --rebuild-drought-indices
+
+-- CREATE drought_indices TABLE
+-- Monthly drought indicators per municipality, computed over the whole history by
+-- src/drought.py: SPI over 1/3/6/12-month accumulations (NULL until enough years
+-- exist to fit each calendar month) and the 12-month De Martonne aridity index.
+CREATE TABLE drought_indices (
+    municipality_id INTEGER NOT NULL,
+    month DATE NOT NULL,                     -- First day of the month
+    precipitation REAL,                      -- Monthly total (mm); NULL if too few days observed
+    temperature_avg REAL,                    -- Monthly mean temperature
+    spi_1 REAL,
+    spi_3 REAL,
+    spi_6 REAL,
+    spi_12 REAL,
+    de_martonne REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, month)
+);
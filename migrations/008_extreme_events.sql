@@ -0,0 +1,54 @@
+-- Add the event detector tables to an existing database.
+--
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/008_extreme_events.sql
+--
+-- Then replay the stored history through the detector once:
+--   python -m src.pipeline --rebuild-events
+
+-- CREATE extreme_events TABLE
+-- Extreme events detected by src/events.py as records are loaded: heavy rain episodes
+-- (DANA), heatwaves and storm forecasts. A running event is updated as it lasts.
+CREATE TABLE extreme_events (
+    municipality_id INTEGER NOT NULL,
+    event_type VARCHAR(20) NOT NULL CHECK (event_type IN ('heavy_rain', 'heatwave', 'storm_forecast')),
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,                  -- Last day so far
+    days INTEGER NOT NULL,
+    peak REAL,                               -- Wettest day (mm), hottest maximum (°C) or highest storm probability (%)
+    accumulated REAL,                        -- Observed or forecast precipitation over the event (mm)
+    detected_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, event_type, start_date)
+);
+
+CREATE INDEX extreme_events_end_date_idx ON extreme_events (end_date);
+
+-- CREATE event_detector_state TABLE
+-- Sliding windows of the event detector, one row per municipality, so a restart
+-- carries on from the last folded day without rescanning weather_records.
+CREATE TABLE event_detector_state (
+    municipality_id INTEGER PRIMARY KEY,
+    observed_date DATE,                      -- Last observed day folded in
+    rain_last REAL,                          -- Precipitation of that day (mm)
+    rain_before REAL,                        -- ... and of the day before
+    rain_start DATE,                         -- Open heavy rain episode
+    rain_days INTEGER,
+    rain_peak REAL,
+    rain_total REAL,
+    hot_start DATE,                          -- Current run of hot days
+    hot_days INTEGER,
+    hot_peak REAL,
+    forecast_date DATE,                      -- Last forecast day folded in
+    storm_start DATE,                        -- Current run of stormy forecast days
+    storm_days INTEGER,
+    storm_peak REAL,
+    storm_total REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE
+);
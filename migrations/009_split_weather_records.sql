@@ -0,0 +1,159 @@
+-- Split the wide weather_records table into weather_forecasts and weather_observations,
+-- and put a weather_records view with the same columns in its place.
+--
+-- Run once, in a maintenance window (the pipeline must not be running):
+--   psql -d southeast_spain_weather -v ON_ERROR_STOP=1 -f migrations/009_split_weather_records.sql
+--
+-- Everything happens in one transaction: on any error the database is left untouched.
+-- The data is copied with one INSERT ... SELECT per table; the primary keys are added
+-- after the copy, which is much faster than maintaining them row by row.
+
+BEGIN;
+
+ALTER TABLE weather_records RENAME TO weather_records_combined;
+
+-- CREATE weather_forecasts TABLE
+-- Next-day forecast summary per municipality and day, written once by the daily run
+CREATE TABLE weather_forecasts (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    temperature_forecast_avg REAL,
+    temperature_forecast_max REAL,
+    temperature_forecast_min REAL,
+    humidity_forecast_avg REAL,
+    humidity_forecast_max REAL,
+    humidity_forecast_min REAL,
+    precipitations JSONB,
+    prob_precipitation JSONB,
+    prob_storm JSONB,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE
+) PARTITION BY RANGE (date);
+CREATE INDEX weather_forecasts_date_brin ON weather_forecasts USING brin (date);
+
+-- CREATE weather_observations TABLE
+-- Observed daily values per municipality and day (measurements available after a few days)
+CREATE TABLE weather_observations (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    temperature_observed_avg REAL,
+    temperature_observed_max REAL,
+    temperature_observed_min REAL,
+    humidity_observed_avg REAL,
+    humidity_observed_max REAL,
+    humidity_observed_min REAL,
+    precipitation REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE
+) PARTITION BY RANGE (date);
+CREATE INDEX weather_observations_date_brin ON weather_observations USING brin (date);
+
+-- Yearly partitions (weather_forecasts_YYYY, weather_observations_YYYY) are created by the
+-- pipeline ahead of time and on demand by the loaders; retention drops whole partitions.
+-- Rows arrive roughly in date order, so BRIN indexes serve date-range scans at a tiny size.
+
+
+-- One partition per year and table from the oldest stored day up to next year
+DO $$
+DECLARE
+  first_year INTEGER;
+  last_year INTEGER;
+  y INTEGER;
+BEGIN
+  SELECT extract(year FROM coalesce(min(date), current_date))::integer,
+         extract(year FROM greatest(max(date), current_date))::integer + 1
+  INTO first_year, last_year
+  FROM weather_records_combined;
+
+  FOR y IN first_year..last_year LOOP
+    EXECUTE format('CREATE TABLE weather_forecasts_%s PARTITION OF weather_forecasts FOR VALUES FROM (%L) TO (%L)',
+                   y, make_date(y, 1, 1), make_date(y + 1, 1, 1));
+    EXECUTE format('CREATE TABLE weather_observations_%s PARTITION OF weather_observations FOR VALUES FROM (%L) TO (%L)',
+                   y, make_date(y, 1, 1), make_date(y + 1, 1, 1));
+  END LOOP;
+END
+$$;
+
+SET LOCAL maintenance_work_mem = '512MB';
+
+-- Only days that have values of each kind; date order keeps the BRIN indexes tight
+INSERT INTO weather_forecasts (municipality_id, date, temperature_forecast_avg, temperature_forecast_max, temperature_forecast_min, humidity_forecast_avg, humidity_forecast_max, humidity_forecast_min, precipitations, prob_precipitation, prob_storm)
+SELECT municipality_id, date, temperature_forecast_avg, temperature_forecast_max, temperature_forecast_min, humidity_forecast_avg, humidity_forecast_max, humidity_forecast_min, precipitations, prob_precipitation, prob_storm
+FROM weather_records_combined
+WHERE num_nonnulls(temperature_forecast_avg, temperature_forecast_max, temperature_forecast_min, humidity_forecast_avg, humidity_forecast_max, humidity_forecast_min, precipitations, prob_precipitation, prob_storm) > 0
+ORDER BY date, municipality_id;
+
+INSERT INTO weather_observations (municipality_id, date, temperature_observed_avg, temperature_observed_max, temperature_observed_min, humidity_observed_avg, humidity_observed_max, humidity_observed_min, precipitation)
+SELECT municipality_id, date, temperature_observed_avg, temperature_observed_max, temperature_observed_min, humidity_observed_avg, humidity_observed_max, humidity_observed_min, precipitation
+FROM weather_records_combined
+WHERE num_nonnulls(temperature_observed_avg, temperature_observed_max, temperature_observed_min, humidity_observed_avg, humidity_observed_max, humidity_observed_min, precipitation) > 0
+ORDER BY date, municipality_id;
+
+ALTER TABLE weather_forecasts ADD PRIMARY KEY (municipality_id, date);
+ALTER TABLE weather_observations ADD PRIMARY KEY (municipality_id, date);
+
+-- Drops the old yearly partitions with it
+DROP TABLE weather_records_combined;
+
+-- CREATE weather_records VIEW
+-- The forecast and the observation of a day side by side, with the columns of the former
+-- weather_records table, for the notebook, the tools and ad-hoc queries (read-only).
+-- Written as a UNION ALL rather than a FULL JOIN so filters on municipality_id and date
+-- reach the indexes and partitions of both tables.
+CREATE VIEW weather_records AS
+SELECT
+    f.municipality_id,
+    f.date,
+    f.temperature_forecast_avg,
+    f.temperature_forecast_max,
+    f.temperature_forecast_min,
+    f.humidity_forecast_avg,
+    f.humidity_forecast_max,
+    f.humidity_forecast_min,
+    f.precipitations,
+    f.prob_precipitation,
+    f.prob_storm,
+    o.temperature_observed_avg,
+    o.temperature_observed_max,
+    o.temperature_observed_min,
+    o.humidity_observed_avg,
+    o.humidity_observed_max,
+    o.humidity_observed_min,
+    o.precipitation
+FROM weather_forecasts f
+LEFT JOIN weather_observations o
+  ON o.municipality_id = f.municipality_id AND o.date = f.date
+UNION ALL
+SELECT
+    o.municipality_id,
+    o.date,
+    NULL::real,
+    NULL::real,
+    NULL::real,
+    NULL::real,
+    NULL::real,
+    NULL::real,
+    NULL::jsonb,
+    NULL::jsonb,
+    NULL::jsonb,
+    o.temperature_observed_avg,
+    o.temperature_observed_max,
+    o.temperature_observed_min,
+    o.humidity_observed_avg,
+    o.humidity_observed_max,
+    o.humidity_observed_min,
+    o.precipitation
+FROM weather_observations o
+WHERE NOT EXISTS (
+  SELECT 1 FROM weather_forecasts f
+  WHERE f.municipality_id = o.municipality_id AND f.date = o.date
+);
+
+COMMIT;
+
+ANALYZE weather_forecasts;
+ANALYZE weather_observations;
@@ -86,12 +86,11 @@ VALUES
 ('04006','6364X','Albox','ALBOX',37.388507,-2.147991,4);
 
 
--- CREATE weather_recordsTABLE
-CREATE TABLE weather_records (
+-- CREATE weather_forecasts TABLE
+-- Next-day forecast summary per municipality and day, written once by the daily run
+CREATE TABLE weather_forecasts (
     municipality_id INTEGER NOT NULL,
     date DATE NOT NULL,
-    
-    -- Forecast data (forecast for next 24 hours)
     temperature_forecast_avg REAL,
     temperature_forecast_max REAL,
     temperature_forecast_min REAL,
@@ -102,7 +101,18 @@ CREATE TABLE weather_records (
     prob_precipitation JSONB,
     prob_storm JSONB,
 
-    -- Observed data (measurements available after a few days)
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, date)
+) PARTITION BY RANGE (date);
+CREATE INDEX weather_forecasts_date_brin ON weather_forecasts USING brin (date);
+
+-- CREATE weather_observations TABLE
+-- Observed daily values per municipality and day (measurements available after a few days)
+CREATE TABLE weather_observations (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
     temperature_observed_avg REAL,
     temperature_observed_max REAL,
     temperature_observed_min REAL,
@@ -111,8 +121,282 @@ CREATE TABLE weather_records (
     humidity_observed_min REAL,
     precipitation REAL,
 
-    FOREIGN KEY (municipality_id) REFERENCES MUNICIPALITIES(municipality_id) 
-      ON DELETE CASCADE 
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
       ON UPDATE CASCADE,
     PRIMARY KEY (municipality_id, date)
-);
\ No newline at end of file
+) PARTITION BY RANGE (date);
+CREATE INDEX weather_observations_date_brin ON weather_observations USING brin (date);
+
+-- Yearly partitions (weather_forecasts_YYYY, weather_observations_YYYY) are created by the
+-- pipeline ahead of time and on demand by the loaders; retention drops whole partitions.
+-- Rows arrive roughly in date order, so BRIN indexes serve date-range scans at a tiny size.
+
+-- CREATE weather_records VIEW
+-- The forecast and the observation of a day side by side, with the columns of the former
+-- weather_records table, for the notebook, the tools and ad-hoc queries (read-only).
+-- Written as a UNION ALL rather than a FULL JOIN so filters on municipality_id and date
+-- reach the indexes and partitions of both tables.
+CREATE VIEW weather_records AS
+SELECT
+    f.municipality_id,
+    f.date,
+    f.temperature_forecast_avg,
+    f.temperature_forecast_max,
+    f.temperature_forecast_min,
+    f.humidity_forecast_avg,
+    f.humidity_forecast_max,
+    f.humidity_forecast_min,
+    f.precipitations,
+    f.prob_precipitation,
+    f.prob_storm,
+    o.temperature_observed_avg,
+    o.temperature_observed_max,
+    o.temperature_observed_min,
+    o.humidity_observed_avg,
+    o.humidity_observed_max,
+    o.humidity_observed_min,
+    o.precipitation
+FROM weather_forecasts f
+LEFT JOIN weather_observations o
+  ON o.municipality_id = f.municipality_id AND o.date = f.date
+UNION ALL
+SELECT
+    o.municipality_id,
+    o.date,
+    NULL::real,
+    NULL::real,
+    NULL::real,
+    NULL::real,
+    NULL::real,
+    NULL::real,
+    NULL::jsonb,
+    NULL::jsonb,
+    NULL::jsonb,
+    o.temperature_observed_avg,
+    o.temperature_observed_max,
+    o.temperature_observed_min,
+    o.humidity_observed_avg,
+    o.humidity_observed_max,
+    o.humidity_observed_min,
+    o.precipitation
+FROM weather_observations o
+WHERE NOT EXISTS (
+  SELECT 1 FROM weather_forecasts f
+  WHERE f.municipality_id = o.municipality_id AND f.date = o.date
+);
+
+-- CREATE run_ledger TABLE
+-- One row per run date, municipality and kind of data: lets an interrupted run resume
+CREATE TABLE run_ledger (
+    run_date DATE NOT NULL,
+    municipality_id INTEGER NOT NULL,
+    kind VARCHAR(8) NOT NULL CHECK (kind IN ('forecast', 'observed')),
+    status VARCHAR(7) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    last_error TEXT,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (run_date, municipality_id, kind)
+);
+
+
+-- CREATE observed_gaps TABLE
+-- Re-poll queue of (municipality, day) pairs still without observed data
+CREATE TABLE observed_gaps (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    first_seen TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_attempt TIMESTAMPTZ,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, date)
+);
+
+
+-- CREATE forecast_hourly TABLE
+-- Typed hourly forecast for the next day, partitioned by month on date.
+-- Monthly partitions (forecast_hourly_YYYY_MM) are created by the pipeline as data arrives.
+-- prob_precipitation / prob_storm hold the probability of the AEMET period covering the hour.
+CREATE TABLE forecast_hourly (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    hour SMALLINT NOT NULL CHECK (hour BETWEEN 0 AND 23),
+    temperature REAL,
+    humidity REAL,
+    precipitation REAL,
+    prob_precipitation SMALLINT,
+    prob_storm SMALLINT,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, date, hour)
+) PARTITION BY RANGE (date);
+
+-- Threshold queries ("hours above 40 °C") and date-range scans
+CREATE INDEX forecast_hourly_temperature_idx ON forecast_hourly (temperature);
+CREATE INDEX forecast_hourly_date_brin ON forecast_hourly USING brin (date);
+
+
+-- CREATE forecast_errors TABLE
+-- Forecast skill per municipality and day: observed minus forecast, plus rolling mean
+-- absolute error (mae) and mean error (bias) over the last 7 / 30 days. Maintained
+-- incrementally by the loads (src/skill.py).
+CREATE TABLE forecast_errors (
+    municipality_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+
+    -- Daily errors (observed - forecast)
+    temperature_avg_error REAL,
+    temperature_max_error REAL,
+    temperature_min_error REAL,
+    humidity_avg_error REAL,
+    humidity_max_error REAL,
+    humidity_min_error REAL,
+
+    -- Rolling windows over the days with errors, the day itself included
+    temperature_avg_mae_7d REAL,
+    temperature_avg_bias_7d REAL,
+    temperature_avg_mae_30d REAL,
+    temperature_avg_bias_30d REAL,
+    temperature_max_mae_7d REAL,
+    temperature_max_bias_7d REAL,
+    temperature_max_mae_30d REAL,
+    temperature_max_bias_30d REAL,
+    temperature_min_mae_7d REAL,
+    temperature_min_bias_7d REAL,
+    temperature_min_mae_30d REAL,
+    temperature_min_bias_30d REAL,
+    humidity_avg_mae_7d REAL,
+    humidity_avg_bias_7d REAL,
+    humidity_avg_mae_30d REAL,
+    humidity_avg_bias_30d REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, date)
+);
+
+
+-- CREATE municipality_rollups TABLE
+-- Observed totals and extremes per municipality and period: 'month' (period_start = first
+-- day of the month) or 'hydro_year' (October to September, period_start = October 1st).
+-- Maintained incrementally by the loads (src/rollups.py): days -> months -> hydrological years.
+CREATE TABLE municipality_rollups (
+    municipality_id INTEGER NOT NULL,
+    period VARCHAR(10) NOT NULL CHECK (period IN ('month', 'hydro_year')),
+    period_start DATE NOT NULL,
+    precipitation_days INTEGER NOT NULL,     -- Days with a precipitation value
+    precipitation_sum REAL,                  -- Accumulated precipitation (mm)
+    precipitation_max REAL,                  -- Wettest day (mm)
+    rainy_days INTEGER NOT NULL,             -- Days with at least 1 mm
+    temperature_days INTEGER NOT NULL,       -- Days with an average temperature
+    temperature_avg REAL,
+    temperature_max REAL,
+    temperature_min REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, period, period_start)
+);
+
+-- CREATE province_rollups TABLE
+-- The same periods per province, over the rollups of its municipalities
+CREATE TABLE province_rollups (
+    province_id INTEGER NOT NULL,
+    period VARCHAR(10) NOT NULL CHECK (period IN ('month', 'hydro_year')),
+    period_start DATE NOT NULL,
+    municipalities INTEGER NOT NULL,         -- Municipalities with data in the period
+    precipitation_avg REAL,                  -- Mean of the municipality totals (mm)
+    precipitation_max REAL,                  -- Highest municipality total (mm)
+    precipitation_day_max REAL,              -- Wettest day in any municipality (mm)
+    temperature_avg REAL,
+    temperature_max REAL,
+    temperature_min REAL,
+
+    FOREIGN KEY (province_id) REFERENCES provinces(province_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (province_id, period, period_start)
+);
+
+
+-- CREATE drought_indices TABLE
+-- Monthly drought indicators per municipality, computed over the whole history by
+-- src/drought.py: SPI over 1/3/6/12-month accumulations (NULL until enough years
+-- exist to fit each calendar month) and the 12-month De Martonne aridity index.
+CREATE TABLE drought_indices (
+    municipality_id INTEGER NOT NULL,
+    month DATE NOT NULL,                     -- First day of the month
+    precipitation REAL,                      -- Monthly total (mm); NULL if too few days observed
+    temperature_avg REAL,                    -- Monthly mean temperature
+    spi_1 REAL,
+    spi_3 REAL,
+    spi_6 REAL,
+    spi_12 REAL,
+    de_martonne REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, month)
+);
+
+
+-- CREATE extreme_events TABLE
+-- Extreme events detected by src/events.py as records are loaded: heavy rain episodes
+-- (DANA), heatwaves and storm forecasts. A running event is updated as it lasts.
+CREATE TABLE extreme_events (
+    municipality_id INTEGER NOT NULL,
+    event_type VARCHAR(20) NOT NULL CHECK (event_type IN ('heavy_rain', 'heatwave', 'storm_forecast')),
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,                  -- Last day so far
+    days INTEGER NOT NULL,
+    peak REAL,                               -- Wettest day (mm), hottest maximum (°C) or highest storm probability (%)
+    accumulated REAL,                        -- Observed or forecast precipitation over the event (mm)
+    detected_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE,
+    PRIMARY KEY (municipality_id, event_type, start_date)
+);
+
+CREATE INDEX extreme_events_end_date_idx ON extreme_events (end_date);
+
+-- CREATE event_detector_state TABLE
+-- Sliding windows of the event detector, one row per municipality, so a restart
+-- carries on from the last folded day without rescanning weather_records.
+CREATE TABLE event_detector_state (
+    municipality_id INTEGER PRIMARY KEY,
+    observed_date DATE,                      -- Last observed day folded in
+    rain_last REAL,                          -- Precipitation of that day (mm)
+    rain_before REAL,                        -- ... and of the day before
+    rain_start DATE,                         -- Open heavy rain episode
+    rain_days INTEGER,
+    rain_peak REAL,
+    rain_total REAL,
+    hot_start DATE,                          -- Current run of hot days
+    hot_days INTEGER,
+    hot_peak REAL,
+    forecast_date DATE,                      -- Last forecast day folded in
+    storm_start DATE,                        -- Current run of stormy forecast days
+    storm_days INTEGER,
+    storm_peak REAL,
+    storm_total REAL,
+
+    FOREIGN KEY (municipality_id) REFERENCES municipalities(municipality_id)
+      ON DELETE CASCADE
+      ON UPDATE CASCADE
+);
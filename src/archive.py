@@ -0,0 +1,90 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Kinds of payload kept in the archive
+KINDS = ('forecast', 'observed', 'observed_all')
+# File name used for payloads that are not tied to one municipality
+ALL = 'all'
+
+class RawArchive:
+    """
+    Permanent, date-partitioned store of raw AEMET payloads.
+
+    Payloads are written gzip-compressed to
+    <root>/<kind>/<YYYY>/<MM>/<YYYY-MM-DD>/<municipality_id or 'all'>.json.gz,
+    where the date is the day the data describes (observed) or the day it was
+    issued (forecast). Unlike the response cache nothing ever expires, so history
+    can be recomputed whenever the transforms change.
+    """
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, kind, day, key):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown archive kind: {kind}")
+        return self.root / kind / f"{day:%Y}" / f"{day:%m}" / f"{day:%Y-%m-%d}" / f"{key}.json.gz"
+
+    def put(self, kind, day, key, data):
+        """
+        Store one payload, replacing an earlier one for the same kind, day and key.
+        """
+        path = self._path(kind, day, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file and rename, so readers never see partial payloads
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def put_observed(self, data, key=ALL):
+        """
+        Split an observed payload by its 'fecha' and store one file per day.
+        key is a municipality_id for single-station payloads, ALL for 'todasestaciones'.
+        """
+        if not data or not isinstance(data, list):
+            return
+        by_day = {}
+        for record in data:
+            fecha = record.get('fecha')
+            if fecha:
+                by_day.setdefault(fecha, []).append(record)
+
+        kind = 'observed_all' if key == ALL else 'observed'
+        for fecha, records in by_day.items():
+            try:
+                day = datetime.strptime(fecha, '%Y-%m-%d')
+            except (TypeError, ValueError):
+                # The other days of the payload are still archived
+                logging.warning(f"Archive - Skipping {len(records)} observed records with malformed fecha {fecha!r}")
+                continue
+            self.put(kind, day, key, records)
+
+    @staticmethod
+    def load(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def entries(self, kind, start_date, end_date):
+        """
+        List the archived payloads of a kind over an inclusive date range.
+
+        Returns:
+            list of (date, key, path) tuples, in date order. key is an int
+            municipality_id or ALL.
+        """
+        entries = []
+        day = start_date
+        while day <= end_date:
+            directory = self._path(kind, day, ALL).parent
+            if directory.is_dir():
+                for path in sorted(directory.glob('*.json.gz')):
+                    name = path.name[:-len('.json.gz')]
+                    entries.append((day, ALL if name == ALL else int(name), path))
+            day += timedelta(days=1)
+        return entries
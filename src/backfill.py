@@ -0,0 +1,204 @@
+"""
+Usage
+-----
+# Backfill observed data for every municipality over a date range (inclusive)
+python -m src.backfill --start 2025-01-01 --end 2025-03-31
+
+# Backfill only some municipalities
+python -m src.backfill --start 2025-01-01 --end 2025-03-31 --municipality_id 3 17 23
+"""
+import argparse
+import logging
+import math
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from .extract import (MAX_OBSERVED_WINDOW_DAYS, MAX_OBSERVED_ALL_WINDOW_DAYS, split_date_range,
+                      get_observed_range_raw, get_observed_all_range_raw)
+from .transform import index_by_station, transform_observed_range
+from .load import load_observed_batch
+from .metrics import Metrics
+from .archive import ALL
+from .pipeline import (get_pool, read_pipeline_config, setup_logging, build_client, build_archive, archive_safely,
+                       update_observed_aggregates, update_drought_indices, report_connection_stats,
+                       report_pool_stats)
+
+# One unit of backfill work: a fechaini/fechafin window for one or all stations.
+# mode is 'station' (one station per request) or 'bulk' (all stations per request);
+# municipalities is a list of (municipality_id, station_code) pairs.
+BackfillChunk = namedtuple('BackfillChunk', ['mode', 'municipalities', 'start', 'end'])
+
+def plan_backfill(municipalities, start_date, end_date):
+    """
+    Split a backfill into the largest windows AEMET accepts, choosing the
+    per-station or all-stations endpoint depending on which needs fewer requests.
+
+    Returns:
+        list of BackfillChunk
+    """
+    days = (end_date - start_date).days + 1
+    station_requests = len(municipalities) * math.ceil(days / MAX_OBSERVED_WINDOW_DAYS)
+    bulk_requests = math.ceil(days / MAX_OBSERVED_ALL_WINDOW_DAYS)
+
+    if bulk_requests < station_requests:
+        return [
+            BackfillChunk('bulk', list(municipalities), window_start, window_end)
+            for window_start, window_end in split_date_range(start_date, end_date, MAX_OBSERVED_ALL_WINDOW_DAYS)
+        ]
+
+    return [
+        BackfillChunk('station', [(municipality_id, station_code)], window_start, window_end)
+        for municipality_id, station_code in municipalities
+        for window_start, window_end in split_date_range(start_date, end_date, MAX_OBSERVED_WINDOW_DAYS)
+    ]
+
+def extract_chunk(chunk, api_key, client):
+    """
+    Fetch the raw observed payload for one chunk (runs inside a worker thread).
+    """
+    if chunk.mode == 'bulk':
+        # Only the records of the chunk's stations are kept from the streamed payload
+        return get_observed_all_range_raw(chunk.start, chunk.end, api_key, client=client,
+                                          station_codes=[station_code for _, station_code in chunk.municipalities])
+
+    municipality_id, station_code = chunk.municipalities[0]
+    return get_observed_range_raw(municipality_id, station_code, chunk.start, chunk.end,
+                                  api_key, client=client)
+
+def transform_chunk(chunk, raw_json):
+    """
+    Turn every day of a chunk's payload into observed records for its municipalities.
+    """
+    if chunk.mode == 'bulk':
+        index = index_by_station(raw_json)
+        return [
+            record
+            for municipality_id, station_code in chunk.municipalities
+            for record in transform_observed_range(index.get(station_code), municipality_id)
+        ]
+
+    municipality_id, _ = chunk.municipalities[0]
+    return transform_observed_range(raw_json, municipality_id)
+
+def describe_chunk(chunk):
+    """Short label for progress messages."""
+    if chunk.mode == 'bulk':
+        target = f"{len(chunk.municipalities)} municipalities"
+    else:
+        target = f"municipality {chunk.municipalities[0][0]}"
+    return f"{target} {chunk.start:%Y-%m-%d}..{chunk.end:%Y-%m-%d}"
+
+def process_chunk(chunk, api_key, client, pool, metrics, archive=None):
+    """
+    Fetch, transform and load one chunk (runs inside a worker thread).
+    Each worker borrows its own pooled connection, so chunks are written concurrently.
+
+    Returns:
+        int: number of records loaded.
+    """
+    raw_json = extract_chunk(chunk, api_key, client)
+    if raw_json is None:
+        raise RuntimeError("fetch failed")
+    if archive:
+        archive_safely(archive.put_observed, raw_json, ALL if chunk.mode == 'bulk' else chunk.municipalities[0][0])
+    with metrics.timer('transform_observed_range'):
+        records = transform_chunk(chunk, raw_json)
+    with metrics.timer('load'), pool.connection() as conn:
+        with conn.cursor() as cursor:
+            load_observed_batch(cursor, records)
+            update_observed_aggregates(cursor, records)
+        conn.commit()
+    metrics.add_rows('load_observed', len(records))
+    return len(records)
+
+def run_backfill(start_date, end_date, municipality_ids=None):
+    """
+    Backfill observed data for a set of municipalities over an inclusive date range.
+    Chunks are fetched, transformed, bulk-loaded and committed concurrently by worker
+    threads sharing the connection pool; progress is reported per chunk.
+
+    Returns:
+        list of chunks that could not be fetched or loaded.
+    """
+    setup_logging()
+    settings = read_pipeline_config()
+    metrics = Metrics()
+    pool = get_pool()
+
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT municipality_id, station_code FROM municipalities ORDER BY municipality_id;")
+        municipalities = [
+            (municipality_id, station_code) for municipality_id, station_code in cursor.fetchall()
+            if not municipality_ids or municipality_id in municipality_ids
+        ]
+
+    load_dotenv()
+    api_key = os.getenv('API_KEY_WEATHER')
+    client = build_client(api_key, settings, metrics)
+    archive = build_archive()
+
+    chunks = plan_backfill(municipalities, start_date, end_date)
+    print(f"Backfill {start_date:%Y-%m-%d}..{end_date:%Y-%m-%d}: "
+          f"{len(municipalities)} municipalities in {len(chunks)} chunks")
+
+    failed_chunks = []
+    with ThreadPoolExecutor(max_workers=settings['workers']) as executor:
+        futures = {
+            executor.submit(process_chunk, chunk, api_key, client, pool, metrics, archive): chunk
+            for chunk in chunks
+        }
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            chunk = futures[future]
+            label = describe_chunk(chunk)
+            try:
+                loaded = future.result()
+            except Exception as e:
+                logging.error(f"Backfill {label}: {e}")
+                print(f"[{done}/{len(chunks)}] {label}: FAILED ({e})")
+                failed_chunks.append(chunk)
+                continue
+
+            logging.info(f"Backfill {label}: {loaded} records loaded")
+            print(f"[{done}/{len(chunks)}] {label}: {loaded} records loaded")
+
+    # Indices of the backfilled months and of the 12-month windows after them
+    try:
+        with metrics.timer('drought_indices'):
+            update_drought_indices(pool, start_date.date().replace(day=1))
+    except Exception as e:
+        logging.error(f"Drought index update failed: {e}")
+
+    report_connection_stats(client)
+    report_pool_stats(pool)
+    client.close()
+    metrics.write('logs', basename='backfill_metrics')
+
+    if failed_chunks:
+        print(f"Failed chunks: {[describe_chunk(chunk) for chunk in failed_chunks]}")
+    return failed_chunks
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill observed data over a date range.")
+    parser.add_argument("--start", required=True, help="First date to backfill (YYYY-MM-DD).")
+    parser.add_argument("--end", required=True, help="Last date to backfill, inclusive (YYYY-MM-DD).")
+    parser.add_argument("--municipality_id", type=int, nargs="+",
+                        help="Municipality identifiers to backfill (default: all).")
+    args = parser.parse_args()
+
+    try:
+        start_date = datetime.strptime(args.start, "%Y-%m-%d")
+        end_date = datetime.strptime(args.end, "%Y-%m-%d")
+    except ValueError:
+        parser.error("--start and --end must be in YYYY-MM-DD format.")
+    if end_date < start_date:
+        parser.error("--end must not be before --start.")
+
+    run_backfill(start_date, end_date, args.municipality_id)
+
+if __name__ == "__main__":
+    main()
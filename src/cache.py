@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+# Default time-to-live per endpoint class in seconds (None = never expires).
+# Observed daily values do not change once AEMET publishes them; forecasts are
+# re-issued several times a day.
+DEFAULT_TTLS = {
+    'OBSERVED': None,
+    'OBSERVED_ALL': None,
+    'STATIONS': None,
+    'FORECAST': 6 * 3600,
+}
+# Default upper bound for the total size of the cache directory in bytes
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of raw AEMET payloads.
+
+    Entries are keyed by a hash of the endpoint URL and parameters and stored
+    gzip-compressed under <root>/<endpoint class>/<xx>/<key>.json.gz. Each
+    endpoint class has its own TTL, measured from the time the entry was
+    written. When the directory grows past `max_bytes`, the least recently
+    used entries are deleted. In offline mode the cache is the only source of
+    data: expired entries are still served and misses are never fetched.
+    """
+    def __init__(self, root, ttls=None, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.root = Path(root)
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None  # Total bytes on disk, computed lazily
+
+    @staticmethod
+    def key(url, params=None):
+        """
+        Stable hash of an endpoint URL and its query parameters.
+        """
+        raw = json.dumps([url, sorted((params or {}).items())], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, endpoint_class, key):
+        return self.root / endpoint_class / key[:2] / f"{key}.json.gz"
+
+    def get(self, endpoint_class, url, params=None):
+        """
+        Return the cached payload, or None when missing or expired
+        (expired entries are still returned in offline mode).
+        """
+        path = self._path(endpoint_class, self.key(url, params))
+        try:
+            stat = path.stat()
+            ttl = self.ttls.get(endpoint_class)
+            if ttl is not None and time.time() - stat.st_mtime > ttl and not self.offline:
+                self._count(hit=False)
+                return None
+
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # Missing, being evicted concurrently, or corrupt: treat as a miss
+            self._count(hit=False)
+            return None
+
+        # Record the access time for LRU eviction while keeping mtime as the write time
+        try:
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            pass
+        self._count(hit=True)
+        return data
+
+    def put(self, endpoint_class, url, data, params=None):
+        """
+        Store a payload, then evict old entries if the size bound is exceeded.
+        """
+        path = self._path(endpoint_class, self.key(url, params))
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file and rename, so readers never see partial entries
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += path.stat().st_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entries(self):
+        return [p for p in self.root.glob('*/*/*.json.gz') if p.is_file()]
+
+    def _disk_usage(self):
+        return sum(p.stat().st_size for p in self._entries())
+
+    def _evict(self):
+        """
+        Delete least recently used entries until the cache is back under 90% of max_bytes.
+        Must be called with the lock held.
+        """
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        entries.sort()
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            size -= entry_size
+            removed += 1
+
+        self._size = size
+        logging.info(f"CACHE - Evicted {removed} entries, {size} bytes left")
@@ -0,0 +1,65 @@
+import configparser
+import threading
+from pathlib import Path, PurePath
+
+# Project root (config.ini and the default data directories live here)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CONFIG_PATH = PROJECT_ROOT / 'config.ini'
+
+# Default of a key that has none: read_section raises KeyError when it is missing
+REQUIRED = object()
+
+# Parser method for each typed key; anything else is read as a string
+_GETTERS = {
+    bool: configparser.ConfigParser.getboolean,
+    int: configparser.ConfigParser.getint,
+    float: configparser.ConfigParser.getfloat,
+}
+
+_config = None
+_config_lock = threading.Lock()
+
+def read_config():
+    """
+    Return config.ini parsed once per process (a missing file reads as empty).
+    """
+    global _config
+    with _config_lock:
+        if _config is None:
+            cfg = configparser.ConfigParser()
+            cfg.read(CONFIG_PATH)
+            _config = cfg
+        return _config
+
+def read_section(name, defaults, types=None, cfg=None):
+    """
+    Read the keys of one config.ini section, each falling back to its default when
+    the section or the key is missing.
+
+    Parameters:
+        name (str): Section name, e.g. 'pipeline'.
+        defaults (dict): key -> default value (or REQUIRED).
+        types (dict, optional): key -> type, for keys whose default does not give it
+            (None or REQUIRED). Otherwise the type of the default is used: bool, int
+            and float values are parsed, Path values are resolved against the project
+            root and anything else is returned as a string.
+        cfg (ConfigParser, optional): Parser to read from instead of config.ini.
+
+    Returns:
+        dict: key -> value, in the order of `defaults`.
+    """
+    cfg = cfg or read_config()
+    types = types or {}
+    settings = {}
+    for key, default in defaults.items():
+        kind = types.get(key, type(default))
+        if cfg.has_option(name, key):
+            value = _GETTERS.get(kind, configparser.ConfigParser.get)(cfg, name, key)
+        elif default is REQUIRED:
+            raise KeyError(f"config.ini: [{name}] has no '{key}'")
+        else:
+            value = default
+        if value is not None and isinstance(kind, type) and issubclass(kind, PurePath):
+            value = PROJECT_ROOT / value
+        settings[key] = value
+    return settings
@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+# Default number of connections kept open / allowed at most
+POOL_MIN = 1
+POOL_MAX = 4
+# Default seconds a caller may wait for a free connection before PoolError is raised
+ACQUIRE_TIMEOUT = 30
+# Idle connections older than this (seconds) are checked with SELECT 1 before being handed out
+HEALTH_CHECK_INTERVAL = 30
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections.
+
+    Callers borrow a connection with `with pool.connection() as conn:` and must commit
+    their own work; whatever is left uncommitted when the block ends is rolled back
+    before the connection goes back to the pool. Connections are opened lazily up to
+    `maxconn`; once that many are in use, callers wait up to `acquire_timeout` seconds.
+
+    Every connection is opened with the given statement timeout, so a stuck query is
+    cancelled by the server instead of blocking a loader forever. Connections that
+    have been idle for a while are checked before reuse, and broken ones are replaced.
+
+    Parameters:
+        minconn (int): Connections opened up front.
+        maxconn (int): Upper bound on open connections.
+        statement_timeout_ms (int or None): Server-side statement_timeout for every session.
+        acquire_timeout (float): Seconds to wait for a free connection.
+        health_check_interval (float): Idle seconds after which a connection is checked.
+        **connect_kwargs: Passed to psycopg2.connect (dsn or dbname/user/password/host/port).
+    """
+    def __init__(self, minconn=POOL_MIN, maxconn=POOL_MAX, statement_timeout_ms=None,
+                 acquire_timeout=ACQUIRE_TIMEOUT, health_check_interval=HEALTH_CHECK_INTERVAL,
+                 **connect_kwargs):
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = dict(connect_kwargs)
+        if statement_timeout_ms:
+            self.connect_kwargs['options'] = f"-c statement_timeout={int(statement_timeout_ms)}"
+
+        self._idle = []        # (connection, time it was returned) - most recently used last
+        self._open = 0         # Connections currently open, idle or in use
+        self._closed = False
+        self._condition = threading.Condition()
+        self._stats = {
+            'acquired': 0, 'created': 0, 'discarded': 0,
+            'waited': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._open += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._condition:
+            self._stats['created'] += 1
+        return conn
+
+    def _healthy(self, conn, idle_since):
+        """
+        Cheap check for connections that have been idle long enough to have been dropped.
+        """
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logging.warning(f"DB pool - Discarding broken connection: {e}")
+            return False
+
+    def getconn(self):
+        """
+        Borrow a connection, waiting for one to be returned when the pool is at maxconn.
+        Prefer connection(), which always gives it back.
+
+        Raises:
+            PoolError: if the pool is closed or no connection became free within acquire_timeout.
+        """
+        requested = time.monotonic()
+        deadline = requested + self.acquire_timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+                if self._open < self.maxconn:
+                    # Reserve the slot, then connect outside the lock
+                    self._open += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(f"no connection available after {self.acquire_timeout}s "
+                                    f"({self.maxconn} in use)")
+                self._condition.wait(remaining)
+
+        try:
+            if conn is not None and not self._healthy(conn, idle_since):
+                self._discard(conn, release_slot=False)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+
+        waited = time.monotonic() - requested
+        with self._condition:
+            self._stats['acquired'] += 1
+            if waited > 0.001:
+                self._stats['waited'] += 1
+            self._stats['wait_seconds'] += waited
+            self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+        return conn
+
+    def putconn(self, conn):
+        """
+        Return a borrowed connection; open transactions are rolled back first.
+        """
+        if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+
+        if conn.closed or self._closed or conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            self._discard(conn)
+            return
+
+        with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def _discard(self, conn, release_slot=True):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._stats['discarded'] += 1
+            if release_slot:
+                self._open -= 1
+                self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with-block.
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            # Rolls back whatever the block left uncommitted, e.g. after an exception
+            self.putconn(conn)
+
+    def stats(self):
+        """
+        Counters since the pool was created: connections acquired, opened and discarded,
+        how many acquisitions had to wait and for how long in total / at most.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+        stats['avg_wait_seconds'] = stats['wait_seconds'] / stats['acquired'] if stats['acquired'] else 0.0
+        return stats
+
+    def close(self):
+        """
+        Close idle connections and refuse new checkouts; borrowed ones are closed on return.
+        """
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
@@ -0,0 +1,392 @@
+import csv
+import io
+import math
+from datetime import date, datetime
+
+import numpy as np
+
+# SPI accumulation periods, in months
+SPI_SCALES = (1, 3, 6, 12)
+# Share of a month's days that must have a value for the month to count
+MIN_MONTH_COVERAGE = 0.8
+# Months of the same calendar month needed to fit a gamma distribution
+MIN_YEARS = 10
+# Positive (non-zero) samples needed for the fit; drier calendar months get no SPI
+MIN_POSITIVE = 3
+# SPI values are clipped to +-SPI_LIMIT, beyond which the fitted tails mean little
+SPI_LIMIT = 3.0
+# Iterations of the incomplete gamma series / continued fraction
+GAMMA_ITERATIONS = 200
+
+# drought_indices value columns, in COPY order
+INDEX_COLUMNS = ['precipitation', 'temperature_avg'] + [f'spi_{k}' for k in SPI_SCALES] + ['de_martonne']
+
+
+# ----------------------------------------------------------------------
+# Special functions (vectorized, no SciPy needed)
+# ----------------------------------------------------------------------
+def gammainc(a, x):
+    """
+    Regularized lower incomplete gamma function P(a, x), elementwise.
+
+    Uses the series expansion below x = a + 1 and the continued fraction above it
+    (Numerical Recipes 6.2), with a fixed number of iterations for every element.
+    """
+    a, x = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(x, dtype=float))
+    result = np.full(a.shape, np.nan)
+    valid = (a > 0) & (x >= 0)
+    result[valid & (x == 0)] = 0.0
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore', under='ignore'):
+        lgamma = np.vectorize(math.lgamma, otypes=[float])(np.where(a > 0, a, 1.0))
+        log_prefix = -x + a * np.log(np.where(x > 0, x, 1.0)) - lgamma
+
+        # Series: P = e^(-x) x^a / Gamma(a) * sum x^n / (a (a+1) ... (a+n))
+        term = 1.0 / a
+        total = term.copy()
+        ap = a.copy()
+        for _ in range(GAMMA_ITERATIONS):
+            ap = ap + 1
+            term = term * x / ap
+            total = total + term
+        series = total * np.exp(log_prefix)
+
+        # Continued fraction for Q = 1 - P (modified Lentz)
+        tiny = 1e-300
+        b = x + 1 - a
+        c = np.full(a.shape, 1 / tiny)
+        d = 1 / np.where(b == 0, tiny, b)
+        h = d.copy()
+        for i in range(1, GAMMA_ITERATIONS + 1):
+            an = -i * (i - a)
+            b = b + 2
+            d = an * d + b
+            d = np.where(np.abs(d) < tiny, tiny, d)
+            c = b + an / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            d = 1 / d
+            h = h * d * c
+        fraction = 1 - np.exp(log_prefix) * h
+
+    use_series = valid & (x > 0) & (x < a + 1)
+    use_fraction = valid & (x > 0) & (x >= a + 1)
+    result[use_series] = series[use_series]
+    result[use_fraction] = fraction[use_fraction]
+    return np.clip(result, 0.0, 1.0)
+
+
+def norm_ppf(p):
+    """
+    Inverse of the standard normal CDF, elementwise (Acklam's rational approximation,
+    relative error below 1.2e-9). p outside (0, 1) gives -inf / inf, NaN stays NaN.
+    """
+    a = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+         3.754408661907416e+00)
+    p_low = 0.02425
+
+    p = np.asarray(p, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Lower tail
+        q = np.sqrt(-2 * np.log(p))
+        lower = (((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) / \
+                ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1)
+        # Central region
+        q = p - 0.5
+        r = q * q
+        central = (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q / \
+                  (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1)
+        # Upper tail
+        q = np.sqrt(-2 * np.log(1 - p))
+        upper = -(((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) / \
+                 ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1)
+
+    z = np.where(p < p_low, lower, np.where(p > 1 - p_low, upper, central))
+    z = np.where(p <= 0, -np.inf, z)
+    z = np.where(p >= 1, np.inf, z)
+    return np.where(np.isnan(p), np.nan, z)
+
+
+# ----------------------------------------------------------------------
+# Monthly series
+# ----------------------------------------------------------------------
+def month_starts(first_day, n_days):
+    """
+    Column offsets where each month starts in a daily array beginning on `first_day`
+    (which must be the 1st of a month), and the first day of every month.
+    """
+    days = np.datetime64(first_day, 'D') + np.arange(n_days)
+    months = days.astype('datetime64[M]')
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    return starts, months[starts]
+
+
+def monthly_totals(daily, starts, min_coverage=MIN_MONTH_COVERAGE):
+    """
+    Aggregate a (municipality, day) array into (municipality, month) sums and means.
+
+    Days without a value are NaN. A month whose share of days with a value is below
+    `min_coverage` gets NaN, so a half-observed month never passes for a dry one.
+
+    Returns:
+        (sums, means) arrays of shape (municipalities, months).
+    """
+    present = ~np.isnan(daily)
+    sums = np.add.reduceat(np.where(present, daily, 0.0), starts, axis=1)
+    counts = np.add.reduceat(present.astype(int), starts, axis=1)
+    lengths = np.diff(np.r_[starts, daily.shape[1]])
+
+    covered = counts >= min_coverage * lengths
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    return np.where(covered, sums, np.nan), np.where(covered, means, np.nan)
+
+
+def rolling_sum(monthly, k):
+    """
+    Sum of each month and the k - 1 months before it; NaN when any of them is missing.
+    """
+    present = ~np.isnan(monthly)
+    csum = np.cumsum(np.where(present, monthly, 0.0), axis=1)
+    ccount = np.cumsum(present, axis=1)
+    pad = np.zeros((monthly.shape[0], 1))
+    csum = np.hstack([pad, csum])
+    ccount = np.hstack([pad, ccount])
+
+    result = np.full(monthly.shape, np.nan)
+    if k <= monthly.shape[1]:
+        window_sum = csum[:, k:] - csum[:, :-k]
+        window_count = ccount[:, k:] - ccount[:, :-k]
+        result[:, k - 1:] = np.where(window_count == k, window_sum, np.nan)
+    return result
+
+
+# ----------------------------------------------------------------------
+# Indices
+# ----------------------------------------------------------------------
+def fit_gamma(samples, min_samples=MIN_YEARS, min_positive=MIN_POSITIVE):
+    """
+    Fit a mixed gamma distribution to each row of `samples` (NaN = missing).
+
+    Zeros are handled through their probability q; the positive values get a gamma
+    distribution fitted with Thom's maximum likelihood approximation.
+
+    Returns:
+        (alpha, beta, q) arrays with one value per row, NaN where the row has too few samples.
+    """
+    valid = ~np.isnan(samples)
+    n = valid.sum(axis=1)
+    positive = valid & (samples > 0)
+    n_positive = positive.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        q = (n - n_positive) / n
+        mean = np.where(positive, samples, 0.0).sum(axis=1) / n_positive
+        log_mean = np.where(positive, np.log(np.where(positive, samples, 1.0)), 0.0).sum(axis=1) / n_positive
+        A = np.log(mean) - log_mean
+        alpha = (1 + np.sqrt(1 + 4 * A / 3)) / (4 * A)
+        beta = mean / alpha
+
+    usable = (n >= min_samples) & (n_positive >= min_positive) & (A > 0)
+    return np.where(usable, alpha, np.nan), np.where(usable, beta, np.nan), np.where(usable, q, np.nan)
+
+
+def spi(monthly_precipitation, first_month, k, calibration=None, min_years=MIN_YEARS):
+    """
+    Standardized Precipitation Index over k-month accumulations (McKee et al., 1993).
+
+    For every municipality and calendar month a gamma distribution is fitted to the
+    k-month totals of the calibration years; each total is then mapped through the
+    fitted CDF to the standard normal. All municipalities are handled in one pass per
+    calendar month.
+
+    Parameters:
+        monthly_precipitation (ndarray): (municipalities, months) totals, NaN = missing.
+        first_month (numpy.datetime64): Month of column 0.
+        k (int): Accumulation period in months.
+        calibration (tuple or None): (first_year, last_year) used for the fit; None uses all years.
+        min_years (int): Calibration samples needed per calendar month.
+
+    Returns:
+        ndarray of the same shape, NaN where the SPI is undefined.
+    """
+    totals = rolling_sum(monthly_precipitation, k)
+    n_months = totals.shape[1]
+    months = np.datetime64(first_month, 'M') + np.arange(n_months)
+    calendar_month = months.astype(int) % 12
+    years = months.astype('datetime64[Y]').astype(int) + 1970
+
+    in_calibration = np.ones(n_months, dtype=bool)
+    if calibration:
+        in_calibration = (years >= calibration[0]) & (years <= calibration[1])
+
+    result = np.full(totals.shape, np.nan)
+    for month in range(12):
+        columns = np.flatnonzero(calendar_month == month)
+        if columns.size == 0:
+            continue
+        fit_columns = columns[in_calibration[columns]]
+        alpha, beta, q = fit_gamma(totals[:, fit_columns], min_samples=min_years)
+
+        x = totals[:, columns]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            g = gammainc(alpha[:, None], x / beta[:, None])
+        probability = np.where(x > 0, q[:, None] + (1 - q[:, None]) * g, q[:, None])
+        probability = np.where(np.isnan(x) | np.isnan(alpha[:, None]), np.nan, probability)
+        result[:, columns] = np.clip(norm_ppf(probability), -SPI_LIMIT, SPI_LIMIT)
+    return result
+
+
+def de_martonne(monthly_precipitation, monthly_temperature):
+    """
+    De Martonne aridity index over the 12 months ending at each month:
+    P / (T + 10), with P the 12-month precipitation (mm) and T the mean of the monthly
+    mean temperatures (degC). Below 10 is arid, 10-20 semi-arid, above 20 humid.
+    """
+    precipitation = rolling_sum(monthly_precipitation, 12)
+    temperature = rolling_sum(monthly_temperature, 12) / 12
+    with np.errstate(invalid='ignore', divide='ignore'):
+        index = precipitation / (temperature + 10)
+    return np.where(temperature + 10 > 0, index, np.nan)
+
+
+def compute_indices(precipitation, temperature, first_day, calibration=None, min_years=MIN_YEARS):
+    """
+    All drought indices for all municipalities from daily (municipality, day) arrays
+    starting on `first_day` (the 1st of a month).
+
+    Returns:
+        (months, indices): numpy.datetime64 month of every column, and a dict mapping
+        every INDEX_COLUMNS name to a (municipalities, months) array.
+    """
+    starts, months = month_starts(first_day, precipitation.shape[1])
+    monthly_precipitation, _ = monthly_totals(precipitation, starts)
+    _, monthly_temperature = monthly_totals(temperature, starts)
+
+    indices = {'precipitation': monthly_precipitation, 'temperature_avg': monthly_temperature}
+    for k in SPI_SCALES:
+        indices[f'spi_{k}'] = spi(monthly_precipitation, months[0], k, calibration, min_years)
+    indices['de_martonne'] = de_martonne(monthly_precipitation, monthly_temperature)
+    return months, indices
+
+
+# ----------------------------------------------------------------------
+# Database
+# ----------------------------------------------------------------------
+def load_daily(cursor, today):
+    """
+    Read the whole observed history once into (municipality, day) arrays.
+
+    Returns:
+        (municipality_ids, first_day, precipitation, temperature), first_day being the
+        1st of the first month with data, or None when there is no observed data at all.
+    """
+    cursor.execute("""
+    SELECT min(date) FROM weather_observations
+    WHERE num_nonnulls(precipitation, temperature_observed_avg) > 0;
+    """)
+    first = cursor.fetchone()[0]
+    if first is None:
+        return None
+    first_day = date(first.year, first.month, 1)
+
+    cursor.execute("SELECT municipality_id FROM municipalities ORDER BY municipality_id;")
+    municipality_ids = [municipality_id for (municipality_id,) in cursor.fetchall()]
+    n_days = (today - first_day).days + 1
+
+    # COPY streams the rows as CSV, much faster than fetching tuples
+    query = cursor.mogrify("""
+    SELECT municipality_id, date - %s::date, precipitation, temperature_observed_avg
+    FROM weather_observations
+    WHERE date BETWEEN %s AND %s
+      AND num_nonnulls(precipitation, temperature_observed_avg) > 0
+    """, (first_day, first_day, today)).decode()
+    buffer = io.StringIO()
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+
+    precipitation = np.full((len(municipality_ids), n_days), np.nan)
+    temperature = np.full((len(municipality_ids), n_days), np.nan)
+    if buffer.getvalue():
+        data = np.genfromtxt(buffer, delimiter=',', ndmin=2)
+        rows = np.searchsorted(municipality_ids, data[:, 0].astype(int))
+        days = data[:, 1].astype(int)
+        precipitation[rows, days] = data[:, 2]
+        temperature[rows, days] = data[:, 3]
+    return municipality_ids, first_day, precipitation, temperature
+
+
+def write_indices(cursor, municipality_ids, months, indices, since=None):
+    """
+    Upsert the monthly indices into drought_indices with one COPY and one INSERT,
+    only for months from `since` on (all months when None). Rows without any value are
+    skipped, and rows whose values did not change are not rewritten.
+
+    Returns:
+        int: number of rows written.
+    """
+    columns = np.flatnonzero(months >= np.datetime64(since, 'M')) if since else np.arange(len(months))
+    values = np.stack([indices[name][:, columns] for name in INDEX_COLUMNS], axis=-1)
+    keep = ~np.all(np.isnan(values), axis=-1)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row, column in zip(*np.nonzero(keep)):
+        writer.writerow([municipality_ids[row], str(months[columns[column]]) + '-01']
+                        + ['' if np.isnan(value) else round(float(value), 4) for value in values[row, column]])
+    if not buffer.getvalue():
+        return 0
+    buffer.seek(0)
+
+    cursor.execute(f"""
+    CREATE TEMP TABLE IF NOT EXISTS drought_indices_staging (
+      municipality_id INTEGER NOT NULL,
+      month DATE NOT NULL,
+      {', '.join(f'{column} REAL' for column in INDEX_COLUMNS)}
+    ) ON COMMIT DELETE ROWS;
+    """)
+    cursor.execute("TRUNCATE drought_indices_staging;")
+    cursor.copy_expert(
+        f"COPY drought_indices_staging (municipality_id, month, {', '.join(INDEX_COLUMNS)}) "
+        f"FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+    cursor.execute(f"""
+    INSERT INTO drought_indices (municipality_id, month, {', '.join(INDEX_COLUMNS)})
+    SELECT municipality_id, month, {', '.join(INDEX_COLUMNS)}
+    FROM drought_indices_staging
+    ON CONFLICT (municipality_id, month) DO UPDATE
+      SET {', '.join(f'{column} = EXCLUDED.{column}' for column in INDEX_COLUMNS)}
+      WHERE ({', '.join(f'drought_indices.{column}' for column in INDEX_COLUMNS)})
+        IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in INDEX_COLUMNS)});
+    """)
+    return cursor.rowcount
+
+
+def refresh_drought_indices(cursor, since=None, calibration=None, min_years=MIN_YEARS, today=None):
+    """
+    Recompute the drought indices of every municipality and write the months from
+    `since` on (everything when None).
+
+    The history is read once and every index is computed over all municipalities in
+    vectorized passes, so a full refresh costs about as much as an incremental one;
+    `since` limits the rows rewritten. With a fixed calibration period, earlier months
+    never change, so writing from the first month with new data is enough. Without
+    one the gamma fits cover every year, new data moves the SPI of past months too,
+    and `since` is ignored.
+
+    Returns:
+        int: number of rows written.
+    """
+    today = today or datetime.now().date()
+    daily = load_daily(cursor, today)
+    if daily is None:
+        return 0
+    municipality_ids, first_day, precipitation, temperature = daily
+    months, indices = compute_indices(precipitation, temperature, first_day, calibration, min_years)
+    return write_indices(cursor, municipality_ids, months, indices, since if calibration else None)
@@ -0,0 +1,283 @@
+from datetime import date, timedelta
+
+from psycopg2.extras import execute_values
+
+# Event types written to extreme_events
+HEAVY_RAIN = 'heavy_rain'          # Observed: a run of rainy days over the 24 h or 72 h threshold (DANA)
+HEATWAVE = 'heatwave'              # Observed: enough consecutive days at or above the hot-day maximum
+STORM_FORECAST = 'storm_forecast'  # Forecast: days whose storm probability reaches the threshold
+
+# Default thresholds; the [events] section of config.ini overrides them
+THRESHOLDS = {
+    'rain_24h_mm': 60.0,       # Daily precipitation of a heavy rain day
+    'rain_72h_mm': 100.0,      # Precipitation over the last three days
+    'hot_day_c': 38.0,         # Daily maximum temperature of a hot day
+    'heatwave_days': 3,        # Consecutive hot days that make a heatwave
+    'storm_probability': 70,   # Highest storm probability (%) of a stormy forecast day
+}
+
+# A day extends a heavy rain episode only if it actually rained (mm)
+RAINY_DAY_MM = 1.0
+
+# event_detector_state columns: the sliding windows of one municipality. Every window is
+# a handful of scalars, so folding in a record costs the same whatever the history length.
+STATE_COLUMNS = [
+    'observed_date',                                    # Last observed day folded in
+    'rain_last', 'rain_before',                         # Precipitation of that day and the day before
+    'rain_start', 'rain_days', 'rain_peak', 'rain_total',  # Open heavy rain episode
+    'hot_start', 'hot_days', 'hot_peak',                # Current run of hot days
+    'forecast_date',                                    # Last forecast day folded in
+    'storm_start', 'storm_days', 'storm_peak', 'storm_total',  # Current run of stormy forecast days
+]
+EVENT_COLUMNS = ['municipality_id', 'event_type', 'start_date', 'end_date', 'days', 'peak', 'accumulated']
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def _numbers(values):
+    """
+    Numeric values of an AEMET period list ([{'value': '0.4', 'periodo': '08'}, ...]).
+    Trace amounts ('Ip') and blanks are skipped.
+    """
+    numbers = []
+    for item in values or []:
+        try:
+            numbers.append(float(item.get('value')))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return numbers
+
+def empty_state():
+    return dict.fromkeys(STATE_COLUMNS)
+
+def _event(municipality_id, event_type, start, end, days, peak, accumulated=None):
+    return {'municipality_id': municipality_id, 'event_type': event_type, 'start_date': start,
+            'end_date': end, 'days': days, 'peak': peak, 'accumulated': accumulated}
+
+def fold_observed(state, record, thresholds=THRESHOLDS):
+    """
+    Advance a municipality's observed windows by one daily record.
+
+    Days must come in date order: a record not after the last folded day returns
+    (state, None) unchanged, so the caller can count it as late. A skipped day breaks
+    the runs (its values are unknown) and counts as dry in the 72 h sum.
+
+    Returns:
+        (state, events): the new state and the events the day opened or extended,
+        each with its whole span so far.
+    """
+    day = _as_date(record['date'])
+    last = state['observed_date'] and _as_date(state['observed_date'])
+    if last and day <= last:
+        return state, None
+    state = dict(state)
+    events = []
+    municipality_id = record['municipality_id']
+    contiguous = last is not None and day - last == timedelta(days=1)
+
+    # Sliding 72 h window: the two previous days, shifted past any skipped days
+    if contiguous:
+        before, yesterday = state['rain_before'], state['rain_last']
+    elif last is not None and day - last == timedelta(days=2):
+        before, yesterday = state['rain_last'], None
+    else:
+        before = yesterday = None
+    rain = record.get('precipitation')
+    rain_72h = (rain or 0) + (yesterday or 0) + (before or 0)
+
+    # Heavy rain: a rainy day over either threshold opens or extends an episode
+    if rain is not None and rain >= RAINY_DAY_MM and (
+            rain >= thresholds['rain_24h_mm'] or rain_72h >= thresholds['rain_72h_mm']):
+        if contiguous and state['rain_start']:
+            state['rain_days'] += 1
+            state['rain_peak'] = max(state['rain_peak'], rain)
+            state['rain_total'] += rain
+        else:
+            # A new episode starts with the earliest rainy day of its 72 h window
+            window = [(day - timedelta(days=2), before), (day - timedelta(days=1), yesterday), (day, rain)]
+            wet = [(d, r) for d, r in window if r and r >= RAINY_DAY_MM]
+            state['rain_start'] = wet[0][0]
+            state['rain_days'] = (day - wet[0][0]).days + 1
+            state['rain_peak'] = max(r for _, r in wet)
+            state['rain_total'] = sum(r for _, r in wet)
+        events.append(_event(municipality_id, HEAVY_RAIN, _as_date(state['rain_start']), day,
+                             state['rain_days'], state['rain_peak'], state['rain_total']))
+    else:
+        state.update(rain_start=None, rain_days=None, rain_peak=None, rain_total=None)
+
+    # Heatwave: consecutive days at or above the hot-day maximum
+    temperature = record.get('temperature_max')
+    if temperature is not None and temperature >= thresholds['hot_day_c']:
+        if contiguous and state['hot_start']:
+            state['hot_days'] += 1
+            state['hot_peak'] = max(state['hot_peak'], temperature)
+        else:
+            state.update(hot_start=day, hot_days=1, hot_peak=temperature)
+        if state['hot_days'] >= thresholds['heatwave_days']:
+            events.append(_event(municipality_id, HEATWAVE, _as_date(state['hot_start']), day,
+                                 state['hot_days'], state['hot_peak']))
+    else:
+        state.update(hot_start=None, hot_days=None, hot_peak=None)
+
+    state.update(observed_date=day, rain_last=rain, rain_before=yesterday)
+    return state, events
+
+def fold_forecast(state, record, thresholds=THRESHOLDS):
+    """
+    Advance a municipality's forecast window by one forecast day (see fold_observed).
+    A stormy day opens or extends a storm_forecast event, whose accumulated value is
+    the forecast precipitation over its days.
+    """
+    day = _as_date(record['date'])
+    last = state['forecast_date'] and _as_date(state['forecast_date'])
+    if last and day <= last:
+        return state, None
+    state = dict(state)
+    events = []
+    contiguous = last is not None and day - last == timedelta(days=1)
+
+    probabilities = _numbers(record.get('prob_storm'))
+    probability = max(probabilities) if probabilities else None
+    if probability is not None and probability >= thresholds['storm_probability']:
+        rain = sum(_numbers(record.get('precipitations')))
+        if contiguous and state['storm_start']:
+            state['storm_days'] += 1
+            state['storm_peak'] = max(state['storm_peak'], probability)
+            state['storm_total'] += rain
+        else:
+            state.update(storm_start=day, storm_days=1, storm_peak=probability, storm_total=rain)
+        events.append(_event(record['municipality_id'], STORM_FORECAST, _as_date(state['storm_start']), day,
+                             state['storm_days'], state['storm_peak'], state['storm_total']))
+    else:
+        state.update(storm_start=None, storm_days=None, storm_peak=None, storm_total=None)
+
+    state['forecast_date'] = day
+    return state, events
+
+def fold_records(states, forecast_records, observed_records, thresholds=THRESHOLDS):
+    """
+    Fold a batch of records into per-municipality states, each kind in date order.
+
+    Parameters:
+        states (dict): municipality_id -> state; municipalities without one start empty.
+
+    Returns:
+        (states, events, late): the updated states of the municipalities in the batch,
+        the events to upsert (latest span per event), and the number of records older
+        than their municipality's state.
+    """
+    states = dict(states)
+    events = {}
+    late = 0
+    for fold, records in ((fold_forecast, forecast_records), (fold_observed, observed_records)):
+        for record in sorted(records, key=lambda r: (r['municipality_id'], str(r['date'])[:10])):
+            municipality_id = record['municipality_id']
+            state, emitted = fold(states.get(municipality_id) or empty_state(), record, thresholds)
+            states[municipality_id] = state
+            if emitted is None:
+                late += 1
+                continue
+            for event in emitted:
+                # A later day of the same event supersedes the earlier span
+                events[(municipality_id, event['event_type'], event['start_date'])] = event
+    return states, list(events.values()), late
+
+def load_states(cursor, municipality_ids):
+    """
+    Persisted detector states of some municipalities, locked until the end of the
+    transaction so concurrent loaders of a municipality fold one after the other.
+    """
+    if not municipality_ids:
+        return {}
+    cursor.execute(f"""
+    SELECT municipality_id, {', '.join(STATE_COLUMNS)}
+    FROM event_detector_state
+    WHERE municipality_id = ANY(%s)
+    ORDER BY municipality_id
+    FOR UPDATE;
+    """, (sorted(municipality_ids),))
+    return {row[0]: dict(zip(STATE_COLUMNS, row[1:])) for row in cursor.fetchall()}
+
+def save_states(cursor, states):
+    if not states:
+        return
+    execute_values(cursor, f"""
+    INSERT INTO event_detector_state (municipality_id, {', '.join(STATE_COLUMNS)})
+    VALUES %s
+    ON CONFLICT (municipality_id) DO UPDATE
+      SET {', '.join(f'{column} = EXCLUDED.{column}' for column in STATE_COLUMNS)};
+    """, [(municipality_id, *(state[column] for column in STATE_COLUMNS))
+          for municipality_id, state in sorted(states.items())])
+
+def save_events(cursor, events):
+    """
+    Upsert events: an event already stored (same municipality, type and start) gets
+    its new end, length, peak and total.
+    """
+    if not events:
+        return 0
+    execute_values(cursor, f"""
+    INSERT INTO extreme_events ({', '.join(EVENT_COLUMNS)})
+    VALUES %s
+    ON CONFLICT (municipality_id, event_type, start_date) DO UPDATE
+      SET end_date = EXCLUDED.end_date,
+          days = EXCLUDED.days,
+          peak = EXCLUDED.peak,
+          accumulated = EXCLUDED.accumulated,
+          updated_at = now();
+    """, [tuple(event[column] for column in EVENT_COLUMNS) for event in events])
+    return len(events)
+
+def detect_events(cursor, forecast_records, observed_records, thresholds=THRESHOLDS):
+    """
+    Streaming detector stage: fold freshly loaded records into the persisted windows
+    of their municipalities and upsert the events they open or extend. Call it in the
+    same transaction as the load, so state, events and data commit together.
+
+    Only the state rows of the batch's municipalities are read; no history is scanned.
+    Records older than a municipality's state (late gap fills, backfills) are skipped
+    and counted; rebuild_events replays them.
+
+    Returns:
+        dict: events (upserted) and late (records skipped).
+    """
+    records = list(forecast_records) + list(observed_records)
+    if not records:
+        return {'events': 0, 'late': 0}
+    states = load_states(cursor, {record['municipality_id'] for record in records})
+    states, events, late = fold_records(states, forecast_records, observed_records, thresholds)
+    save_states(cursor, states)
+    return {'events': save_events(cursor, events), 'late': late}
+
+def rebuild_events(cursor, thresholds=THRESHOLDS):
+    """
+    Replay the whole history through the detector, e.g. after creating the tables, a
+    backfill or a threshold change. Events and states are rewritten.
+
+    Returns:
+        int: number of events detected.
+    """
+    cursor.execute("TRUNCATE extreme_events, event_detector_state;")
+    cursor.execute("SELECT municipality_id FROM municipalities ORDER BY municipality_id;")
+    detected = 0
+    # One municipality at a time keeps memory bounded by the longest single history
+    for (municipality_id,) in cursor.fetchall():
+        cursor.execute("""
+        SELECT date, precipitation, temperature_observed_max
+        FROM weather_observations
+        WHERE municipality_id = %s
+          AND num_nonnulls(precipitation, temperature_observed_max) > 0;
+        """, (municipality_id,))
+        observed_records = [{'municipality_id': municipality_id, 'date': day,
+                             'precipitation': precipitation, 'temperature_max': temperature_max}
+                            for day, precipitation, temperature_max in cursor.fetchall()]
+        cursor.execute("""
+        SELECT date, prob_storm, precipitations
+        FROM weather_forecasts
+        WHERE municipality_id = %s AND prob_storm IS NOT NULL;
+        """, (municipality_id,))
+        forecast_records = [{'municipality_id': municipality_id, 'date': day,
+                             'prob_storm': prob_storm, 'precipitations': precipitations}
+                            for day, prob_storm, precipitations in cursor.fetchall()]
+        detected += detect_events(cursor, forecast_records, observed_records, thresholds)['events']
+    return detected
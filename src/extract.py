@@ -1,18 +1,426 @@
 import requests
+import codecs
+import json
 import logging
+import random
+import re
+import threading
 import time
 
-from datetime import datetime, timezone
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
 from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+
+# Root of the AEMET OpenData REST API
+BASE_URL = "https://opendata.aemet.es/opendata/api"
 
 # HTTP status codes that should trigger a retry
 RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 # Maximum number of retry attempts
 MAX_RETRIES = 5
-# Delay between retries in seconds
-DELAY = 10
+# Base delay for the exponential backoff in seconds
+DELAY = 5
+# Upper bound for a single wait between retries in seconds
+MAX_DELAY = 120
+# Maximum time a single call (all attempts included) may take in seconds
+CALL_DEADLINE = 300
+# Socket timeout for a single HTTP request in seconds
+REQUEST_TIMEOUT = 60
+# Longest fechaini/fechafin range AEMET accepts for daily values of one station (days)
+MAX_OBSERVED_WINDOW_DAYS = 180
+# Longest fechaini/fechafin range AEMET accepts for daily values of all stations (days)
+MAX_OBSERVED_ALL_WINDOW_DAYS = 15
+# Bytes read from the socket at a time when streaming a payload
+STREAM_CHUNK_SIZE = 64 * 1024
+# Charset AEMET serves its payloads in, used when the response does not declare one
+PAYLOAD_ENCODING = 'ISO-8859-15'
+# Parsed payloads a client keeps for callers that ask for the same endpoint again
+COALESCE_MAX_RESULTS = 1024
+# Circuit breaker states
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+# Endpoint labels that share a circuit breaker with another (same AEMET service)
+ENDPOINT_FAMILIES = {'observed_all': 'observed'}
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces out API requests globally.
+
+    Every worker calls acquire() before hitting the API, and slots are handed
+    out at least `min_interval` seconds apart no matter which thread asks,
+    so the AEMET quota is respected across the whole run.
+    """
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        # Reserve the next free slot under the lock, then wait outside it
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+    def defer(self, seconds):
+        """
+        Push the next free slot at least `seconds` into the future.
+        Used on quota errors so every in-flight worker waits, not just the one that got the 429.
+        """
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+class BackoffPolicy:
+    """
+    Decides how long to wait before retrying a failed request.
+
+    The server's Retry-After header wins when present; otherwise the wait grows
+    exponentially from `base_delay` with random jitter, capped at `max_delay`.
+    A call is abandoned once the next wait would exceed its `deadline`.
+    """
+    def __init__(self, base_delay=DELAY, max_delay=MAX_DELAY, factor=2, jitter=0.5,
+                 max_retries=MAX_RETRIES, deadline=CALL_DEADLINE):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.max_retries = max_retries
+        self.deadline = deadline
+
+    def retry_after(self, response):
+        """
+        Parse the Retry-After header (delta-seconds or HTTP-date) into seconds, or None.
+        """
+        headers = getattr(response, 'headers', None) or {}
+        value = headers.get('Retry-After')
+        if not value:
+            return None
+
+        # Delta-seconds form, e.g. "Retry-After: 30"
+        if value.strip().isdigit():
+            return float(value)
+
+        # HTTP-date form, e.g. "Retry-After: Wed, 21 Oct 2015 07:28:00 GMT"
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+    def delay(self, attempt, response=None):
+        """
+        Seconds to wait after the given (1-based) failed attempt.
+        """
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        # Exponential growth, keeping a random share of it to spread out workers
+        delay = min(self.max_delay, self.base_delay * self.factor ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
 
-def get_json_with_retry(url, headers=None, query_type=None, municipality_id=None):
+class _Flight:
+    """
+    One fetch in progress; callers asking for the same key wait on `done`.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces identical requests made during a run.
+
+    The first caller of a key runs the fetch; callers arriving while it is in flight
+    wait for it and get the same result, and later callers get the kept result
+    without any request. Several municipalities can share an AEMET station (and a
+    postal code), so their identical observed or forecast calls cost one round trip.
+
+    Only successful (not None) results are kept, at most `max_results` of them with
+    the least recently used dropped first, so a failed fetch is tried again by the
+    next caller. Results are shared objects: callers must not modify them.
+    """
+    def __init__(self, max_results=COALESCE_MAX_RESULTS):
+        self.max_results = max_results
+        self.hits = 0  # Calls served by another caller's fetch
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._results = OrderedDict()
+
+    def do(self, key, fetch):
+        """
+        Return fetch() for `key`, running it at most once at a time.
+        An exception raised by fetch() is raised to every caller waiting on it.
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.hits += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.result is not None and self.max_results > 0:
+                    self._results[key] = flight.result
+                    while len(self._results) > self.max_results:
+                        self._results.popitem(last=False)
+            flight.done.set()
+        return flight.result
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised instead of calling AEMET while the circuit of an endpoint family is open.
+    The work is skipped, not retried: it is left to the run ledger (--resume), the
+    gap queue or the failed backfill chunks.
+    """
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint family that keeps failing, so an AEMET outage costs a
+    few failed attempts instead of every retry of every municipality.
+
+    Closed: attempts go through and their outcomes fill a sliding window of the last
+    `window` attempts. Once it holds at least `min_calls` outcomes and the share of
+    failures (5xx and network errors; 429 is left to the rate limiter) reaches
+    `failure_rate`, the circuit opens.
+    Open: attempts fail fast for `cooldown` seconds.
+    Half-open: up to `probes` trial attempts go through; if they all succeed the
+    circuit closes again, and any failure opens it for another cooldown.
+    """
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=10, cooldown=60, probes=1,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.probes = probes
+        self.state = CIRCUIT_CLOSED
+        self.opened = 0    # Times the circuit opened
+        self.rejected = 0  # Attempts that failed fast
+        self.failures = 0  # Failed attempts recorded
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trials = 0     # Half-open probes in flight
+        self._successes = 0  # Half-open probes that succeeded
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether an attempt may be made now. Every allowed attempt must be followed by record().
+        """
+        with self._lock:
+            if self.state == CIRCUIT_OPEN and self._clock() - self._opened_at >= self.cooldown:
+                self.state = CIRCUIT_HALF_OPEN
+                self._trials = self._successes = 0
+                logging.info(f"Circuit {self.name}: half-open, probing")
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_HALF_OPEN and self._trials < self.probes:
+                self._trials += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success):
+        """
+        Record the outcome of an allowed attempt: True, False, or None when it says
+        nothing about the endpoint's health (e.g. a 429).
+        """
+        with self._lock:
+            if success is False:
+                self.failures += 1
+            if self.state == CIRCUIT_HALF_OPEN:
+                self._trials = max(0, self._trials - 1)
+                if success is False:
+                    self._open()
+                elif success:
+                    self._successes += 1
+                    if self._successes >= self.probes:
+                        self.state = CIRCUIT_CLOSED
+                        self._outcomes.clear()
+                        logging.info(f"Circuit {self.name}: closed")
+            elif self.state == CIRCUIT_CLOSED and success is not None:
+                self._outcomes.append(success)
+                failures = self._outcomes.count(False)
+                if (len(self._outcomes) >= self.min_calls
+                        and failures >= self.failure_rate * len(self._outcomes)):
+                    self._open()
+            # Outcomes of attempts allowed before the circuit opened are ignored
+
+    def _open(self):
+        self.state = CIRCUIT_OPEN
+        self.opened += 1
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        logging.warning(f"Circuit {self.name}: open for {self.cooldown:g}s, failing fast")
+
+class AemetClient:
+    """
+    Shared HTTP state for every AEMET call in a run.
+
+    Owns a pooled requests.Session (keep-alive, so the metadata call and the
+    'datos' call reuse the same TLS connection), the default headers, the
+    global rate limiter, the retry policy, an optional response cache,
+    optional metrics collector, the SingleFlight that coalesces identical
+    payload fetches (`coalesce` results are kept) and, when `breaker` gives the
+    CircuitBreaker settings, one circuit breaker per endpoint family. Create one
+    per run and pass it to the extract functions; it is safe to share between
+    worker threads.
+    """
+    def __init__(self, api_key=None, rate_limiter=None, backoff=None, base_url=BASE_URL,
+                 pool_connections=2, pool_maxsize=4, timeout=REQUEST_TIMEOUT, session=None,
+                 cache=None, metrics=None, coalesce=COALESCE_MAX_RESULTS, breaker=None):
+        self.api_key = api_key
+        self.rate_limiter = rate_limiter
+        self.backoff = backoff or BackoffPolicy()
+        self.cache = cache
+        self.metrics = metrics
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = session or self._build_session(pool_connections, pool_maxsize)
+        self.single_flight = SingleFlight(coalesce)
+        self.breaker_settings = breaker
+        self._breakers = {}
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build_session(pool_connections, pool_maxsize):
+        """
+        Build a keep-alive session with one connection pool per host.
+        pool_maxsize should be at least the number of worker threads, otherwise
+        surplus connections are closed after use instead of being reused.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({"accept": "application/json"})
+        return session
+
+    def get(self, url, headers=None, params=None, endpoint=None, stream=False):
+        """
+        Issue one GET through the pooled session (no retries here).
+        Latency, status and body size are recorded under `endpoint` when metrics are enabled.
+        With stream=True only the headers have been read on return; the body size is
+        then recorded by whoever consumes the stream.
+        """
+        with self._lock:
+            self._requests += 1
+
+        if not self.metrics:
+            return self.session.get(url, headers=headers, params=params, timeout=self.timeout, stream=stream)
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, params=params, timeout=self.timeout, stream=stream)
+        except requests.RequestException:
+            self.metrics.observe_http(endpoint, 'error', time.perf_counter() - start)
+            raise
+        # Reading .content would consume a streamed body
+        size = 0 if stream else len(getattr(response, 'content', b'') or b'')
+        self.metrics.observe_http(endpoint, response.status_code, time.perf_counter() - start, size)
+        return response
+
+    def connection_stats(self):
+        """
+        Report how many requests were sent, how many TCP/TLS connections
+        (i.e. handshakes) the pools had to open for them, and how many payload
+        fetches were coalesced into another caller's.
+        """
+        connections = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = getattr(getattr(adapter, 'poolmanager', None), 'pools', None)
+            if pools is None:
+                continue
+            for key in pools.keys():
+                connections += getattr(pools[key], 'num_connections', 0)
+
+        return {
+            'requests': self._requests,
+            'connections': connections,
+            'reused': max(0, self._requests - connections),
+            'coalesced': self.single_flight.hits,
+        }
+
+    def breaker(self, endpoint):
+        """
+        The circuit breaker of an endpoint label's family, or None when breakers are off.
+        """
+        if self.breaker_settings is None:
+            return None
+        family = ENDPOINT_FAMILIES.get(endpoint, endpoint)
+        with self._lock:
+            if family not in self._breakers:
+                self._breakers[family] = CircuitBreaker(family, **self.breaker_settings)
+            return self._breakers[family]
+
+    def breaker_stats(self):
+        """
+        State, openings, recorded failures and fast failures of every endpoint family
+        called so far.
+        """
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: {'state': breaker.state, 'opened': breaker.opened, 'failures': breaker.failures,
+                               'rejected': breaker.rejected}
+                for breaker in breakers}
+
+    def close(self):
+        self.session.close()
+
+# Client used when callers do not pass their own
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    """
+    Return the process-wide AemetClient, creating it on first use.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            # It lives as long as the process, not a run: only in-flight calls are coalesced
+            _default_client = AemetClient(coalesce=0)
+        return _default_client
+
+def endpoint_label(url, query_type):
+    """
+    Metrics label for a request: 'datos' for payload URLs, the query type otherwise.
+    """
+    if '/opendata/sh/' in url:
+        return 'datos'
+    return (query_type or 'unknown').lower()
+
+def get_json_with_retry(url, headers=None, params=None, query_type=None, municipality_id=None,
+                        client=None):
     """
     Perform an HTTP GET with automatic retries on transient failures.
 
@@ -22,65 +430,146 @@ def get_json_with_retry(url, headers=None, query_type=None, municipality_id=None
         params (dict, optional): Query parameters for the request.
         query_type (str, optional): Label for logging context (e.g., 'OBSERVED').
         municipality_id (int or str, optional): Identifier for the municipality, for logging.
+        client (AemetClient, optional): Session, rate limiter and retry policy to use;
+            defaults to the shared client from get_default_client().
 
     Returns:
         dict or list: Parsed JSON response on success, or None on failure.
     """
-    # Try up to MAX_RETRIES times
-    for attempt in range(1, MAX_RETRIES + 1):
+    return _request_with_retry(url, headers, params, query_type, municipality_id, client,
+                               parse=lambda response: response.json())
+
+def _request_with_retry(url, headers, params, query_type, municipality_id, client, parse, stream=False):
+    """
+    Retry loop shared by get_json_with_retry and stream_json_with_retry.
+    `parse(response)` turns a successful response into the return value; errors it
+    raises are retried like network errors.
+    """
+    client = client or get_default_client()
+    backoff = client.backoff
+    rate_limiter = client.rate_limiter
+    endpoint = endpoint_label(url, query_type)
+    breaker = client.breaker(endpoint)
+    started = time.monotonic()
+
+    # Try up to backoff.max_retries times
+    for attempt in range(1, backoff.max_retries + 1):
+        # While the endpoint family is down, fail fast instead of spending quota and sleeps
+        if breaker and not breaker.allow():
+            raise CircuitOpenError(f"{query_type} - Municipality {municipality_id} - "
+                                   f"Circuit {breaker.name} open, call skipped")
+
+        # Wait for a free slot in the global request budget
+        if rate_limiter:
+            rate_limiter.acquire()
+
         try:
-            response = requests.get(url, headers=headers)
+            response = client.get(url, headers=headers, params=params, endpoint=endpoint, stream=stream)
             status = response.status_code
 
             # If we get a retryable status code, log and retry
             if status in RETRY_STATUS_CODES:
+                _record_outcome(breaker, status, query_type, municipality_id)
+                wait = backoff.delay(attempt, response)
                 logging.warning(
                     f"{query_type} - Municipality {municipality_id} - Status {status}. "
-                    f"Attempt {attempt}/{MAX_RETRIES}"
+                    f"Attempt {attempt}/{backoff.max_retries}, retrying in {wait:.1f}s"
                 )
-                time.sleep(DELAY)
+                if not _wait_before_retry(wait, attempt, status, started, backoff, rate_limiter):
+                    break
+                if client.metrics:
+                    client.metrics.inc_retry(endpoint)
                 continue
 
             # Raise for non-2xx responses not explicitly retried above    
             response.raise_for_status()
-            return response.json() # return parsed JSON if successful
+            result = parse(response) # return parsed JSON if successful
+            if breaker:
+                breaker.record(True)
+            return result
+
+        except CircuitOpenError:
+            # Raised by _record_outcome above: the attempt is already recorded
+            raise
 
         except requests.RequestException as e:
             # Attempt to extract HTTP status if available
             status = getattr(e.response, 'status_code', None)
+            _record_outcome(breaker, status, query_type, municipality_id)
 
             # Only retry on configured status codes or network errors
             if (status in RETRY_STATUS_CODES or status is None):
+                wait = backoff.delay(attempt, e.response)
                 logging.warning(
                     f"{query_type} - Municipality {municipality_id} - Request Error {status or ''}: {e}. "
-                    f"Attempt {attempt}/{MAX_RETRIES}"
+                    f"Attempt {attempt}/{backoff.max_retries}, retrying in {wait:.1f}s"
                 )
-                time.sleep(DELAY)
+                if not _wait_before_retry(wait, attempt, status, started, backoff, rate_limiter):
+                    break
+                if client.metrics:
+                    client.metrics.inc_retry(endpoint)
                 continue
 
             # Log final failure if out of retries or unrecoverable error
             logging.error(f"{query_type} - Municipality {municipality_id} - Request Error Final: {e}")
             return None
-    # Exhausted all retries without success
+
+    # Exhausted all retries (or the call deadline) without success
+    logging.error(f"{query_type} - Municipality {municipality_id} - Giving up after {attempt} attempts")
     return None
 
-def get_data_url(endpoint_url, municipality_id, api_key, query_type):
+def _record_outcome(breaker, status, query_type, municipality_id):
+    """
+    Feed a failed attempt to the circuit breaker: server errors and network errors
+    (no status) count as failures, a 429 counts as nothing, and any other status
+    means the endpoint answered. Raises CircuitOpenError once the circuit is open,
+    so the caller skips its remaining retries instead of sleeping.
+    """
+    if not breaker:
+        return
+    if status is None or status >= 500:
+        breaker.record(False)
+    else:
+        breaker.record(None if status == 429 else True)
+    if breaker.state == CIRCUIT_OPEN:
+        raise CircuitOpenError(f"{query_type} - Municipality {municipality_id} - "
+                               f"Circuit {breaker.name} open, retries skipped")
+
+def _wait_before_retry(wait, attempt, status, started, backoff, rate_limiter):
+    """
+    Sleep before the next attempt. Returns False when no attempts are left or
+    the call deadline would be exceeded.
+    Quota errors (429) are pushed into the shared limiter so all workers back off together.
+    """
+    if attempt >= backoff.max_retries:
+        return False
+    if time.monotonic() - started + wait > backoff.deadline:
+        return False
+
+    if status == 429 and rate_limiter:
+        # The next acquire() performs the wait, for this worker and everyone else
+        rate_limiter.defer(wait)
+    else:
+        time.sleep(wait)
+    return True
+
+def get_data_url(endpoint_url, municipality_id, api_key, query_type, client=None):
     """
     Retrieve the actual data URL ('datos') from the AEMET API response.
 
     Many AEMET endpoints return a JSON containing a 'datos' key,
     which is a URL pointing to the real data payload.
     """
-    # Standard headers and API key parameter for the initial metadata call
-
+    # API key header for the initial metadata call ('accept' comes from the session defaults)
+    client = client or get_default_client()
     headers = {
-        "accept": "application/json",
-        "api_key": api_key
+        "api_key": api_key or client.api_key
     }
 
     # Fetch the metadata JSON that includes 'datos'
     data = get_json_with_retry(
-        endpoint_url, headers=headers, query_type=query_type, municipality_id=municipality_id
+        endpoint_url, headers=headers, params=None, query_type=query_type,
+        municipality_id=municipality_id, client=client
     )
 
     # Ensure the response contains the 'datos' field
@@ -91,7 +580,169 @@ def get_data_url(endpoint_url, municipality_id, api_key, query_type):
     # Return the URL where the actual JSON data resides
     return data['datos']
 
-def get_observed_raw(municipality_id, station_code, date, api_key):
+def fetch_datos(endpoint_url, municipality_id, api_key, query_type, client=None, refresh=False):
+    """
+    Run the two-step AEMET protocol for one endpoint: metadata call, then 'datos' payload.
+
+    When the client has a cache, the payload is looked up by endpoint URL first and
+    stored after a successful fetch. The cache sits at this level rather than on the
+    individual HTTP calls because 'datos' URLs are single-use and expire quickly.
+    In offline mode a cache miss returns None without touching the network.
+    With refresh=True the lookup is skipped and the entry replaced by the fresh
+    payload, for callers that expect AEMET to have published more since last time.
+
+    Identical calls (same query type and endpoint URL, i.e. same station or postal
+    code and dates) made during the run are coalesced by the client's SingleFlight.
+    """
+    client = client or get_default_client()
+    return client.single_flight.do(
+        (query_type, endpoint_url) + (('refresh',) if refresh else ()),
+        lambda: _fetch_datos(endpoint_url, municipality_id, api_key, query_type, client, refresh)
+    )
+
+def _fetch_datos(endpoint_url, municipality_id, api_key, query_type, client, refresh=False):
+    cache = client.cache
+
+    if cache:
+        if not refresh:
+            cached = cache.get(query_type, endpoint_url)
+            if cached is not None:
+                return cached
+        if cache.offline:
+            logging.error(f"{query_type} - Municipality {municipality_id} - Not in cache (offline mode)")
+            return None
+
+    # First call to retrieve the data URL
+    data_url = get_data_url(endpoint_url, municipality_id, api_key, query_type, client=client)
+    if not data_url:
+        return None
+
+    # Second call to fetch the actual data
+    data = get_json_with_retry(
+        data_url, query_type=query_type, municipality_id=municipality_id, client=client
+    )
+
+    if cache and data is not None:
+        cache.put(query_type, endpoint_url, data)
+    return data
+
+# Whitespace allowed between JSON tokens
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+def iter_json_array(chunks):
+    """
+    Incrementally parse a top-level JSON array from an iterable of text chunks.
+
+    Elements are yielded as soon as they are complete, so memory is bounded by one
+    element plus one chunk rather than by the size of the whole document.
+
+    Raises:
+        ValueError: if the document is not a JSON array or ends before its closing bracket.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    opened = False
+
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            pos = _JSON_WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if not opened:
+                if char != '[':
+                    raise ValueError(f"Expected a JSON array, got {buffer[pos:pos + 40]!r}")
+                opened = True
+                pos += 1
+            elif char == ',':
+                pos += 1
+            elif char == ']':
+                return
+            else:
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    break  # Element not complete yet: wait for the next chunk
+                # A number at the very end of the buffer may continue in the next chunk
+                if end == len(buffer) and isinstance(element, (int, float)):
+                    break
+                yield element
+                pos = end
+        # Keep only the unparsed tail
+        buffer = buffer[pos:]
+
+    raise ValueError("JSON array ended before its closing bracket")
+
+def _iter_text(response, endpoint, metrics, chunk_size):
+    """
+    Decode a streamed response body into text chunks, counting the bytes received.
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or PAYLOAD_ENCODING)(errors='replace')
+    for data in response.iter_content(chunk_size=chunk_size):
+        if metrics:
+            metrics.add_bytes(endpoint, len(data))
+        yield decoder.decode(data)
+    yield decoder.decode(b'', final=True)
+
+def stream_json_with_retry(url, query_type=None, municipality_id=None, client=None,
+                           chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream the elements of a JSON array payload one at a time.
+
+    Connecting is retried like get_json_with_retry. Once elements have been yielded
+    the request cannot be replayed, so errors while reading the body are raised.
+
+    Yields:
+        Each element of the top-level array.
+
+    Raises:
+        requests.RequestException: if the request failed after all retries or the connection broke.
+        ValueError: if the payload is not a JSON array or is truncated.
+    """
+    client = client or get_default_client()
+    response = _request_with_retry(url, None, None, query_type, municipality_id, client,
+                                   parse=lambda response: response, stream=True)
+    if response is None:
+        raise requests.RequestException(f"{query_type} - Fetching {url} failed")
+
+    with response:
+        yield from iter_json_array(
+            _iter_text(response, endpoint_label(url, query_type), client.metrics, chunk_size)
+        )
+
+def stream_datos(endpoint_url, municipality_id, api_key, query_type, client=None, keep=None):
+    """
+    Two-step AEMET protocol with a streamed payload: yields payload records one by
+    one, skipping those for which `keep(record)` is false. Not cached.
+    Raises the same exceptions as stream_json_with_retry.
+    """
+    data_url = get_data_url(endpoint_url, municipality_id, api_key, query_type, client=client)
+    if not data_url:
+        raise requests.RequestException(f"{query_type} - No 'datos' URL for {endpoint_url}")
+
+    for record in stream_json_with_retry(data_url, query_type=query_type, municipality_id=municipality_id,
+                                         client=client):
+        if keep is None or keep(record):
+            yield record
+
+def split_date_range(start_date, end_date, max_days):
+    """
+    Split an inclusive date range into consecutive windows of at most `max_days` days.
+
+    Returns:
+        list of (window_start, window_end) tuples covering the whole range in order.
+    """
+    windows = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(end_date, window_start + timedelta(days=max_days - 1))
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+def get_observed_raw(municipality_id, station_code, date, api_key, client=None):
     """
     Fetch raw daily observed observations for a station on a given date.
 
@@ -100,22 +751,91 @@ def get_observed_raw(municipality_id, station_code, date, api_key):
       2. Retrieves the 'datos' link via get_data_url.
       3. Fetches and returns the actual JSON readings.
     """
+    return get_observed_range_raw(municipality_id, station_code, date, date, api_key, client=client)
 
-    # Format the start and end timestamps for the full day in UTC
-    start = date.strftime("%Y-%m-%dT00:00:00UTC")
-    end = date.strftime("%Y-%m-%dT23:59:59UTC")
+def get_observed_range_raw(municipality_id, station_code, start_date, end_date, api_key, client=None,
+                           refresh=False):
+    """
+    Fetch raw daily observed observations for a station over a date range.
 
-    url = f"https://opendata.aemet.es/opendata/api/valores/climatologicos/diarios/datos/fechaini/{start}/fechafin/{end}/estacion/{station_code}"
+    The range must not exceed MAX_OBSERVED_WINDOW_DAYS; use split_date_range for longer ones.
+    Returns one record per day that the station published. Pass refresh=True to bypass
+    the response cache (see fetch_datos), e.g. when re-polling days that were missing.
+    """
+    # Format the start and end timestamps covering the full days in UTC
+    start = start_date.strftime("%Y-%m-%dT00:00:00UTC")
+    end = end_date.strftime("%Y-%m-%dT23:59:59UTC")
 
-    # First call to retrieve the data URL
-    data_url = get_data_url(url, municipality_id, api_key, "OBSERVED")
-    if not data_url:
+    client = client or get_default_client()
+    url = f"{client.base_url}/valores/climatologicos/diarios/datos/fechaini/{start}/fechafin/{end}/estacion/{station_code}"
+
+    # Metadata call plus payload call (or a cache hit)
+    return fetch_datos(url, municipality_id, api_key, "OBSERVED", client=client, refresh=refresh)
+
+def get_observed_all_raw(date, api_key, client=None, station_codes=None):
+    """
+    Fetch raw daily observed values for every AEMET station on a given date.
+
+    Same two-step protocol as get_observed_raw, but against the 'todasestaciones'
+    endpoint, so one metadata call and one payload call cover all municipalities.
+    See get_observed_all_range_raw for `station_codes`.
+    """
+    return get_observed_all_range_raw(date, date, api_key, client=client, station_codes=station_codes)
+
+def get_observed_all_range_raw(start_date, end_date, api_key, client=None, station_codes=None):
+    """
+    Fetch raw daily observed values for every AEMET station over a date range.
+
+    The range must not exceed MAX_OBSERVED_ALL_WINDOW_DAYS; use split_date_range for longer ones.
+
+    When `station_codes` is given, the payload is streamed and only the records of
+    those stations are kept, so memory no longer grows with the size of the
+    all-stations payload. The filtered list is what gets cached.
+
+    Identical calls (same dates and station set) made during the run are coalesced
+    by the client's SingleFlight, like fetch_datos.
+    """
+    # Format the start and end timestamps covering the full days in UTC
+    start = start_date.strftime("%Y-%m-%dT00:00:00UTC")
+    end = end_date.strftime("%Y-%m-%dT23:59:59UTC")
+
+    client = client or get_default_client()
+    url = f"{client.base_url}/valores/climatologicos/diarios/datos/fechaini/{start}/fechafin/{end}/todasestaciones"
+
+    if station_codes is None:
+        # Metadata call plus payload call with the readings of all stations (or a cache hit)
+        return fetch_datos(url, None, api_key, "OBSERVED_ALL", client=client)
+
+    wanted = frozenset(station_codes)
+    return client.single_flight.do(
+        ("OBSERVED_ALL", url, wanted),
+        lambda: _stream_observed_all(url, wanted, api_key, client)
+    )
+
+def _stream_observed_all(url, wanted, api_key, client):
+    # The station set is part of the cache key: a different filter is a different entry
+    cache_params = {'stations': ','.join(sorted(wanted))}
+    cache = client.cache
+    if cache:
+        cached = cache.get("OBSERVED_ALL", url, cache_params)
+        if cached is not None:
+            return cached
+        if cache.offline:
+            logging.error("OBSERVED_ALL - Not in cache (offline mode)")
+            return None
+
+    try:
+        data = list(stream_datos(url, None, api_key, "OBSERVED_ALL", client=client,
+                                 keep=lambda record: record.get('indicativo') in wanted))
+    except (requests.RequestException, ValueError) as e:
+        logging.error(f"OBSERVED_ALL - Streaming the payload failed: {e}")
         return None
-    
-    # Second call to fetch the actual observed data
-    return get_json_with_retry(data_url, query_type="OBSERVED", municipality_id=municipality_id)
 
-def get_forecast_raw(municipality_id, postal_code, api_key):
+    if cache:
+        cache.put("OBSERVED_ALL", url, data, cache_params)
+    return data
+
+def get_forecast_raw(municipality_id, postal_code, api_key, client=None):
     """
     Fetch raw hourly weather forecast for the next 24 hours for a municipality.
 
@@ -125,13 +845,9 @@ def get_forecast_raw(municipality_id, postal_code, api_key):
       3. Retrieve and return the JSON forecast array.
     """
     # Construct the specific forecast endpoint URL for the municipality
-    url = f"https://opendata.aemet.es/opendata/api/prediccion/especifica/municipio/horaria/{postal_code}"
+    client = client or get_default_client()
+    url = f"{client.base_url}/prediccion/especifica/municipio/horaria/{postal_code}"
     
 
-    # Obtain the URL where the 24h forecast JSON is hosted
-    data_url = get_data_url(url, municipality_id, api_key, "FORECAST")
-    if not data_url:
-        return None
-    
-    # Fetch and return the actual forecast data
-    return get_json_with_retry(data_url, query_type="FORECAST", municipality_id=municipality_id)
+    # Obtain the URL where the 24h forecast JSON is hosted and fetch it (or a cache hit)
+    return fetch_datos(url, municipality_id, api_key, "FORECAST", client=client)
@@ -0,0 +1,126 @@
+from collections import namedtuple
+from datetime import timedelta
+
+# One re-poll request: a fechaini/fechafin window of one station covering some of its gap dates
+RepollRequest = namedtuple('RepollRequest', ['municipality_id', 'station_code', 'start', 'end', 'dates'])
+
+# A weather_observations row counts as observed when any observed column has a value
+OBSERVED_PRESENT = """num_nonnulls(
+      w.temperature_observed_avg, w.temperature_observed_max, w.temperature_observed_min,
+      w.humidity_observed_avg, w.humidity_observed_max, w.humidity_observed_min,
+      w.precipitation) > 0"""
+
+def scan_observed_gaps(cursor, start_date, end_date):
+    """
+    Queue every (municipality, day) in [start_date, end_date] without observed data.
+
+    The calendar is built with generate_series and anti-joined against
+    weather_observations in one statement: a day is a gap when its row is missing or
+    all observed columns are NULL. Already-queued gaps keep their attempt count. Queued
+    gaps that have been filled since (by a backfill or a manual run) are removed.
+
+    Returns:
+        int: number of newly queued gaps.
+    """
+    cursor.execute(f"""
+    INSERT INTO observed_gaps (municipality_id, date)
+    SELECT m.municipality_id, d.day::date
+    FROM municipalities m
+    CROSS JOIN generate_series(%s::date, %s::date, interval '1 day') AS d(day)
+    WHERE NOT EXISTS (
+      SELECT 1 FROM weather_observations w
+      WHERE w.municipality_id = m.municipality_id
+        AND w.date = d.day::date
+        AND {OBSERVED_PRESENT}
+    )
+    ON CONFLICT (municipality_id, date) DO NOTHING;
+    """, (start_date, end_date))
+    queued = cursor.rowcount
+
+    resolve_filled_gaps(cursor)
+    return queued
+
+def resolve_filled_gaps(cursor):
+    """
+    Remove queued gaps whose observed data is now in weather_observations.
+
+    Returns:
+        int: number of gaps removed.
+    """
+    cursor.execute(f"""
+    DELETE FROM observed_gaps g
+    USING weather_observations w
+    WHERE w.municipality_id = g.municipality_id
+      AND w.date = g.date
+      AND {OBSERVED_PRESENT};
+    """)
+    return cursor.rowcount
+
+def next_gaps(cursor, max_attempts):
+    """
+    Queued gaps still worth polling, highest priority first.
+
+    Gaps tried fewer times come first, and among those the most recent days, which
+    are the ones a late station is most likely to have published by now. Gaps that
+    reached `max_attempts` stay in the queue for reference but are no longer polled.
+
+    Returns:
+        list of (municipality_id, station_code, date, attempts) tuples.
+    """
+    cursor.execute("""
+    SELECT g.municipality_id, m.station_code, g.date, g.attempts
+    FROM observed_gaps g
+    JOIN municipalities m ON m.municipality_id = g.municipality_id
+    WHERE g.attempts < %s
+    ORDER BY g.attempts, g.date DESC, g.municipality_id;
+    """, (max_attempts,))
+    return cursor.fetchall()
+
+def plan_repoll(gaps, budget, max_days):
+    """
+    Turn prioritized gaps into at most `budget` per-station range requests.
+
+    Gaps are grouped by municipality in priority order. The dates of a municipality
+    are covered by as few fechaini/fechafin windows of at most `max_days` days as
+    possible, since one request returns every day of its window.
+
+    Parameters:
+        gaps (list of tuple): (municipality_id, station_code, date, attempts), highest priority first.
+        budget (int): Maximum number of requests.
+        max_days (int): Longest window the endpoint accepts.
+
+    Returns:
+        list of RepollRequest
+    """
+    by_municipality = {}
+    for municipality_id, station_code, day, _ in gaps:
+        by_municipality.setdefault((municipality_id, station_code), []).append(day)
+
+    requests = []
+    for (municipality_id, station_code), days in by_municipality.items():
+        days = sorted(days)
+        window = [days[0]]
+        for day in days[1:]:
+            if day - window[0] < timedelta(days=max_days):
+                window.append(day)
+                continue
+            requests.append(RepollRequest(municipality_id, station_code, window[0], window[-1], set(window)))
+            window = [day]
+        requests.append(RepollRequest(municipality_id, station_code, window[0], window[-1], set(window)))
+        if len(requests) >= budget:
+            break
+
+    return requests[:budget]
+
+def record_attempts(cursor, requests):
+    """
+    Count one more attempt for every gap covered by the given requests.
+    """
+    pairs = [(request.municipality_id, day) for request in requests for day in request.dates]
+    if not pairs:
+        return
+    cursor.execute("""
+    UPDATE observed_gaps
+    SET attempts = attempts + 1, last_attempt = now()
+    WHERE (municipality_id, date) IN (SELECT * FROM unnest(%s::integer[], %s::date[]));
+    """, ([municipality_id for municipality_id, _ in pairs], [day for _, day in pairs]))
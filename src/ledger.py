@@ -0,0 +1,97 @@
+from psycopg2.extras import execute_values
+
+# Kinds of work tracked per municipality and run date
+KINDS = ('forecast', 'observed')
+
+# Ledger states
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+def start_run(cursor, run_date, work, reset=True):
+    """
+    Register the work of a run in run_ledger.
+
+    Parameters:
+        cursor: Database cursor.
+        run_date (date): Day the pipeline runs for.
+        work (dict): municipality_id -> iterable of kinds to track.
+        reset (bool): True marks every entry pending again (fresh run); False keeps the
+            state of entries that already exist (resume).
+    """
+    rows = [(run_date, municipality_id, kind, PENDING)
+            for municipality_id, kinds in work.items() for kind in kinds]
+    if not rows:
+        return
+
+    conflict = "DO UPDATE SET status = EXCLUDED.status, last_error = NULL" if reset else "DO NOTHING"
+    q = f"""
+    INSERT INTO run_ledger (run_date, municipality_id, kind, status)
+    VALUES %s
+    ON CONFLICT (run_date, municipality_id, kind) {conflict};
+    """
+    execute_values(cursor, q, rows)
+
+def pending_work(cursor, run_date):
+    """
+    Work of a run that is not done yet (pending or failed).
+
+    Returns:
+        dict: municipality_id -> set of kinds still to do.
+    """
+    cursor.execute("""
+    SELECT municipality_id, kind
+    FROM run_ledger
+    WHERE run_date = %s AND status <> %s
+    ORDER BY municipality_id, kind;
+    """, (run_date, DONE))
+
+    work = {}
+    for municipality_id, kind in cursor.fetchall():
+        work.setdefault(municipality_id, set()).add(kind)
+    return work
+
+def record_results(cursor, run_date, results):
+    """
+    Store the outcome of one attempt for many (municipality, kind) entries at once.
+    Call it in the same transaction as the data load, so the ledger never claims
+    work that was rolled back.
+
+    Parameters:
+        results (list of tuple): (municipality_id, kind, status, started_at, finished_at, error)
+            with status DONE or FAILED and error None on success.
+    """
+    if not results:
+        return
+
+    q = """
+    UPDATE run_ledger AS l
+    SET status = v.status,
+        attempts = l.attempts + 1,
+        started_at = v.started_at,
+        finished_at = v.finished_at,
+        last_error = v.error
+    FROM (VALUES %s) AS v (run_date, municipality_id, kind, status, started_at, finished_at, error)
+    WHERE l.run_date = v.run_date
+      AND l.municipality_id = v.municipality_id
+      AND l.kind = v.kind;
+    """
+    execute_values(cursor, q, [
+        (run_date, municipality_id, kind, status, started_at, finished_at, error)
+        for municipality_id, kind, status, started_at, finished_at, error in results
+    ], template="(%s::date, %s::integer, %s, %s, %s::timestamptz, %s::timestamptz, %s::text)")
+
+def summarize(cursor, run_date):
+    """
+    Count the entries of a run by kind and status.
+
+    Returns:
+        dict: (kind, status) -> count.
+    """
+    cursor.execute("""
+    SELECT kind, status, count(*)
+    FROM run_ledger
+    WHERE run_date = %s
+    GROUP BY kind, status;
+    """, (run_date,))
+    return {(kind, status): count for kind, status, count in cursor.fetchall()}
@@ -1,12 +1,49 @@
+import csv
+import io
 import json
+import re
+from datetime import date, datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+# Columns of weather_forecasts / weather_observations, paired with the transform dict key.
+# The weather_records view joins both tables back into one row per municipality and day.
+FORECAST_COLUMNS = [
+    ('temperature_forecast_avg', 'temperature_avg'),
+    ('temperature_forecast_max', 'temperature_max'),
+    ('temperature_forecast_min', 'temperature_min'),
+    ('humidity_forecast_avg', 'humidity_avg'),
+    ('humidity_forecast_max', 'humidity_max'),
+    ('humidity_forecast_min', 'humidity_min'),
+    ('precipitations', 'precipitations'),
+    ('prob_precipitation', 'prob_precipitation'),
+    ('prob_storm', 'prob_storm'),
+]
+OBSERVED_COLUMNS = [
+    ('temperature_observed_avg', 'temperature_avg'),
+    ('temperature_observed_max', 'temperature_max'),
+    ('temperature_observed_min', 'temperature_min'),
+    ('humidity_observed_avg', 'humidity_avg'),
+    ('humidity_observed_max', 'humidity_max'),
+    ('humidity_observed_min', 'humidity_min'),
+    ('precipitation', 'precipitation'),
+]
+# Forecast columns stored as JSONB
+JSON_COLUMNS = {'precipitations', 'prob_precipitation', 'prob_storm'}
+# Range-partitioned tables (on date) and the span of one partition
+PARTITIONED_TABLES = {'weather_forecasts': 'year', 'weather_observations': 'year', 'forecast_hourly': 'month'}
+# Bounds as shown by pg_get_expr: FOR VALUES FROM ('2025-01-01') TO ('2026-01-01')
+PARTITION_BOUND_RE = re.compile(r"FROM \('(?P<start>[\d-]+)'\) TO \('(?P<end>[\d-]+)'\)")
+# Typed forecast_hourly value columns (same names as the transform_forecast_hourly keys)
+HOURLY_COLUMNS = ['temperature', 'humidity', 'precipitation', 'prob_precipitation', 'prob_storm']
 
 def load_observed_data(cursor, data):
     """
-    Insert observed data in WEATHER_records table
+    Insert observed data into weather_observations table
     """
-    # Prepare SQL statement to update with observed data into an existing "weather_records" record
+    # Upsert that leaves the row alone (no new row version) when nothing changed
     q = """
-    INSERT INTO weather_records (
+    INSERT INTO weather_observations (
       municipality_id,
       date,
       temperature_observed_avg,
@@ -25,8 +62,26 @@ def load_observed_data(cursor, data):
         humidity_observed_avg = EXCLUDED.humidity_observed_avg,
         humidity_observed_max = EXCLUDED.humidity_observed_max,
         humidity_observed_min = EXCLUDED.humidity_observed_min,
-        precipitation = EXCLUDED.precipitation;
+        precipitation = EXCLUDED.precipitation
+      WHERE (
+        weather_observations.temperature_observed_avg,
+        weather_observations.temperature_observed_max,
+        weather_observations.temperature_observed_min,
+        weather_observations.humidity_observed_avg,
+        weather_observations.humidity_observed_max,
+        weather_observations.humidity_observed_min,
+        weather_observations.precipitation
+      ) IS DISTINCT FROM (
+        EXCLUDED.temperature_observed_avg,
+        EXCLUDED.temperature_observed_max,
+        EXCLUDED.temperature_observed_min,
+        EXCLUDED.humidity_observed_avg,
+        EXCLUDED.humidity_observed_max,
+        EXCLUDED.humidity_observed_min,
+        EXCLUDED.precipitation
+      );
     """
+    ensure_partitions(cursor, 'weather_observations', [data['date']])
     cursor.execute(q, (
         data['municipality_id'],
         data['date'],
@@ -42,11 +97,12 @@ def load_observed_data(cursor, data):
 
 def load_forecast_data(cursor, data):
     """
-    Insert forecast data into weather_records table
+    Insert forecast data into weather_forecasts table
     """
-    # Prepare INSERT statement with ON CONFLICT to avoid duplicate entries
+    # Prepare INSERT statement with ON CONFLICT to avoid duplicate entries; a reload of
+    # the same forecast leaves the row alone
     q = """
-    INSERT INTO weather_records (
+    INSERT INTO weather_forecasts (
       municipality_id,
       date,
       temperature_forecast_max,
@@ -69,8 +125,30 @@ def load_forecast_data(cursor, data):
         humidity_forecast_min = EXCLUDED.humidity_forecast_min,
         precipitations = EXCLUDED.precipitations,
         prob_precipitation = EXCLUDED.prob_precipitation,
-        prob_storm = EXCLUDED.prob_storm;
+        prob_storm = EXCLUDED.prob_storm
+      WHERE (
+        weather_forecasts.temperature_forecast_max,
+        weather_forecasts.temperature_forecast_min,
+        weather_forecasts.temperature_forecast_avg,
+        weather_forecasts.humidity_forecast_avg,
+        weather_forecasts.humidity_forecast_max,
+        weather_forecasts.humidity_forecast_min,
+        weather_forecasts.precipitations,
+        weather_forecasts.prob_precipitation,
+        weather_forecasts.prob_storm
+      ) IS DISTINCT FROM (
+        EXCLUDED.temperature_forecast_max,
+        EXCLUDED.temperature_forecast_min,
+        EXCLUDED.temperature_forecast_avg,
+        EXCLUDED.humidity_forecast_avg,
+        EXCLUDED.humidity_forecast_max,
+        EXCLUDED.humidity_forecast_min,
+        EXCLUDED.precipitations,
+        EXCLUDED.prob_precipitation,
+        EXCLUDED.prob_storm
+      );
     """
+    ensure_partitions(cursor, 'weather_forecasts', [data['date']])
     cursor.execute(q, (
         data['municipality_id'],
         data['date'],
@@ -83,4 +161,367 @@ def load_forecast_data(cursor, data):
         json.dumps(data['precipitations']),
         json.dumps(data['prob_precipitation']),
         json.dumps(data['prob_storm'])
-    ))
\ No newline at end of file
+    ))
+
+
+def load_observed_batch(cursor, records):
+    """
+    Insert many observed records into weather_observations with a single statement
+    """
+    if not records:
+        return
+
+    # Same upsert as load_observed_data, but with a multi-row VALUES list
+    q = """
+    INSERT INTO weather_observations (
+      municipality_id,
+      date,
+      temperature_observed_avg,
+      temperature_observed_max,
+      temperature_observed_min,
+      humidity_observed_avg,
+      humidity_observed_max,
+      humidity_observed_min,
+      precipitation
+    ) VALUES %s
+    ON CONFLICT (municipality_id, date) DO UPDATE
+      SET
+        temperature_observed_avg = EXCLUDED.temperature_observed_avg,
+        temperature_observed_max = EXCLUDED.temperature_observed_max,
+        temperature_observed_min = EXCLUDED.temperature_observed_min,
+        humidity_observed_avg = EXCLUDED.humidity_observed_avg,
+        humidity_observed_max = EXCLUDED.humidity_observed_max,
+        humidity_observed_min = EXCLUDED.humidity_observed_min,
+        precipitation = EXCLUDED.precipitation
+      WHERE (
+        weather_observations.temperature_observed_avg,
+        weather_observations.temperature_observed_max,
+        weather_observations.temperature_observed_min,
+        weather_observations.humidity_observed_avg,
+        weather_observations.humidity_observed_max,
+        weather_observations.humidity_observed_min,
+        weather_observations.precipitation
+      ) IS DISTINCT FROM (
+        EXCLUDED.temperature_observed_avg,
+        EXCLUDED.temperature_observed_max,
+        EXCLUDED.temperature_observed_min,
+        EXCLUDED.humidity_observed_avg,
+        EXCLUDED.humidity_observed_max,
+        EXCLUDED.humidity_observed_min,
+        EXCLUDED.precipitation
+      );
+    """
+    ensure_partitions(cursor, 'weather_observations', {data['date'] for data in records})
+    execute_values(cursor, q, [(
+        data['municipality_id'],
+        data['date'],
+        data['temperature_avg'],
+        data['temperature_max'],
+        data['temperature_min'],
+        data['humidity_avg'],
+        data['humidity_max'],
+        data['humidity_min'],
+        data['precipitation']
+    ) for data in records])
+
+
+def _staging_row(seq, kind, data):
+    """
+    Build one CSV row for weather_records_staging, or raise ValueError if the record is unusable.
+    """
+    municipality_id = data.get('municipality_id')
+    if not isinstance(municipality_id, int) or isinstance(municipality_id, bool):
+        raise ValueError(f"invalid municipality_id {municipality_id!r}")
+
+    day = data.get('date')
+    if isinstance(day, (date, datetime)):
+        day = day.strftime('%Y-%m-%d')
+    try:
+        datetime.strptime(day, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid date {day!r}")
+
+    # Columns of the other kind stay NULL
+    values = {}
+    columns = FORECAST_COLUMNS if kind == 'forecast' else OBSERVED_COLUMNS
+    for column, key in columns:
+        value = data.get(key)
+        if column in JSON_COLUMNS and value is not None:
+            value = json.dumps(value)
+        values[column] = value
+
+    return [seq, kind, municipality_id, day] + [
+        values.get(column) for column, _ in FORECAST_COLUMNS + OBSERVED_COLUMNS
+    ]
+
+
+def bulk_load_records(cursor, forecast_records, observed_records):
+    """
+    Load a whole run of forecast and observed records in one set-based operation.
+
+    Records are validated, streamed with COPY into a temporary staging table
+    (temporary tables are not WAL-logged), and upserted with one INSERT ... SELECT
+    per kind: forecasts into weather_forecasts, observations into weather_observations,
+    exactly like load_forecast_data / load_observed_data. When a key appears more than
+    once, the last record wins; an existing row is only rewritten if a value changed.
+    Nothing is committed here, so the caller decides the transaction boundary.
+
+    Returns:
+        dict with 'staged' and 'merged' (rows inserted or changed) counts and
+        'rejected', a list of (record, reason) tuples for rows that could not be loaded.
+    """
+    rejected = []
+    rows = []
+    records_by_seq = {}
+    for kind, records in (('forecast', forecast_records), ('observed', observed_records)):
+        for data in records:
+            seq = len(records_by_seq)
+            try:
+                rows.append(_staging_row(seq, kind, data))
+            except ValueError as e:
+                rejected.append((data, str(e)))
+                continue
+            records_by_seq[seq] = data
+
+    if not rows:
+        return {'staged': 0, 'merged': 0, 'rejected': rejected}
+
+    data_columns = [column for column, _ in FORECAST_COLUMNS + OBSERVED_COLUMNS]
+
+    # Backfills and reprocessing may reach years whose partition does not exist yet
+    ensure_partitions(cursor, 'weather_forecasts', {row[3] for row in rows if row[1] == 'forecast'})
+    ensure_partitions(cursor, 'weather_observations', {row[3] for row in rows if row[1] == 'observed'})
+
+    # Session-private staging table, emptied again at commit
+    cursor.execute(f"""
+    CREATE TEMP TABLE IF NOT EXISTS weather_records_staging (
+      seq INTEGER NOT NULL,
+      kind TEXT NOT NULL,
+      municipality_id INTEGER NOT NULL,
+      date DATE NOT NULL,
+      {', '.join(f'{column} JSONB' if column in JSON_COLUMNS else f'{column} REAL' for column in data_columns)}
+    ) ON COMMIT DELETE ROWS;
+    """)
+    cursor.execute("TRUNCATE weather_records_staging;")
+
+    # Stream all rows in one COPY (empty unquoted CSV fields are NULL)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY weather_records_staging (seq, kind, municipality_id, date, {', '.join(data_columns)}) "
+        f"FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+    # Rows pointing at unknown municipalities would violate the foreign key: report and drop them
+    cursor.execute("""
+    DELETE FROM weather_records_staging s
+    WHERE NOT EXISTS (SELECT 1 FROM municipalities m WHERE m.municipality_id = s.municipality_id)
+    RETURNING seq;
+    """)
+    for (seq,) in cursor.fetchall():
+        rejected.append((records_by_seq[seq], "unknown municipality_id"))
+
+    # Each kind only writes its own narrow table, so a late observation never rewrites
+    # the forecast JSONB of its day (and vice versa)
+    merged = 0
+    for table, kind, columns in (('weather_forecasts', 'forecast', FORECAST_COLUMNS),
+                                 ('weather_observations', 'observed', OBSERVED_COLUMNS)):
+        names = [column for column, _ in columns]
+        cursor.execute(f"""
+        INSERT INTO {table} (municipality_id, date, {', '.join(names)})
+        SELECT DISTINCT ON (municipality_id, date) municipality_id, date, {', '.join(names)}
+        FROM weather_records_staging
+        WHERE kind = '{kind}'
+        ORDER BY municipality_id, date, seq DESC
+        ON CONFLICT (municipality_id, date) DO UPDATE
+          SET {', '.join(f'{name} = EXCLUDED.{name}' for name in names)}
+          WHERE ({', '.join(f'{table}.{name}' for name in names)})
+            IS DISTINCT FROM ({', '.join(f'EXCLUDED.{name}' for name in names)});
+        """)
+        merged += cursor.rowcount
+
+    return {'staged': len(rows), 'merged': merged, 'rejected': rejected}
+
+
+def _as_date(day):
+    if isinstance(day, str):
+        day = datetime.strptime(day[:10], '%Y-%m-%d')
+    return date(day.year, day.month, day.day)
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_for(table, day):
+    """
+    Name and [start, end) bounds of the partition of `table` holding `day`
+    (a date, datetime or 'YYYY-MM-DD' string).
+    """
+    day = _as_date(day)
+    if PARTITIONED_TABLES[table] == 'year':
+        return f"{table}_{day:%Y}", date(day.year, 1, 1), date(day.year + 1, 1, 1)
+    start = date(day.year, day.month, 1)
+    return f"{table}_{start:%Y_%m}", start, _next_month(start)
+
+
+def ensure_partitions(cursor, table, days):
+    """
+    Create the partitions of a range-partitioned table that the given days fall into,
+    if they do not exist yet.
+
+    Existing partitions are looked up first, so the usual load takes no lock. Only when
+    one is missing does a transaction-scoped advisory lock serialize the loaders, so
+    two of them never race on the same CREATE TABLE.
+
+    Returns:
+        list of partition names covering the days.
+    """
+    partitions = sorted({partition_for(table, day) for day in days})
+    if not partitions:
+        return []
+
+    cursor.execute("SELECT name FROM unnest(%s::text[]) AS name WHERE to_regclass(name) IS NULL;",
+                   ([name for name, _, _ in partitions],))
+    missing = {row[0] for row in cursor.fetchall()}
+    if not missing:
+        return [name for name, _, _ in partitions]
+
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (table,))
+    for name, start, end in partitions:
+        if name not in missing:
+            continue
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table}
+          FOR VALUES FROM (%s) TO (%s);
+        """, (start, end))
+    return [name for name, _, _ in partitions]
+
+
+def upcoming_partitions(table, today, ahead):
+    """
+    First day of the partition holding `today` and of the `ahead` partitions after it.
+    """
+    days = []
+    day = _as_date(today)
+    for _ in range(ahead + 1):
+        _, start, end = partition_for(table, day)
+        days.append(start)
+        day = end
+    return days
+
+
+def retention_cutoff(table, today, keep):
+    """
+    First day still kept when only the `keep` most recent partitions (the current one
+    included) are retained.
+    """
+    _, start, _ = partition_for(table, today)
+    for _ in range(keep - 1):
+        start = partition_for(table, start - timedelta(days=1))[1]
+    return start
+
+
+def list_partitions(cursor, table):
+    """
+    Range partitions of a table.
+
+    Returns:
+        list of (name, start, end) tuples ordered by start, with [start, end) the
+        partition bounds. A DEFAULT partition, if any, is left out.
+    """
+    cursor.execute("""
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass;
+    """, (table,))
+
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = PARTITION_BOUND_RE.search(bound or '')
+        if match:
+            partitions.append((name, _as_date(match['start']), _as_date(match['end'])))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def drop_partitions_before(cursor, table, cutoff):
+    """
+    Retention: drop every partition of `table` whose rows are all older than `cutoff`.
+    Dropping a partition is instant and leaves no dead tuples, unlike a DELETE.
+
+    Returns:
+        list of dropped partition names.
+    """
+    dropped = []
+    for name, _, end in list_partitions(cursor, table):
+        if end <= _as_date(cutoff):
+            cursor.execute(f"DROP TABLE {name};")
+            dropped.append(name)
+    return dropped
+
+
+def bulk_load_forecast_hourly(cursor, records):
+    """
+    Load transform_forecast_hourly records into the monthly-partitioned forecast_hourly table.
+
+    Missing partitions are created first; rows are then streamed with COPY into a
+    temporary staging table and upserted with one INSERT ... ON CONFLICT. When a key
+    appears more than once, the last record wins. Rows for unknown municipalities
+    are skipped, and rows that did not change are not rewritten. Nothing is
+    committed here.
+
+    Returns:
+        int: number of rows written.
+    """
+    rows = []
+    for data in records:
+        day = data['date']
+        if isinstance(day, (date, datetime)):
+            day = day.strftime('%Y-%m-%d')
+        rows.append([len(rows), data['municipality_id'], day, data['hour']]
+                    + [data.get(column) for column in HOURLY_COLUMNS])
+    if not rows:
+        return 0
+
+    ensure_partitions(cursor, 'forecast_hourly', {row[2] for row in rows})
+
+    cursor.execute(f"""
+    CREATE TEMP TABLE IF NOT EXISTS forecast_hourly_staging (
+      seq INTEGER NOT NULL,
+      municipality_id INTEGER NOT NULL,
+      date DATE NOT NULL,
+      hour SMALLINT NOT NULL,
+      temperature REAL,
+      humidity REAL,
+      precipitation REAL,
+      prob_precipitation SMALLINT,
+      prob_storm SMALLINT
+    ) ON COMMIT DELETE ROWS;
+    """)
+    cursor.execute("TRUNCATE forecast_hourly_staging;")
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY forecast_hourly_staging (seq, municipality_id, date, hour, {', '.join(HOURLY_COLUMNS)}) "
+        f"FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+
+    cursor.execute(f"""
+    INSERT INTO forecast_hourly (municipality_id, date, hour, {', '.join(HOURLY_COLUMNS)})
+    SELECT DISTINCT ON (s.municipality_id, s.date, s.hour)
+      s.municipality_id, s.date, s.hour, {', '.join(f's.{column}' for column in HOURLY_COLUMNS)}
+    FROM forecast_hourly_staging s
+    JOIN municipalities m ON m.municipality_id = s.municipality_id
+    ORDER BY s.municipality_id, s.date, s.hour, s.seq DESC
+    ON CONFLICT (municipality_id, date, hour) DO UPDATE
+      SET {', '.join(f'{column} = EXCLUDED.{column}' for column in HOURLY_COLUMNS)}
+      WHERE ({', '.join(f'forecast_hourly.{column}' for column in HOURLY_COLUMNS)})
+        IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in HOURLY_COLUMNS)});
+    """)
+    return cursor.rowcount
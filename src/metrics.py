@@ -0,0 +1,184 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+# Finer buckets for in-process stages: a transform call takes well under a millisecond
+STAGE_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, math.inf)
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram, as exposed by Prometheus.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside the bucket that contains it.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound if not math.isinf(bound) else lower
+        return lower
+
+class Metrics:
+    """
+    Thread-safe collector for one pipeline run.
+
+    Records HTTP latency per endpoint and status, retries and bytes received per
+    endpoint, wall time per pipeline stage and rows upserted per stage. At the end
+    of a run the values are written as a Prometheus text-format file and a JSON summary.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.http_latency = {}   # (endpoint, status) -> Histogram
+        self.http_retries = {}   # endpoint -> count
+        self.http_bytes = {}     # endpoint -> bytes received
+        self.stage_latency = {}  # stage -> Histogram
+        self.rows = {}           # stage -> rows upserted
+
+    def observe_http(self, endpoint, status, seconds, bytes_received=0):
+        with self._lock:
+            self.http_latency.setdefault((endpoint, str(status)), Histogram()).observe(seconds)
+            self.http_bytes[endpoint] = self.http_bytes.get(endpoint, 0) + bytes_received
+
+    def add_bytes(self, endpoint, count):
+        # Body bytes of streamed responses, counted as they are read
+        with self._lock:
+            self.http_bytes[endpoint] = self.http_bytes.get(endpoint, 0) + count
+
+    def inc_retry(self, endpoint):
+        with self._lock:
+            self.http_retries[endpoint] = self.http_retries.get(endpoint, 0) + 1
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            self.stage_latency.setdefault(stage, Histogram(STAGE_BUCKETS)).observe(seconds)
+
+    def add_rows(self, stage, count):
+        with self._lock:
+            self.rows[stage] = self.rows.get(stage, 0) + count
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time a block of code as one observation of `stage`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def to_prometheus(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            lines += _histogram_lines(
+                'aemet_http_request_duration_seconds', 'Latency of AEMET HTTP requests.',
+                {(('endpoint', endpoint), ('status', status)): h for (endpoint, status), h in self.http_latency.items()},
+            )
+            lines += _counter_lines(
+                'aemet_http_retries_total', 'Retried AEMET HTTP attempts.',
+                {(('endpoint', endpoint),): n for endpoint, n in self.http_retries.items()},
+            )
+            lines += _counter_lines(
+                'aemet_http_response_bytes_total', 'Bytes received from AEMET.',
+                {(('endpoint', endpoint),): n for endpoint, n in self.http_bytes.items()},
+            )
+            lines += _histogram_lines(
+                'pipeline_stage_duration_seconds', 'Time spent per pipeline stage call.',
+                {(('stage', stage),): h for stage, h in self.stage_latency.items()},
+            )
+            lines += _counter_lines(
+                'pipeline_rows_upserted_total', 'Rows upserted into the database.',
+                {(('stage', stage),): n for stage, n in self.rows.items()},
+            )
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        Compact JSON-serialisable view: counts, totals and p50/p99 estimates.
+        """
+        def describe(h):
+            return {
+                'count': h.count,
+                'sum_seconds': round(h.sum, 3),
+                'p50_seconds': _round(h.quantile(0.5)),
+                'p99_seconds': _round(h.quantile(0.99)),
+            }
+
+        with self._lock:
+            return {
+                'started': self.started,
+                'duration_seconds': round(time.time() - self.started, 3),
+                'http': {
+                    f"{endpoint} {status}": describe(h)
+                    for (endpoint, status), h in sorted(self.http_latency.items())
+                },
+                'http_retries': dict(self.http_retries),
+                'http_bytes': dict(self.http_bytes),
+                'stages': {stage: describe(h) for stage, h in sorted(self.stage_latency.items())},
+                'rows_upserted': dict(self.rows),
+            }
+
+    def write(self, directory, basename='metrics'):
+        """
+        Write <basename>.prom and <basename>.json into `directory`.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f'{basename}.prom').write_text(self.to_prometheus(), encoding='utf-8')
+        (directory / f'{basename}.json').write_text(json.dumps(self.summary(), indent=2), encoding='utf-8')
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+def _labels(pairs):
+    return ','.join(f'{name}="{value}"' for name, value in pairs)
+
+def _counter_lines(name, help_text, values):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for labels, value in sorted(values.items()):
+        lines.append(f'{name}{{{_labels(labels)}}} {value}')
+    return lines
+
+def _histogram_lines(name, help_text, histograms):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, h in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(h.buckets, h.counts):
+            cumulative += count
+            le = '+Inf' if math.isinf(bound) else f'{bound:g}'
+            lines.append(f'{name}_bucket{{{_labels(labels + (("le", le),))}}} {cumulative}')
+        lines.append(f'{name}_sum{{{_labels(labels)}}} {h.sum}')
+        lines.append(f'{name}_count{{{_labels(labels)}}} {h.count}')
+    return lines
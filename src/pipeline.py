@@ -1,15 +1,36 @@
+import argparse
 import logging
-import configparser
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import psycopg2
-from datetime import datetime, timedelta
-import time
+from datetime import datetime, timedelta, timezone
 import os
+import psycopg2
 from dotenv import load_dotenv
 
-from .extract import get_observed_raw, get_forecast_raw
-from .transform import transform_observed, transform_forecast
-from .load import load_observed_data, load_forecast_data
+from .extract import (AemetClient, RateLimiter, BackoffPolicy, CircuitOpenError, CIRCUIT_OPEN, BASE_URL,
+                      MAX_OBSERVED_WINDOW_DAYS, get_observed_raw, get_observed_range_raw, get_observed_all_raw,
+                      get_forecast_raw)
+from .cache import ResponseCache
+from .config import REQUIRED, read_section
+from .archive import RawArchive
+from .db import ConnectionPool
+from .metrics import Metrics
+from .transform import (transform_observed, transform_observed_range, transform_observed_bulk, transform_forecast,
+                        transform_forecast_hourly)
+from .load import (PARTITIONED_TABLES, bulk_load_records, bulk_load_forecast_hourly, load_observed_batch,
+                   ensure_partitions, upcoming_partitions, retention_cutoff, drop_partitions_before)
+from .stages import run_stages
+from .ledger import KINDS, DONE, FAILED, start_run, pending_work, record_results, summarize
+from .gaps import scan_observed_gaps, resolve_filled_gaps, next_gaps, plan_repoll, record_attempts
+from .skill import update_forecast_errors, rebuild_forecast_errors
+from .rollups import update_rollups, rebuild_rollups
+from .drought import refresh_drought_indices
+from .events import THRESHOLDS, detect_events, rebuild_events
+from .spool import Spool, spool_files, unfinished_files, read_spool, save_municipalities, load_municipalities
+
+# Errors meaning PostgreSQL cannot be reached (as opposed to a problem with the data)
+DATABASE_DOWN = (psycopg2.OperationalError, psycopg2.InterfaceError)
 
 def read_db_config():
     """
@@ -17,30 +38,254 @@ def read_db_config():
     Returns:
         Tuple[str, str, str, str, str]: dbname, user, password, host, port
     """
-    cfg = configparser.ConfigParser()
+    db = read_section('database', dict.fromkeys(['dbname', 'user', 'password', 'host', 'port'], REQUIRED))
+    return db['dbname'], db['user'], db['password'], db['host'], db['port']
 
-    # Determine project root directory (two levels up from this file)
-    project_root = Path(__file__).resolve().parent.parent
+def read_pipeline_config():
+    """
+    Reads the optional [pipeline] section of config.ini
+    Returns:
+        dict: workers (int), request_interval (float), max_retries (int), call_deadline (float),
+              observed_mode (str: 'bulk' or 'station'), queue_size (int), load_batch_size (int),
+              base_url (str), loaders (int)
+    """
+    # Fall back to conservative defaults when the section or a key is missing
+    return read_section('pipeline', {
+        'workers': 4,
+        'request_interval': 1.2,
+        'max_retries': 5,
+        'call_deadline': 300.0,
+        'observed_mode': 'bulk',
+        'queue_size': 8,
+        'load_batch_size': 50,
+        'base_url': BASE_URL,
+        'loaders': 1,
+    })
 
-    # Read the config file located at project root
-    cfg.read(project_root / 'config.ini')
-    db = cfg['database']
+def read_cache_config():
+    """
+    Reads the optional [cache] section of config.ini
+    Returns:
+        dict: enabled (bool), directory (Path), max_mb (int), forecast_ttl_hours (float), offline (bool)
+    """
+    return read_section('cache', {
+        'enabled': True,
+        'directory': Path('cache'),
+        'max_mb': 200,
+        'forecast_ttl_hours': 6.0,
+        'offline': False,
+    })
 
-    # Extract and return connection parameters
-    return db['dbname'], db['user'], db['password'], db['host'], db['port']
+def read_breaker_config():
+    """
+    Reads the optional [breaker] section of config.ini
+    Returns:
+        dict: enabled (bool), failure_rate (float), window (int), min_calls (int),
+              cooldown (float), probes (int)
+    """
+    return read_section('breaker', {
+        'enabled': True,
+        'failure_rate': 0.5,
+        'window': 20,
+        'min_calls': 10,
+        'cooldown': 60.0,
+        'probes': 1,
+    })
+
+def read_gaps_config():
+    """
+    Reads the optional [gaps] section of config.ini
+    Returns:
+        dict: enabled (bool), lookback_days (int), request_budget (int), max_attempts (int)
+    """
+    return read_section('gaps', {
+        'enabled': True,
+        'lookback_days': 60,
+        'request_budget': 20,
+        'max_attempts': 8,
+    })
+
+def read_drought_config():
+    """
+    Reads the optional [drought] section of config.ini
+    Returns:
+        dict: enabled (bool), calibration ((first_year, last_year) or None), min_years (int)
+    """
+    section = read_section('drought', {
+        'enabled': True,
+        'calibration_start': None,
+        'calibration_end': None,
+        'min_years': 10,
+    }, types={'calibration_start': int, 'calibration_end': int})
+    first_year, last_year = section['calibration_start'], section['calibration_end']
+    return {
+        'enabled': section['enabled'],
+        'calibration': (first_year, last_year) if first_year and last_year else None,
+        'min_years': section['min_years'],
+    }
+
+def update_drought_indices(pool, since):
+    """
+    Recompute the drought indices and rewrite the months from `since` on (every month
+    when no calibration period is configured, see drought.refresh_drought_indices).
+
+    Returns:
+        int: number of rows written.
+    """
+    settings = read_drought_config()
+    if not settings['enabled']:
+        return 0
+    with pool.connection() as conn, conn.cursor() as cursor:
+        written = refresh_drought_indices(cursor, since, settings['calibration'], settings['min_years'])
+        conn.commit()
+    logging.info(f"Drought indices: {written} municipality months written")
+    return written
+
+def read_events_config():
+    """
+    Reads the optional [events] section of config.ini
+    Returns:
+        dict: enabled (bool) and the detector thresholds (see events.THRESHOLDS)
+    """
+    section = read_section('events', {'enabled': True, **THRESHOLDS})
+    return {
+        'enabled': section.pop('enabled'),
+        'thresholds': section,
+    }
+
+def read_partitions_config():
+    """
+    Reads the optional [partitions] section of config.ini
+    Returns:
+        dict: ahead (int) future partitions created per table, and the retention per
+        table in partitions (years for weather_forecasts / weather_observations, months
+        for forecast_hourly; 0 keeps everything)
+    """
+    # weather_records_retention predates the forecast/observation split and covers both
+    daily_retention = read_section('partitions', {'weather_records_retention': 0})['weather_records_retention']
+    section = read_section('partitions', {
+        'ahead': 1,
+        **{f'{table}_retention': daily_retention if period == 'year' else 0
+           for table, period in PARTITIONED_TABLES.items()},
+    })
+    return {
+        'ahead': section['ahead'],
+        'retention': {table: section[f'{table}_retention'] for table in PARTITIONED_TABLES},
+    }
+
+def maintain_partitions(pool, today, partition_settings):
+    """
+    Create the current and upcoming partitions of every partitioned table and drop the
+    ones past their retention, in one transaction.
+
+    Returns:
+        dict: table -> list of dropped partitions.
+    """
+    dropped = {}
+    with pool.connection() as conn, conn.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            ensure_partitions(cursor, table, upcoming_partitions(table, today, partition_settings['ahead']))
+            keep = partition_settings['retention'][table]
+            if keep > 0:
+                dropped[table] = drop_partitions_before(cursor, table, retention_cutoff(table, today, keep))
+        conn.commit()
+    return dropped
+
+def read_archive_config():
+    """
+    Reads the optional [archive] section of config.ini
+    Returns:
+        dict: enabled (bool), directory (Path)
+    """
+    return read_section('archive', {'enabled': True, 'directory': Path('archive')})
+
+def read_spool_config():
+    """
+    Reads the optional [spool] section of config.ini
+    Returns:
+        dict: enabled (bool), directory (Path)
+    """
+    return read_section('spool', {'enabled': True, 'directory': Path('spool')})
+
+def build_archive():
+    """
+    Create the raw payload archive described by config.ini, or None when disabled.
+    """
+    settings = read_archive_config()
+    return RawArchive(settings['directory']) if settings['enabled'] else None
+
+def archive_safely(put, *args):
+    """
+    Call an archive method such as archive.put_observed. The archive is best-effort:
+    a failure is logged and never stops the run.
+    """
+    try:
+        put(*args)
+    except (OSError, TypeError, ValueError) as e:
+        logging.error(f"Archiving raw payload failed: {e}")
 
-def get_connection():
+def build_cache():
     """
-    Establishes a connection to the PostgreSQL database
+    Create the on-disk response cache described by config.ini, or None when disabled.
     """
-    # Retrieve database credentials
-    dbname, user, pwd, host, port = read_db_config()
+    settings = read_cache_config()
+    if not settings['enabled'] and not settings['offline']:
+        return None
+
+    return ResponseCache(
+        settings['directory'],
+        ttls={'FORECAST': settings['forecast_ttl_hours'] * 3600},
+        max_bytes=settings['max_mb'] * 1024 * 1024,
+        offline=settings['offline'],
+    )
 
-    # Connect to the PostgreSQL database
-    conn = psycopg2.connect(dbname=dbname, user=user, password=pwd, host=host, port=port)
+def read_pool_config():
+    """
+    Reads the optional connection pool keys of the [database] section of config.ini
+    Returns:
+        dict: minconn (int), maxconn (int), statement_timeout_ms (int), acquire_timeout (float)
+    """
+    section = read_section('database', {
+        'pool_min': 1,
+        'pool_max': 4,
+        'statement_timeout_ms': 300000,
+        'acquire_timeout': 30.0,
+    })
+    return {
+        'minconn': section['pool_min'],
+        'maxconn': section['pool_max'],
+        'statement_timeout_ms': section['statement_timeout_ms'],
+        'acquire_timeout': section['acquire_timeout'],
+    }
 
-    # Return both connection and cursor for executing queries
-    return conn, conn.cursor()
+# Connection pool shared by everything running in this process
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Return the process-wide PostgreSQL connection pool, creating it from config.ini on first use.
+    Borrow connections with `with get_pool().connection() as conn:`.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Retrieve database credentials
+            dbname, user, pwd, host, port = read_db_config()
+            _pool = ConnectionPool(dbname=dbname, user=user, password=pwd, host=host, port=port,
+                                   **read_pool_config())
+        return _pool
+
+def report_pool_stats(pool):
+    """
+    Log and print how often callers had to wait for a database connection.
+    """
+    stats = pool.stats()
+    message = (f"DB pool: {stats['acquired']} checkouts over {stats['created']} connections, "
+               f"{stats['waited']} waited (avg {stats['avg_wait_seconds'] * 1000:.1f} ms, "
+               f"max {stats['max_wait_seconds'] * 1000:.1f} ms)")
+    logging.info(message)
+    print(message)
 
 def setup_logging():
     """
@@ -52,90 +297,690 @@ def setup_logging():
         format='%(asctime)s - %(levelname)s - %(message)s'  # Timestamped format
     )
 
-def run_pipeline():
+def build_client(api_key, settings, metrics=None, use_cache=True):
+    """
+    Create the AemetClient shared by every worker of a run.
+    """
+    # A single limiter paces every worker, replacing the per-municipality sleep
+    rate_limiter = RateLimiter(settings['request_interval'])
+    # Retry timing: Retry-After when sent, exponential backoff with jitter otherwise
+    backoff = BackoffPolicy(max_retries=settings['max_retries'], deadline=settings['call_deadline'])
+    # Per endpoint family, so an AEMET outage fails fast instead of retrying every call
+    breaker = read_breaker_config()
+    breaker = {key: value for key, value in breaker.items() if key != 'enabled'} if breaker['enabled'] else None
+    # One pooled connection per worker so keep-alive connections are never discarded
+    return AemetClient(api_key, rate_limiter=rate_limiter, backoff=backoff, base_url=settings['base_url'],
+                       pool_maxsize=settings['workers'], cache=build_cache() if use_cache else None,
+                       metrics=metrics, breaker=breaker)
+
+def report_connection_stats(client):
+    """
+    Log and print how well the HTTP connections were reused during the run.
+    """
+    stats = client.connection_stats()
+    message = (f"HTTP: {stats['requests']} requests over {stats['connections']} connections "
+               f"({stats['reused']} reused)")
+    if stats['coalesced']:
+        message += f"; {stats['coalesced']} identical fetches coalesced"
+    if client.cache:
+        message += f"; cache: {client.cache.hits} hits, {client.cache.misses} misses"
+    logging.info(message)
+    print(message)
+
+    for family, breaker in sorted(client.breaker_stats().items()):
+        if breaker['opened']:
+            message = (f"Circuit {family}: opened {breaker['opened']} times, {breaker['rejected']} attempts "
+                       f"failed fast, now {breaker['state']}")
+            logging.warning(message)
+            print(message)
+
+def extract_municipality(municipality_id, postal_code, station_code, target_date, api_key, client,
+                         fetch_observed=True, fetch_forecast=True, skipped=None):
+    """
+    Fetch raw observed and forecast JSON for one municipality.
+    Runs inside a worker thread; all workers share the same client.
+    Observed data is skipped when it was already fetched in bulk for all stations,
+    and either kind is skipped when a resumed run already has it.
+    A kind whose endpoint has an open circuit comes back as None and is added to
+    `skipped` (a set), so the other kind is still fetched.
+    """
+    raw_observed = None
+    raw_forecast = None
+    if fetch_observed:
+        try:
+            raw_observed = get_observed_raw(municipality_id, station_code, target_date, api_key, client=client)
+        except CircuitOpenError as e:
+            logging.warning(str(e))
+            if skipped is not None:
+                skipped.add('observed')
+    if fetch_forecast:
+        try:
+            raw_forecast = get_forecast_raw(municipality_id, postal_code, api_key, client=client)
+        except CircuitOpenError as e:
+            logging.warning(str(e))
+            if skipped is not None:
+                skipped.add('forecast')
+    return raw_observed, raw_forecast
+
+def update_observed_aggregates(cursor, records):
+    """
+    Bring the tables derived from the daily records (forecast_errors, rollups) up to date
+    for freshly loaded records. Runs in the caller's transaction, right after the load.
+    """
+    keys = [(record['municipality_id'], record['date']) for record in records]
+    update_forecast_errors(cursor, keys)
+    update_rollups(cursor, keys)
+
+def flush_spool(pool, directory):
+    """
+    Bulk-load the records spooled while the database was unreachable.
+
+    Every closed spool file is loaded in one transaction, exactly as the pipeline
+    would have loaded it: records, hourly forecasts, derived tables, extreme events,
+    and the run ledger of the day it was spooled. The file is deleted once committed.
+    Loading is idempotent (unchanged rows are not rewritten, the event detector skips
+    days it already folded), so a file flushed twice leaves the same data.
+
+    Returns:
+        dict: files, records and rejected counts.
+    """
+    for path in unfinished_files(directory):
+        logging.warning(f"Spool file {path} was never closed (its run was killed); "
+                        f"rename it to .jsonl to flush its complete lines")
+
+    events_settings = read_events_config()
+    totals = {'files': 0, 'records': 0, 'rejected': 0}
+    for path in spool_files(directory):
+        with pool.connection() as conn, conn.cursor() as cursor:
+            for run_date, records in sorted(read_spool(path).items()):
+                report = bulk_load_records(cursor, records['forecast'], records['observed'])
+                hourly_rows = bulk_load_forecast_hourly(cursor, records['hourly'])
+                rejected = {id(record) for record, _ in report['rejected']}
+                for record, reason in report['rejected']:
+                    logging.error(f"Spool {path.name}: record of municipality {record.get('municipality_id')} "
+                                  f"for {record.get('date')} rejected: {reason}")
+                forecast_records = [record for record in records['forecast'] if id(record) not in rejected]
+                observed_records = [record for record in records['observed'] if id(record) not in rejected]
+
+                update_observed_aggregates(cursor, observed_records)
+                if events_settings['enabled']:
+                    detect_events(cursor, forecast_records, observed_records, events_settings['thresholds'])
+
+                # The spooled work counts as done for its run, so --resume does not fetch it again
+                done = sorted({(record['municipality_id'], 'forecast') for record in forecast_records}
+                              | {(record['municipality_id'], 'observed') for record in observed_records})
+                work = {}
+                for municipality_id, kind in done:
+                    work.setdefault(municipality_id, set()).add(kind)
+                start_run(cursor, run_date, work, reset=False)
+                finished = datetime.now(timezone.utc)
+                record_results(cursor, run_date, [(municipality_id, kind, DONE, None, finished, None)
+                                                  for municipality_id, kind in done])
+
+                totals['records'] += report['staged'] + hourly_rows
+                totals['rejected'] += len(report['rejected'])
+            conn.commit()
+        path.unlink()
+        totals['files'] += 1
+        logging.info(f"Spool {path.name} flushed")
+    return totals
+
+def fill_observed_gaps(pool, client, api_key, workers, gaps_settings, metrics=None, archive=None):
+    """
+    Re-poll observed days that are still missing after the regular 6-day delay.
+
+    1. Queues every (municipality, day) of the lookback window that has no observed
+       data (set-based scan over the calendar) into observed_gaps.
+    2. Spends at most `request_budget` per-station range requests on the highest
+       priority gaps; each request covers several gap days of one station.
+    3. Loads the days that came back, counts an attempt for every polled gap and
+       removes the gaps that are now filled.
+
+    Returns:
+        dict: queued (int), requests (int), filled (int)
+    """
+    today = datetime.now().date()
+    # Days up to the regular observed target date (handled by the main run) are covered
+    end_date = today - timedelta(days=7)
+    start_date = today - timedelta(days=gaps_settings['lookback_days'])
+
+    with pool.connection() as conn, conn.cursor() as cursor:
+        scan_observed_gaps(cursor, start_date, end_date)
+        gaps = next_gaps(cursor, gaps_settings['max_attempts'])
+        conn.commit()
+
+    requests = plan_repoll(gaps, gaps_settings['request_budget'], MAX_OBSERVED_WINDOW_DAYS)
+    if not requests:
+        return {'queued': len(gaps), 'requests': 0, 'filled': 0}
+
+    def fetch(request):
+        try:
+            # The cached payload of an earlier poll is exactly what still had the gaps
+            raw = get_observed_range_raw(request.municipality_id, request.station_code,
+                                         request.start, request.end, api_key, client=client, refresh=True)
+        except CircuitOpenError as e:
+            # Not polled: the gaps stay queued for the next run without spending an attempt
+            logging.warning(str(e))
+            return None
+        if archive:
+            archive_safely(archive.put_observed, raw, request.municipality_id)
+        # Only the gap days are loaded; the window may also return days we already have
+        days = {day.strftime('%Y-%m-%d') for day in request.dates}
+        return [record for record in transform_observed_range(raw, request.municipality_id)
+                if record['date'] in days]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batches = list(executor.map(fetch, requests))
+    polled = [request for request, batch in zip(requests, batches) if batch is not None]
+    records = [record for batch in batches if batch for record in batch]
+
+    with pool.connection() as conn, conn.cursor() as cursor:
+        load_observed_batch(cursor, records)
+        update_observed_aggregates(cursor, records)
+        record_attempts(cursor, polled)
+        filled = resolve_filled_gaps(cursor)
+        conn.commit()
+
+    if metrics:
+        metrics.add_rows('repoll_observed', len(records))
+    return {'queued': len(gaps), 'requests': len(polled), 'filled': filled}
+
+def run_pipeline(settings=None, pool=None, use_cache=True, resume=False):
     """
     Main pipeline orchestration function:
     1. Sets up logging
-    2. Fetches list of municipalities
-    3. For each municipality: extracts, transforms, and loads weather data
-    4. Handles errors and logs failures
+    2. Fetches list of municipalities and registers the run's work in run_ledger
+       (with resume=True, only work not yet done today is kept)
+    3. Streams municipalities through extract (worker threads) -> transform -> load
+       (batched bulk upserts) stages connected by bounded queues
+    4. Collects failures from every stage and logs incomplete municipalities
+
+    Every load batch records its outcome in run_ledger in the same transaction as the
+    data, so after a crash `--resume` retries exactly what did not reach the database.
+
+    The database is not needed to fetch and transform: when it cannot be reached, at
+    start or in the middle of the run, the records go to a local spool file instead
+    (see spool.Spool), to be loaded by `--flush-spool` or by the next run.
+
+    The other parameters are only needed to run against something other than config.ini
+    (the benchmark harness points it at a local AEMET stand-in and a scratch database):
+        settings (dict): values overriding those of read_pipeline_config().
+        pool (ConnectionPool): database connections to use instead of get_pool().
+        use_cache (bool): False bypasses the on-disk response cache.
+
+    Returns:
+        Metrics collected during the run.
     """
     setup_logging()
+    settings = dict(read_pipeline_config(), **(settings or {}))
+    # Latency, retry, byte and row counters, written next to the log at the end of the run
+    metrics = Metrics()
 
-    # Open database connection and cursor
-    conn, cursor = get_connection()
+    # The ledger is keyed by the day the pipeline runs
+    run_date = datetime.now().date()
+
+    # Records go to this local file instead of the database while it is unreachable
+    spool_settings = read_spool_config()
+    spool = None
 
     try:
-        # Retrieve municipalities and their codes from the database
-        cursor.execute("SELECT municipality_id, postal_code, station_code FROM municipalities;")
-        municipalities = cursor.fetchall()
-
-        # Load environment variables (e.g., API key)
-        load_dotenv()
-        api_key = os.getenv('API_KEY_WEATHER')
-
-        # Target date for observed data: 6 days ago
-        target_date = datetime.now() - timedelta(days=6)
-
-        failed_municipalities = []  # Track municipalities where processing fails
-
-        # Process each municipality in the list
-        for municipality_id, postal_code, station_code in municipalities:
-            
-            # --------- Extraction Phase ---------
-            # Fetch raw observed data
-            raw_observed = get_observed_raw(municipality_id, station_code, target_date, api_key)
-            # Fetch raw forecast data
-            raw_forecast = get_forecast_raw(municipality_id, postal_code, api_key)
-
-            # --------- Transform Phase ---------
-            # Convert raw observed data to structured format
-            observed = transform_observed(raw_observed, municipality_id, target_date)
-            # Convert raw forecast data to structured format
-            forecast = transform_forecast(raw_forecast, municipality_id)
-
-            # --------- Load Phase ---------
-            # Initialize flags to track successful insertion
-            forecast_loaded = False
-            observed_loaded = False
-
-            # Insert forecast data first, then observed data
-            if forecast:                            
-                load_forecast_data(cursor, forecast)
-                forecast_loaded = True
-            if observed:
-                load_observed_data(cursor, observed)
-                observed_loaded = True
-
-            if forecast_loaded and observed_loaded:  
-                conn.commit()           
-            elif forecast_loaded or observed_loaded:
-                # Commit observed or forecast data but flag the municipality as incomplete
-                conn.commit()
-                loaded = 'FORECAST' if forecast_loaded else 'OBSERVED'
-                missing = 'OBSERVED' if forecast_loaded else 'FORECAST'
-                logging.error(f"Municipality {municipality_id}: only {loaded} data loaded; {missing} data missing.")
-                failed_municipalities.append(municipality_id)
+        # Database connections are borrowed from the pool only while they are needed
+        pool = pool or get_pool()
+
+        with pool.connection() as conn, conn.cursor() as cursor:
+            # Retrieve municipalities and their codes from the database
+            cursor.execute("SELECT municipality_id, postal_code, station_code FROM municipalities;")
+            municipalities = cursor.fetchall()
+
+            # Register the run; a resumed run keeps what earlier attempts already finished
+            start_run(cursor, run_date, {municipality_id: KINDS for municipality_id, _, _ in municipalities},
+                      reset=not resume)
+            if resume:
+                work = pending_work(cursor, run_date)
             else:
-                # Nothing was loaded
-                logging.error( f"Municipality {municipality_id}: no data loaded.")
-                failed_municipalities.append(municipality_id)
+                work = {municipality_id: set(KINDS) for municipality_id, _, _ in municipalities}
+            conn.commit()
+    except DATABASE_DOWN as e:
+        # Forecasts cannot be fetched again later: fetch now from the last known municipality list
+        municipalities = load_municipalities(spool_settings['directory']) if spool_settings['enabled'] else None
+        if not municipalities:
+            raise
+        spool = Spool(spool_settings['directory'], run_date)
+        work = {municipality_id: set(KINDS) for municipality_id, _, _ in municipalities}
+        resume = False  # The ledger cannot be read: everything is fetched
+        message = f"Database unreachable, records will be spooled to {spool_settings['directory']}: {e}"
+        logging.error(message)
+        print(message)
+    else:
+        if spool_settings['enabled']:
+            save_municipalities(spool_settings['directory'], municipalities)
+
+    if spool is None:
+        # Partitions for today and the next period(s) exist before the first load needs them
+        try:
+            for table, names in maintain_partitions(pool, run_date, read_partitions_config()).items():
+                if names:
+                    logging.info(f"Retention: dropped {table} partitions {names}")
+        except Exception as e:
+            # The loaders still create missing partitions on demand
+            logging.error(f"Partition maintenance failed: {e}")
+
+        # Records spooled by earlier runs while the database was down
+        if spool_settings['enabled'] and spool_files(spool_settings['directory']):
+            try:
+                totals = flush_spool(pool, spool_settings['directory'])
+                logging.info(f"Spool flushed: {totals['files']} files, {totals['records']} records loaded")
+            except Exception as e:
+                logging.error(f"Spool flush failed: {e}")
+
+    if resume:
+        municipalities = [municipality for municipality in municipalities if municipality[0] in work]
+        logging.info(f"Resuming run of {run_date}: {len(municipalities)} municipalities with pending work")
+        print(f"Resuming run of {run_date}: {len(municipalities)} municipalities with pending work")
+
+    # Load environment variables (e.g., API key)
+    load_dotenv()
+    api_key = os.getenv('API_KEY_WEATHER')
+
+    # Target date for observed data: 6 days ago
+    target_date = datetime.now() - timedelta(days=6)
+
+    failed_municipalities = []  # Track municipalities where processing fails
+    loaded = {kind: set() for kind in KINDS}  # Municipalities whose data reached the DB, per kind
+    loaded_lock = threading.Lock()  # Loaders may run in several threads
+    circuit_skipped = {kind: set() for kind in KINDS}  # Not fetched because AEMET's circuit was open
+
+    # Pooled HTTP session, rate limiter and retry policy shared by all workers
+    client = build_client(api_key, settings, metrics, use_cache)
+    # Every raw payload is kept so history can be reprocessed with newer transforms
+    archive = build_archive()
+
+    # Extreme-event detection runs in the load transactions
+    events_settings = read_events_config()
+    detected = {'events': 0, 'late': 0}
+
+    # Bulk mode: one 'todasestaciones' payload covers the observed data of every municipality
+    bulk_observed = settings['observed_mode'] == 'bulk'
+    observed_by_municipality = {}
+    observed_wanted = [(municipality_id, station_code) for municipality_id, _, station_code in municipalities
+                       if 'observed' in work[municipality_id]]
+    if bulk_observed and observed_wanted:
+        # Streamed and filtered to our stations, so memory does not grow with the payload
+        raw_all_observed = get_observed_all_raw(
+            target_date, api_key, client=client,
+            station_codes=[station_code for _, station_code in observed_wanted],
+        )
+        if archive:
+            archive_safely(archive.put_observed, raw_all_observed)
+        observed_breaker = client.breaker('observed')
+        if raw_all_observed is None and observed_breaker and observed_breaker.state == CIRCUIT_OPEN:
+            circuit_skipped['observed'].update(municipality_id for municipality_id, _ in observed_wanted)
+        with metrics.timer('transform_observed_bulk'):
+            observed_by_municipality = transform_observed_bulk(raw_all_observed, observed_wanted, target_date)
+
+    # --------- Extraction Stage (worker threads) ---------
+    def extract(municipality):
+        municipality_id, postal_code, station_code = municipality
+        kinds = work[municipality_id]
+        started = datetime.now(timezone.utc)
+        skipped = set()
+        raw = extract_municipality(municipality_id, postal_code, station_code, target_date, api_key, client,
+                                   fetch_observed=not bulk_observed and 'observed' in kinds,
+                                   fetch_forecast='forecast' in kinds, skipped=skipped)
+        with loaded_lock:
+            for kind in skipped:
+                circuit_skipped[kind].add(municipality_id)
+        if archive:
+            raw_observed, raw_forecast = raw
+            archive_safely(archive.put_observed, raw_observed, municipality_id)
+            if raw_forecast:
+                archive_safely(archive.put, 'forecast', run_date, municipality_id, raw_forecast)
+        return started, raw
+
+    # --------- Transform Stage (single thread) ---------
+    def transform(municipality, extracted):
+        municipality_id = municipality[0]
+        kinds = work[municipality_id]
+        started, (raw_observed, raw_forecast) = extracted
+        observed = forecast = None
+        hourly = []
+        # Convert raw observed data to structured format (already done in bulk mode)
+        if 'observed' in kinds:
+            if bulk_observed:
+                observed = observed_by_municipality.get(municipality_id)
+            else:
+                with metrics.timer('transform_observed'):
+                    observed = transform_observed(raw_observed, municipality_id, target_date)
+        # Convert raw forecast data to structured format
+        if 'forecast' in kinds:
+            with metrics.timer('transform_forecast'):
+                forecast = transform_forecast(raw_forecast, municipality_id)
+            with metrics.timer('transform_forecast_hourly'):
+                hourly = transform_forecast_hourly(raw_forecast, municipality_id)
+        return started, forecast, observed, hourly
+
+    # --------- Load Stage (`loaders` threads, one pooled connection per batch) ---------
+    def load(batch):
+        nonlocal spool
+        forecast_records = [forecast for _, (_, forecast, _, _) in batch if forecast]
+        observed_records = [observed for _, (_, _, observed, _) in batch if observed]
+        hourly_records = [record for _, (_, _, _, hourly) in batch for record in hourly]
+
+        if spool is None:
+            try:
+                load_database(batch, forecast_records, observed_records, hourly_records)
+                return
+            except DATABASE_DOWN as e:
+                if not spool_settings['enabled']:
+                    raise
+                # The database went away mid-run: this batch and the next ones are spooled
+                with loaded_lock:
+                    if spool is None:
+                        logging.error(f"Database unreachable during the load, spooling the remaining records: {e}")
+                        spool = Spool(spool_settings['directory'], run_date)
+
+        # One fsync per batch; the ledger and derived tables are updated by the flush
+        with metrics.timer('spool'):
+            for kind, records in (('forecast', forecast_records), ('observed', observed_records),
+                                  ('hourly', hourly_records)):
+                spool.append(kind, records)
+        with loaded_lock:
+            for record in forecast_records:
+                loaded['forecast'].add(record['municipality_id'])
+            for record in observed_records:
+                loaded['observed'].add(record['municipality_id'])
+        metrics.add_rows('spool', len(forecast_records) + len(observed_records))
+
+    def load_database(batch, forecast_records, observed_records, hourly_records):
+        # One COPY into staging plus one upsert per table, committed together with the
+        # batch's ledger entries (the pool rolls everything back if anything raises)
+        with metrics.timer('load'), pool.connection() as conn:
+            with conn.cursor() as cursor:
+                report = bulk_load_records(cursor, forecast_records, observed_records)
+                hourly_rows = bulk_load_forecast_hourly(cursor, hourly_records)
+
+                rejected = {}
+                for record, reason in report['rejected']:
+                    logging.error(f"Municipality {record.get('municipality_id')}: record for "
+                                  f"{record.get('date')} rejected: {reason}")
+                    rejected[id(record)] = reason
+
+                # Forecast skill and rollups follow the observations in the same transaction
+                update_observed_aggregates(cursor, [record for record in observed_records
+                                                    if id(record) not in rejected])
+                # The detector folds the same records into its persisted windows
+                if events_settings['enabled']:
+                    with metrics.timer('detect_events'):
+                        events = detect_events(
+                            cursor,
+                            [record for record in forecast_records if id(record) not in rejected],
+                            [record for record in observed_records if id(record) not in rejected],
+                            events_settings['thresholds'],
+                        )
+
+                finished = datetime.now(timezone.utc)
+                results = []
+                done = []
+                for municipality, (started, forecast, observed, _) in batch:
+                    municipality_id = municipality[0]
+                    for kind, record in (('forecast', forecast), ('observed', observed)):
+                        if kind not in work[municipality_id]:
+                            continue
+                        if record is None:
+                            reason = 'circuit open' if municipality_id in circuit_skipped[kind] else 'no data'
+                            results.append((municipality_id, kind, FAILED, started, finished, reason))
+                        elif id(record) in rejected:
+                            results.append((municipality_id, kind, FAILED, started, finished, rejected[id(record)]))
+                        else:
+                            results.append((municipality_id, kind, DONE, started, finished, None))
+                            done.append((kind, municipality_id))
+                record_results(cursor, run_date, results)
+            conn.commit()
+
+        logging.info(f"Bulk load: {report['staged']} records staged, {report['merged']} rows merged, "
+                     f"{len(report['rejected'])} rejected, {hourly_rows} hourly forecast rows")
 
-            # Pause between API calls to respect API rate limits
-            time.sleep(10)
+        with loaded_lock:
+            for kind, municipality_id in done:
+                loaded[kind].add(municipality_id)
+            if events_settings['enabled']:
+                detected['events'] += events['events']
+                detected['late'] += events['late']
+        metrics.add_rows('load_forecast', sum(1 for kind, _ in done if kind == 'forecast'))
+        metrics.add_rows('load_observed', sum(1 for kind, _ in done if kind == 'observed'))
+        metrics.add_rows('load_forecast_hourly', hourly_rows)
+        if events_settings['enabled']:
+            metrics.add_rows('extreme_events', events['events'])
 
-        # --------- Final Status Report ---------
-        if not failed_municipalities:
-            logging.info("All municipalities processed successfully.")
-            print("All municipalities processed successfully.")
+    # Network and database latency overlap; bounded queues keep memory flat
+    failures = run_stages(
+        municipalities, extract, transform, load,
+        workers=settings['workers'],
+        queue_size=settings['queue_size'],
+        batch_size=settings['load_batch_size'],
+        loaders=settings['loaders'],
+    )
+
+    # Failure channel: municipalities that raised in some stage
+    failed_results = []
+    finished = datetime.now(timezone.utc)
+    for failure in failures:
+        municipality_id = failure.item[0]
+        logging.error(f"Municipality {municipality_id}: {failure.stage} failed: {failure.error}")
+        failed_municipalities.append(municipality_id)
+        failed_results += [(municipality_id, kind, FAILED, None, finished, f"{failure.stage}: {failure.error}")
+                           for kind in work[municipality_id]]
+    if spool is None:
+        with pool.connection() as conn, conn.cursor() as cursor:
+            record_results(cursor, run_date, failed_results)
+            conn.commit()
+
+    for municipality_id, _, _ in municipalities:
+        if municipality_id in failed_municipalities:
+            continue  # Already reported through the failure channel
+
+        kinds = work[municipality_id]
+        loaded_kinds = [kind.upper() for kind in KINDS if kind in kinds and municipality_id in loaded[kind]]
+        missing_kinds = [kind.upper() for kind in KINDS if kind in kinds and municipality_id not in loaded[kind]]
+        if not missing_kinds:
+            continue
+        elif loaded_kinds:
+            # Observed or forecast data was loaded but flag the municipality as incomplete
+            logging.error(f"Municipality {municipality_id}: only {loaded_kinds[0]} data loaded; "
+                          f"{missing_kinds[0]} data missing.")
+            failed_municipalities.append(municipality_id)
         else:
-            logging.info(f"Failed municipalities: {failed_municipalities}")
+            # Nothing was loaded
+            logging.error( f"Municipality {municipality_id}: no data loaded.")
+            failed_municipalities.append(municipality_id)
+
+    if detected['events']:
+        message = f"Extreme events: {detected['events']} opened or extended"
+        logging.warning(message)
+        print(message)
+    if detected['late']:
+        logging.info(f"Event detector: {detected['late']} records older than their municipality's state skipped")
+
+    # --------- Spooled Run (database unreachable): nothing else can be done now ---------
+    if spool is not None:
+        path = spool.close()
+        if path:
+            message = (f"Database unreachable: {spool.records} records spooled to {path}. "
+                       f"Load them with `python -m src.pipeline --flush-spool` (or the next run does).")
+        else:
+            message = "Database unreachable: no records to spool."
+        logging.error(message)
+        print(message)
+        report_connection_stats(client)
+        client.close()
+        metrics.write('logs')
+        if failed_municipalities:
             print(f"Failed municipalities: {failed_municipalities}")
-            
-    finally:
-        cursor.close()
-        conn.close()
+        return metrics
+
+    # --------- Gap Re-poll (late observed data) ---------
+    gaps_settings = read_gaps_config()
+    if gaps_settings['enabled']:
+        try:
+            repoll = fill_observed_gaps(pool, client, api_key, settings['workers'], gaps_settings, metrics,
+                                        archive)
+            message = (f"Observed gaps: {repoll['filled']} filled with {repoll['requests']} requests, "
+                       f"{repoll['queued']} were queued")
+            logging.info(message)
+            print(message)
+        except Exception as e:
+            # Gap filling is best effort: it must never fail the daily run
+            logging.error(f"Observed gap re-poll failed: {e}")
+
+    # --------- Drought Indices (months that may have received observed data) ---------
+    earliest = target_date.date()
+    if gaps_settings['enabled']:
+        earliest = min(earliest, run_date - timedelta(days=gaps_settings['lookback_days']))
+    try:
+        with metrics.timer('drought_indices'):
+            update_drought_indices(pool, earliest.replace(day=1))
+    except Exception as e:
+        # Derived analytics are best effort as well
+        logging.error(f"Drought index update failed: {e}")
+
+    # --------- Final Status Report ---------
+    report_connection_stats(client)
+    report_pool_stats(pool)
+    client.close()
+    metrics.write('logs')
+
+    with pool.connection() as conn, conn.cursor() as cursor:
+        ledger = summarize(cursor, run_date)
+    message = "Run ledger: " + ", ".join(
+        f"{kind} {ledger.get((kind, DONE), 0)} done / {ledger.get((kind, FAILED), 0)} failed" for kind in KINDS
+    )
+    logging.info(message)
+    print(message)
+
+    if any(circuit_skipped.values()):
+        message = ("Skipped while AEMET was failing (circuit open): " +
+                   ", ".join(f"{kind} {len(circuit_skipped[kind])}" for kind in KINDS))
+        logging.warning(message)
+        print(message)
+
+    if not failed_municipalities:
+        logging.info("All municipalities processed successfully.")
+        print("All municipalities processed successfully.")
+    else:
+        logging.info(f"Failed municipalities: {failed_municipalities}")
+        print(f"Failed municipalities: {failed_municipalities}")
+        print("Run `python -m src.pipeline --resume` to retry only the failed work.")
+
+    return metrics
+
+def run_gap_repoll():
+    """
+    Run only the observed gap re-poll, e.g. to spend extra request budget by hand.
+    """
+    setup_logging()
+    settings = read_pipeline_config()
+    load_dotenv()
+    api_key = os.getenv('API_KEY_WEATHER')
+    client = build_client(api_key, settings)
+
+    repoll = fill_observed_gaps(get_pool(), client, api_key, settings['workers'], read_gaps_config(),
+                                archive=build_archive())
+    message = (f"Observed gaps: {repoll['filled']} filled with {repoll['requests']} requests, "
+               f"{repoll['queued']} were queued")
+    logging.info(message)
+    print(message)
+    report_connection_stats(client)
+    client.close()
+
+def run_flush_spool():
+    """
+    Load the local spool into the database, e.g. once PostgreSQL is back.
+    """
+    setup_logging()
+    directory = read_spool_config()['directory']
+    totals = flush_spool(get_pool(), directory)
+    message = (f"Spool flushed: {totals['files']} files, {totals['records']} records loaded, "
+               f"{totals['rejected']} rejected")
+    logging.info(message)
+    print(message)
+
+def run_rebuild_forecast_errors():
+    """
+    Recompute forecast_errors over the whole history, e.g. right after creating the table.
+    """
+    setup_logging()
+    with get_pool().connection() as conn, conn.cursor() as cursor:
+        written = rebuild_forecast_errors(cursor)
+        conn.commit()
+    message = f"Forecast errors rebuilt: {written} days"
+    logging.info(message)
+    print(message)
+
+def run_rebuild_drought_indices():
+    """
+    Recompute and rewrite the drought indices of every month.
+    """
+    setup_logging()
+    written = update_drought_indices(get_pool(), None)
+    print(f"Drought indices rebuilt: {written} municipality months")
+
+def run_rebuild_events():
+    """
+    Replay the whole history through the extreme-event detector, e.g. after a backfill.
+    """
+    setup_logging()
+    with get_pool().connection() as conn, conn.cursor() as cursor:
+        detected = rebuild_events(cursor, read_events_config()['thresholds'])
+        conn.commit()
+    message = f"Extreme events rebuilt: {detected} events"
+    logging.info(message)
+    print(message)
+
+def run_rebuild_rollups():
+    """
+    Recompute the monthly and hydrological-year rollups over the whole history.
+    """
+    setup_logging()
+    with get_pool().connection() as conn, conn.cursor() as cursor:
+        written = rebuild_rollups(cursor)
+        conn.commit()
+    message = f"Rollups rebuilt: {written} municipality months"
+    logging.info(message)
+    print(message)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the daily weather ETL pipeline.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Only process the work today's run ledger does not have as done.")
+    parser.add_argument("--gaps-only", action="store_true",
+                        help="Only re-poll observed days that are still missing.")
+    parser.add_argument("--rebuild-forecast-errors", action="store_true",
+                        help="Recompute the forecast_errors table from the whole history.")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="Recompute the monthly and hydrological-year rollups from the whole history.")
+    parser.add_argument("--rebuild-drought-indices", action="store_true",
+                        help="Recompute the drought indices of every month.")
+    parser.add_argument("--flush-spool", action="store_true",
+                        help="Load the records spooled while the database was unreachable.")
+    parser.add_argument("--rebuild-events", action="store_true",
+                        help="Replay the whole history through the extreme-event detector.")
+    args = parser.parse_args()
+
+    if args.flush_spool:
+        run_flush_spool()
+    elif args.rebuild_events:
+        run_rebuild_events()
+    elif args.rebuild_drought_indices:
+        run_rebuild_drought_indices()
+    elif args.rebuild_forecast_errors:
+        run_rebuild_forecast_errors()
+    elif args.rebuild_rollups:
+        run_rebuild_rollups()
+    elif args.gaps_only:
+        run_gap_repoll()
+    else:
+        run_pipeline(resume=args.resume)
 
 if __name__ == "__main__":
     # Execute the pipeline when the script is run directly
-    run_pipeline()
+    main()
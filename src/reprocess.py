@@ -0,0 +1,146 @@
+"""
+Usage
+-----
+# Recompute every archived payload of a date range with the current transforms
+python -m src.reprocess --start 2025-01-01 --end 2025-03-31
+
+# Only forecasts, with 8 worker processes
+python -m src.reprocess --start 2025-01-01 --end 2025-03-31 --kind forecast --processes 8
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .archive import KINDS, RawArchive
+from .transform import index_by_station, transform_observed_range, transform_forecast, transform_forecast_hourly
+from .load import bulk_load_records, bulk_load_forecast_hourly
+from .metrics import Metrics
+from .pipeline import (get_pool, read_archive_config, setup_logging, report_pool_stats,
+                       update_observed_aggregates, update_drought_indices)
+
+# Archived payloads transformed per worker task and loaded per transaction
+BATCH_SIZE = 200
+
+def transform_entries(entries, municipalities):
+    """
+    Run the current transforms over a batch of archive entries (runs in a worker process).
+
+    Parameters:
+        entries (list of tuple): (kind, key, path) with key a municipality_id or 'all'.
+        municipalities (list of tuple): (municipality_id, station_code) pairs, used to fan
+            out 'observed_all' payloads.
+
+    Returns:
+        (forecast_records, observed_records, hourly_records, failed) with failed a list
+        of (path, error).
+    """
+    forecast_records, observed_records, hourly_records, failed = [], [], [], []
+    for kind, key, path in entries:
+        try:
+            raw_json = RawArchive.load(path)
+        except (OSError, ValueError) as e:
+            failed.append((str(path), str(e)))
+            continue
+
+        if kind == 'forecast':
+            record = transform_forecast(raw_json, key)
+            if record:
+                forecast_records.append(record)
+            hourly_records.extend(transform_forecast_hourly(raw_json, key))
+        elif kind == 'observed':
+            observed_records.extend(transform_observed_range(raw_json, key))
+        else:
+            index = index_by_station(raw_json)
+            for municipality_id, station_code in municipalities:
+                observed_records.extend(transform_observed_range(index.get(station_code), municipality_id))
+    return forecast_records, observed_records, hourly_records, failed
+
+def run_reprocess(start_date, end_date, kinds=KINDS, processes=None):
+    """
+    Recompute the daily forecasts and observations from archived raw payloads over an
+    inclusive date range.
+
+    Archive entries are transformed in parallel by a process pool (the transforms are
+    CPU-bound) and every batch is bulk-upserted and committed as soon as it comes back.
+
+    Returns:
+        dict with 'payloads', 'merged', 'rejected' and 'failed' counts.
+    """
+    setup_logging()
+    metrics = Metrics()
+    pool = get_pool()
+    archive = RawArchive(read_archive_config()['directory'])
+
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT municipality_id, station_code FROM municipalities ORDER BY municipality_id;")
+        municipalities = cursor.fetchall()
+
+    entries = [(kind, key, path) for kind in kinds
+               for _, key, path in archive.entries(kind, start_date, end_date)]
+    batches = [entries[i:i + BATCH_SIZE] for i in range(0, len(entries), BATCH_SIZE)]
+    print(f"Reprocess {start_date:%Y-%m-%d}..{end_date:%Y-%m-%d}: "
+          f"{len(entries)} archived payloads in {len(batches)} batches")
+
+    totals = {'payloads': len(entries), 'merged': 0, 'rejected': 0, 'failed': 0}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = executor.map(transform_entries, batches, [municipalities] * len(batches))
+        for done, (forecast_records, observed_records, hourly_records, failed) in enumerate(results, start=1):
+            for path, error in failed:
+                logging.error(f"Reprocess - Could not read {path}: {error}")
+
+            with metrics.timer('load'), pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    result = bulk_load_records(cursor, forecast_records, observed_records)
+                    hourly_rows = bulk_load_forecast_hourly(cursor, hourly_records)
+                    # Either side of a forecast/observed comparison may have changed; rejected
+                    # records were not loaded, so they must not reach the aggregates
+                    rejected = {id(record) for record, _ in result['rejected']}
+                    update_observed_aggregates(cursor, [record for record in forecast_records + observed_records
+                                                        if id(record) not in rejected])
+                conn.commit()
+
+            for record, reason in result['rejected']:
+                logging.warning(f"Reprocess - Rejected record for municipality "
+                                f"{record.get('municipality_id')}: {reason}")
+            metrics.add_rows('merged', result['merged'])
+            metrics.add_rows('load_forecast_hourly', hourly_rows)
+            totals['merged'] += result['merged']
+            totals['rejected'] += len(result['rejected'])
+            totals['failed'] += len(failed)
+            print(f"[{done}/{len(batches)}] {result['merged']} rows upserted, {hourly_rows} hourly forecast rows")
+
+    # Observed payloads feed the drought indices
+    if set(kinds) != {'forecast'}:
+        with metrics.timer('drought_indices'):
+            update_drought_indices(pool, start_date.date().replace(day=1))
+
+    report_pool_stats(pool)
+    metrics.write('logs', basename='reprocess_metrics')
+    print(f"Reprocess finished: {totals['merged']} rows upserted, {totals['rejected']} rejected, "
+          f"{totals['failed']} unreadable payloads")
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute weather records from the raw payload archive.")
+    parser.add_argument("--start", required=True, help="First date to reprocess (YYYY-MM-DD).")
+    parser.add_argument("--end", required=True, help="Last date to reprocess, inclusive (YYYY-MM-DD).")
+    parser.add_argument("--kind", choices=KINDS, nargs="+", default=list(KINDS),
+                        help="Payload kinds to reprocess (default: all).")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="Worker processes running the transforms (default: CPU count).")
+    args = parser.parse_args()
+
+    try:
+        start_date = datetime.strptime(args.start, "%Y-%m-%d")
+        end_date = datetime.strptime(args.end, "%Y-%m-%d")
+    except ValueError:
+        parser.error("--start and --end must be in YYYY-MM-DD format.")
+    if end_date < start_date:
+        parser.error("--end must not be before --start.")
+
+    run_reprocess(start_date, end_date, args.kind, args.processes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# Rollup periods: calendar months and hydrological years (October to September).
+# period_start is the first day of the month, or October 1st for a hydrological year.
+MONTH = 'month'
+HYDRO_YEAR = 'hydro_year'
+
+# A day counts as rainy from this much precipitation (mm)
+RAINY_DAY_MM = 1.0
+
+# SQL for the hydrological year holding a date d: shift October to January, truncate, shift back
+HYDRO_YEAR_START = "(date_trunc('year', {d} + interval '3 months') - interval '3 months')::date"
+
+# municipality_rollups value columns, in insert order
+MUNICIPALITY_COLUMNS = [
+    'precipitation_days', 'precipitation_sum', 'precipitation_max', 'rainy_days',
+    'temperature_days', 'temperature_avg', 'temperature_max', 'temperature_min',
+]
+# province_rollups value columns, in insert order
+PROVINCE_COLUMNS = [
+    'municipalities', 'precipitation_avg', 'precipitation_max', 'precipitation_day_max',
+    'temperature_avg', 'temperature_max', 'temperature_min',
+]
+
+def _upsert(key_columns, value_columns):
+    return (f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET "
+            + ', '.join(f'{column} = EXCLUDED.{column}' for column in value_columns))
+
+def update_rollups(cursor, keys):
+    """
+    Refresh the monthly and hydrological-year rollups touched by newly loaded
+    observed days. Call it in the same transaction as the load.
+
+    Each level is rebuilt from the one below it, only for the periods that changed:
+    1. municipality months, from the observed days in weather_observations;
+    2. municipality hydrological years, from their months;
+    3. province months and hydrological years, from their municipalities.
+
+    A transaction-scoped advisory lock serializes concurrent loaders, so a province
+    row is never recomputed from a snapshot missing another loader's municipalities.
+
+    Parameters:
+        keys (iterable): (municipality_id, date) pairs, dates as date or 'YYYY-MM-DD'.
+
+    Returns:
+        int: number of municipality months refreshed.
+    """
+    keys = sorted({(municipality_id, str(day)[:10]) for municipality_id, day in keys})
+    if not keys:
+        return 0
+    ids = [municipality_id for municipality_id, _ in keys]
+    days = [day for _, day in keys]
+
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('rollups'));")
+
+    key_columns = ['municipality_id', 'period', 'period_start']
+
+    # 1. Municipality months, from the daily records
+    cursor.execute(f"""
+    INSERT INTO municipality_rollups ({', '.join(key_columns + MUNICIPALITY_COLUMNS)})
+    SELECT t.municipality_id, '{MONTH}', t.month,
+      count(w.precipitation),
+      sum(w.precipitation),
+      max(w.precipitation),
+      count(*) FILTER (WHERE w.precipitation >= {RAINY_DAY_MM}),
+      count(w.temperature_observed_avg),
+      avg(w.temperature_observed_avg),
+      max(w.temperature_observed_max),
+      min(w.temperature_observed_min)
+    FROM (
+      SELECT DISTINCT k.municipality_id, date_trunc('month', k.date)::date AS month
+      FROM unnest(%s::integer[], %s::date[]) AS k(municipality_id, date)
+    ) t
+    JOIN weather_observations w
+      ON w.municipality_id = t.municipality_id
+     AND w.date >= t.month AND w.date < t.month + interval '1 month'
+    GROUP BY t.municipality_id, t.month
+    {_upsert(key_columns, MUNICIPALITY_COLUMNS)};
+    """, (ids, days))
+    months = cursor.rowcount
+
+    # 2. Municipality hydrological years, from their months (averages weighted by days)
+    cursor.execute(f"""
+    INSERT INTO municipality_rollups ({', '.join(key_columns + MUNICIPALITY_COLUMNS)})
+    SELECT y.municipality_id, '{HYDRO_YEAR}', y.year_start,
+      sum(r.precipitation_days),
+      sum(r.precipitation_sum),
+      max(r.precipitation_max),
+      sum(r.rainy_days),
+      sum(r.temperature_days),
+      sum(r.temperature_avg * r.temperature_days) / nullif(sum(r.temperature_days), 0),
+      max(r.temperature_max),
+      min(r.temperature_min)
+    FROM (
+      SELECT DISTINCT k.municipality_id, {HYDRO_YEAR_START.format(d='k.date')} AS year_start
+      FROM unnest(%s::integer[], %s::date[]) AS k(municipality_id, date)
+    ) y
+    JOIN municipality_rollups r
+      ON r.municipality_id = y.municipality_id
+     AND r.period = '{MONTH}'
+     AND r.period_start >= y.year_start AND r.period_start < y.year_start + interval '1 year'
+    GROUP BY y.municipality_id, y.year_start
+    {_upsert(key_columns, MUNICIPALITY_COLUMNS)};
+    """, (ids, days))
+
+    # 3. Provinces, for every period touched above
+    province_keys = ['province_id', 'period', 'period_start']
+    cursor.execute(f"""
+    INSERT INTO province_rollups ({', '.join(province_keys + PROVINCE_COLUMNS)})
+    SELECT m.province_id, r.period, r.period_start,
+      count(*),
+      avg(r.precipitation_sum),
+      max(r.precipitation_sum),
+      max(r.precipitation_max),
+      avg(r.temperature_avg),
+      max(r.temperature_max),
+      min(r.temperature_min)
+    FROM (
+      SELECT DISTINCT m.province_id, p.period, p.period_start
+      FROM unnest(%s::integer[], %s::date[]) AS k(municipality_id, date)
+      JOIN municipalities m ON m.municipality_id = k.municipality_id
+      CROSS JOIN LATERAL (VALUES
+        ('{MONTH}', date_trunc('month', k.date)::date),
+        ('{HYDRO_YEAR}', {HYDRO_YEAR_START.format(d='k.date')})
+      ) AS p(period, period_start)
+    ) t
+    JOIN municipalities m ON m.province_id = t.province_id
+    JOIN municipality_rollups r
+      ON r.municipality_id = m.municipality_id
+     AND r.period = t.period
+     AND r.period_start = t.period_start
+    GROUP BY m.province_id, r.period, r.period_start
+    {_upsert(province_keys, PROVINCE_COLUMNS)};
+    """, (ids, days))
+
+    return months
+
+def rebuild_rollups(cursor):
+    """
+    Recompute every rollup from the whole observed history, e.g. after creating the
+    tables on an existing database.
+
+    Returns:
+        int: number of municipality months written.
+    """
+    cursor.execute("""
+    SELECT DISTINCT municipality_id, date_trunc('month', date)::date
+    FROM weather_observations
+    WHERE num_nonnulls(precipitation, temperature_observed_avg,
+                       temperature_observed_max, temperature_observed_min) > 0;
+    """)
+    keys = cursor.fetchall()
+    cursor.execute("TRUNCATE municipality_rollups, province_rollups;")
+    return update_rollups(cursor, keys)
@@ -0,0 +1,118 @@
+# Variables compared: forecast_errors column prefix -> (observed column of weather_observations,
+# forecast column of weather_forecasts).
+# An error is observed minus forecast, so a positive bias means the forecast ran low.
+ERROR_COLUMNS = [
+    ('temperature_avg', 'temperature_observed_avg', 'temperature_forecast_avg'),
+    ('temperature_max', 'temperature_observed_max', 'temperature_forecast_max'),
+    ('temperature_min', 'temperature_observed_min', 'temperature_forecast_min'),
+    ('humidity_avg', 'humidity_observed_avg', 'humidity_forecast_avg'),
+    ('humidity_max', 'humidity_observed_max', 'humidity_forecast_max'),
+    ('humidity_min', 'humidity_observed_min', 'humidity_forecast_min'),
+]
+# SQL for the daily errors of an observation aliased o and the forecast of its day aliased f
+ERROR_EXPRESSIONS = [f"o.{observed} - f.{forecast}" for _, observed, forecast in ERROR_COLUMNS]
+# Days that have both an observation and a forecast
+OBSERVED_AND_FORECAST = """weather_observations o
+    JOIN weather_forecasts f ON f.municipality_id = o.municipality_id AND f.date = o.date"""
+# Variables that also get rolling MAE / bias columns
+ROLLING_COLUMNS = ['temperature_avg', 'temperature_max', 'temperature_min', 'humidity_avg']
+# Rolling window lengths in days (the day itself included)
+WINDOWS = (7, 30)
+
+def rolling_columns():
+    """
+    Names of the rolling forecast_errors columns, e.g. temperature_max_mae_7d.
+    """
+    return [f"{prefix}_{metric}_{days}d"
+            for prefix in ROLLING_COLUMNS for days in WINDOWS for metric in ('mae', 'bias')]
+
+def update_forecast_errors(cursor, keys):
+    """
+    Refresh forecast_errors for (municipality_id, date) pairs that just received
+    observed or forecast data. Call it in the same transaction as the load.
+
+    1. The daily errors of the given days are upserted, for days that have both a
+       forecast and an observation of at least one variable.
+    2. A day's rolling windows cover the previous days, so the windows of every
+       stored day from the first touched day up to the longest window after the last
+       one are recomputed, per municipality, with one windowed UPDATE.
+
+    Parameters:
+        keys (iterable): (municipality_id, date) pairs, dates as date or 'YYYY-MM-DD'.
+
+    Returns:
+        int: number of daily error rows written.
+    """
+    # Deduplicated, since one day may come from several records of a batch
+    keys = sorted({(municipality_id, str(day)[:10]) for municipality_id, day in keys})
+    if not keys:
+        return 0
+    ids = [municipality_id for municipality_id, _ in keys]
+    days = [day for _, day in keys]
+
+    error_columns = [f"{prefix}_error" for prefix, _, _ in ERROR_COLUMNS]
+    cursor.execute(f"""
+    INSERT INTO forecast_errors (municipality_id, date, {', '.join(error_columns)})
+    SELECT o.municipality_id, o.date,
+      {', '.join(ERROR_EXPRESSIONS)}
+    FROM {OBSERVED_AND_FORECAST}
+    JOIN unnest(%s::integer[], %s::date[]) AS k(municipality_id, date)
+      ON k.municipality_id = o.municipality_id AND k.date = o.date
+    WHERE num_nonnulls({', '.join(ERROR_EXPRESSIONS)}) > 0
+    ON CONFLICT (municipality_id, date) DO UPDATE
+      SET {', '.join(f'{column} = EXCLUDED.{column}' for column in error_columns)};
+    """, (ids, days))
+    written = cursor.rowcount
+
+    longest = max(WINDOWS) - 1
+    windows = []
+    for prefix in ROLLING_COLUMNS:
+        for days_back in WINDOWS:
+            window = f"w{days_back}"
+            windows.append(f"avg(abs(e.{prefix}_error)) OVER {window} AS {prefix}_mae_{days_back}d")
+            windows.append(f"avg(e.{prefix}_error) OVER {window} AS {prefix}_bias_{days_back}d")
+    window_clauses = [
+        f"w{days_back} AS (PARTITION BY e.municipality_id ORDER BY e.date "
+        f"RANGE BETWEEN INTERVAL '{days_back - 1} days' PRECEDING AND CURRENT ROW)"
+        for days_back in WINDOWS
+    ]
+
+    cursor.execute(f"""
+    WITH touched AS (
+      SELECT municipality_id, min(date) AS first_day, max(date) AS last_day
+      FROM unnest(%s::integer[], %s::date[]) AS k(municipality_id, date)
+      GROUP BY municipality_id
+    ),
+    windowed AS (
+      SELECT e.municipality_id, e.date, {', '.join(windows)}
+      FROM forecast_errors e
+      JOIN touched t ON t.municipality_id = e.municipality_id
+      WHERE e.date BETWEEN t.first_day - {longest} AND t.last_day + {longest}
+      WINDOW {', '.join(window_clauses)}
+    )
+    UPDATE forecast_errors e
+    SET {', '.join(f'{column} = v.{column}' for column in rolling_columns())}
+    FROM windowed v
+    JOIN touched t ON t.municipality_id = v.municipality_id
+    WHERE e.municipality_id = v.municipality_id
+      AND e.date = v.date
+      AND v.date BETWEEN t.first_day AND t.last_day + {longest};
+    """, (ids, days))
+    return written
+
+def rebuild_forecast_errors(cursor):
+    """
+    Recompute forecast_errors from scratch over the whole history, e.g. after creating
+    the table on an existing database.
+
+    Returns:
+        int: number of daily error rows written.
+    """
+    cursor.execute(f"""
+    SELECT o.municipality_id, o.date
+    FROM {OBSERVED_AND_FORECAST}
+    WHERE num_nonnulls({', '.join(ERROR_EXPRESSIONS)}) > 0;
+    """)
+    keys = cursor.fetchall()
+    cursor.execute("TRUNCATE forecast_errors;")
+    return update_forecast_errors(cursor, keys)
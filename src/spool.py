@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# Kinds of transformed record kept in a spool file
+KINDS = ('forecast', 'observed', 'hourly')
+# A spool file is written as <name>.jsonl.part and renamed to <name>.jsonl once closed
+SUFFIX = '.jsonl'
+PART_SUFFIX = '.jsonl.part'
+# Snapshot of the municipalities table, so a run can start while the database is down
+MUNICIPALITIES_FILE = 'municipalities.json'
+
+class Spool:
+    """
+    Append-only local file of transformed records, written while PostgreSQL is
+    unreachable and bulk-loaded later by `python -m src.pipeline --flush-spool`.
+
+    Each line is a JSON object {"kind": ..., "run_date": ..., "record": {...}}. A batch
+    of records is written with one write() and made durable with one fsync, so the
+    cost of a sync is shared by every record of a load batch. One file is written per
+    run; it keeps a .part suffix until close(), so a flush never picks up a file that
+    is still being written.
+    """
+    def __init__(self, directory, run_date):
+        self.directory = Path(directory)
+        self.run_date = str(run_date)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"records-{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+        self.path = self.directory / f"{name}{PART_SUFFIX}"
+        self._file = None
+        self._lock = threading.Lock()  # Loaders may run in several threads
+        self.records = 0
+
+    def append(self, kind, records):
+        """
+        Add records of one kind and fsync them before returning.
+
+        Returns:
+            int: number of records written.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown spool kind: {kind}")
+        lines = ''.join(json.dumps({'kind': kind, 'run_date': self.run_date, 'record': record},
+                                   ensure_ascii=False, default=str) + '\n'
+                        for record in records)
+        if not lines:
+            return 0
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(lines)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.records += len(records)
+        return len(records)
+
+    def close(self):
+        """
+        Close the file and make it visible to flushes. Returns its path, or None when
+        nothing was spooled.
+        """
+        with self._lock:
+            if self._file is None:
+                return None
+            self._file.close()
+            self._file = None
+            path = self.path.with_name(self.path.name[:-len(PART_SUFFIX)] + SUFFIX)
+            os.replace(self.path, path)
+            return path
+
+def spool_files(directory):
+    """
+    Closed spool files of a directory, oldest first.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    return sorted(directory.glob(f"*{SUFFIX}"))
+
+def unfinished_files(directory):
+    """
+    Spool files that were never closed (their run was killed). Their complete lines
+    can be flushed after renaming them to .jsonl.
+    """
+    directory = Path(directory)
+    return sorted(directory.glob(f"*{PART_SUFFIX}")) if directory.is_dir() else []
+
+def read_spool(path):
+    """
+    Read a spool file back.
+
+    Returns:
+        dict: run_date -> {kind: list of records}. A torn last line (the process died
+        in the middle of a write) is skipped with a warning.
+    """
+    entries = {}
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, start=1):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logging.warning(f"Spool {path}: skipping unreadable line {number}")
+                continue
+            runs = entries.setdefault(entry['run_date'], {kind: [] for kind in KINDS})
+            runs[entry['kind']].append(entry['record'])
+    return entries
+
+def save_municipalities(directory, municipalities):
+    """
+    Keep a snapshot of (municipality_id, postal_code, station_code) rows next to the spool.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = directory / f"{MUNICIPALITIES_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump([list(municipality) for municipality in municipalities], f)
+    os.replace(tmp_path, directory / MUNICIPALITIES_FILE)
+
+def load_municipalities(directory):
+    """
+    The last municipalities snapshot, as a list of tuples, or None if there is none.
+    """
+    path = Path(directory) / MUNICIPALITIES_FILE
+    if not path.exists():
+        return None
+    with open(path, encoding='utf-8') as f:
+        return [tuple(municipality) for municipality in json.load(f)]
@@ -0,0 +1,110 @@
+import logging
+import queue
+import threading
+from collections import namedtuple
+
+# Sentinel that tells the next stage one of its producers has finished
+DONE = object()
+
+# One entry of the failure channel: the work item, the stage it failed in and the error
+Failure = namedtuple('Failure', ['item', 'stage', 'error'])
+
+def run_stages(items, extract, transform, load, workers=4, queue_size=8, batch_size=50, loaders=1):
+    """
+    Run items through extract -> transform -> load stages connected by bounded queues.
+
+    - `extract(item)` runs in `workers` threads (network-bound work).
+    - `transform(item, raw)` runs in a single transformer thread.
+    - `load(batch)` runs with lists of (item, transformed) pairs of up to `batch_size`
+      entries. With loaders=1 it runs on the calling thread only; with more, that many
+      threads (the calling one included) load concurrently, so `load` must then take
+      its own database connection for each batch (e.g. from a ConnectionPool).
+
+    Every queue holds at most `queue_size` entries: when the loader falls behind, the
+    transformer and then the extractors block instead of piling payloads up in memory.
+    An exception in any stage sends that item (or, for load, every item of the batch)
+    to the failure channel and the stream keeps flowing.
+
+    Returns:
+        list of Failure tuples.
+    """
+    extract_queue = queue.Queue(maxsize=queue_size)
+    transform_queue = queue.Queue(maxsize=queue_size)
+    load_queue = queue.Queue(maxsize=queue_size)
+    failures = queue.Queue()  # Unbounded: failures must never block a stage
+
+    def feed():
+        for item in items:
+            extract_queue.put(item)
+        # One end marker per extractor
+        for _ in range(workers):
+            extract_queue.put(DONE)
+
+    def extractor():
+        while True:
+            item = extract_queue.get()
+            if item is DONE:
+                transform_queue.put(DONE)
+                return
+            try:
+                raw = extract(item)
+            except Exception as e:
+                failures.put(Failure(item, 'extract', e))
+                continue
+            transform_queue.put((item, raw))
+
+    def transformer():
+        finished = 0
+        while finished < workers:
+            entry = transform_queue.get()
+            if entry is DONE:
+                finished += 1
+                continue
+            item, raw = entry
+            try:
+                transformed = transform(item, raw)
+            except Exception as e:
+                failures.put(Failure(item, 'transform', e))
+                continue
+            load_queue.put((item, transformed))
+        # One end marker per loader
+        for _ in range(loaders):
+            load_queue.put(DONE)
+
+    def flush(batch):
+        try:
+            load(batch)
+        except Exception as e:
+            logging.error(f"Load of a batch of {len(batch)} items failed: {e}")
+            for item, _ in batch:
+                failures.put(Failure(item, 'load', e))
+
+    def loader():
+        # Batch transformed items until the stream ends
+        batch = []
+        while True:
+            entry = load_queue.get()
+            if entry is DONE:
+                break
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+    # Daemon threads: a crash of the calling thread must not leave the process hanging
+    threads = [threading.Thread(target=feed, name='feeder', daemon=True)]
+    threads += [threading.Thread(target=extractor, name=f'extractor-{n}', daemon=True) for n in range(workers)]
+    threads.append(threading.Thread(target=transformer, name='transformer', daemon=True))
+    threads += [threading.Thread(target=loader, name=f'loader-{n}', daemon=True) for n in range(1, loaders)]
+    for thread in threads:
+        thread.start()
+
+    # The calling thread is always one of the loaders
+    loader()
+
+    for thread in threads:
+        thread.join()
+
+    return list(failures.queue)
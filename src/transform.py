@@ -1,3 +1,4 @@
+import logging
 from datetime import datetime, timedelta
 
 
@@ -56,6 +57,94 @@ def transform_observed(raw_json, municipality_id, date):
     }
 
 
+def transform_observed_range(raw_json, municipality_id):
+    """
+    Clean and reshape a multi-day observed payload into one record per day.
+
+    Parameters:
+        raw_json (list of dict): Daily stats of one station, each with a 'fecha' (YYYY-MM-DD).
+        municipality_id: Identifier for the municipality.
+
+    Returns:
+        list of transform_observed records, in payload order (empty list if input invalid).
+        Entries without a valid 'fecha' are skipped.
+    """
+    if not raw_json or not isinstance(raw_json, list):
+        return []
+
+    records = []
+    for observed_data in raw_json:
+        fecha = observed_data.get('fecha')
+        if not fecha:
+            continue
+        try:
+            day = datetime.strptime(fecha, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            # One bad day must not cost the rest of the station's range
+            logging.warning(f"Municipality {municipality_id} - Skipping observed record with malformed fecha {fecha!r}")
+            continue
+        records.append(transform_observed([observed_data], municipality_id, day))
+    return records
+
+
+def index_by_station(raw_json):
+    """
+    Group an all-stations observed payload by station code ('indicativo').
+
+    Parameters:
+        raw_json (list of dict): Daily values for many stations, as returned by 'todasestaciones'.
+
+    Returns:
+        dict mapping station code to the list of its daily records (empty dict if input invalid).
+    """
+    if not raw_json or not isinstance(raw_json, list):
+        return {}
+
+    index = {}
+    for record in raw_json:
+        station_code = record.get('indicativo')
+        if station_code:
+            index.setdefault(station_code, []).append(record)
+    return index
+
+
+def transform_observed_bulk(raw_json, municipalities, date):
+    """
+    Fan an all-stations observed payload out to every municipality.
+
+    Parameters:
+        raw_json (list of dict): Daily values for many stations, as returned by 'todasestaciones'.
+        municipalities (iterable): (municipality_id, station_code) pairs.
+        date (datetime): Date for which data was fetched.
+
+    Returns:
+        dict mapping municipality_id to its transform_observed record. Municipalities whose
+        station is missing from the payload are left out.
+    """
+    index = index_by_station(raw_json)
+
+    records = {}
+    for municipality_id, station_code in municipalities:
+        record = transform_observed(index.get(station_code), municipality_id, date)
+        if record:
+            records[municipality_id] = record
+    return records
+
+
+def forecast_date(day):
+    """
+    Date ('YYYY-MM-DD') of a forecast day entry of the 'prediccion' payload.
+
+    AEMET states it in 'fecha' ('YYYY-MM-DDT00:00:00'), so reprocessing an archived
+    payload gives the same date as the original run; without it, tomorrow is assumed.
+    Shared by transform_forecast and transform_forecast_hourly.
+    """
+    fecha = day.get('fecha')
+    if fecha:
+        return fecha[:10]
+    return (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
 def transform_forecast(raw_json, municipality_id):
     """
     Clean and reshape hourly forecast for the next day into summary metrics.
@@ -90,7 +179,7 @@ def transform_forecast(raw_json, municipality_id):
     
     return {
         'municipality_id': municipality_id,
-        'date': (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d'),
+        'date': forecast_date(tomorrow),
         'temperature_max': max(temp_vals) if temp_vals else None,
         'temperature_min': min(temp_vals) if temp_vals else None,
         'temperature_avg': round(sum(temp_vals)/len(temp_vals)) if temp_vals else None,
@@ -101,3 +190,67 @@ def transform_forecast(raw_json, municipality_id):
         'prob_precipitation': tomorrow.get('probPrecipitacion'),
         'prob_storm': tomorrow.get('probTormenta')
     }
+
+
+def period_hours(periodo):
+    """
+    Hours of the day covered by an AEMET 'periodo'.
+
+    Hourly values use a two-digit hour ('07'); probabilities use a four-digit
+    start/end range ('0208', '1420'). A range ending after midnight ('2002')
+    only covers its hours on the same day.
+    """
+    if not periodo or not periodo.isdigit():
+        return []
+    if len(periodo) == 2:
+        return [int(periodo)] if int(periodo) < 24 else []
+    start, end = int(periodo[:2]), int(periodo[2:4])
+    return list(range(start, end if end > start else 24))
+
+
+def transform_forecast_hourly(raw_json, municipality_id):
+    """
+    Reshape tomorrow's forecast into one typed record per hour.
+
+    Parameters:
+        raw_json (list of dict): AEMET forecast response, with 'prediccion' key.
+        municipality_id: Identifier for the municipality.
+
+    Returns:
+        list of dicts with the hourly temperature, humidity and precipitation, plus the
+        precipitation and storm probabilities of the period covering each hour
+        (empty list on invalid input). Same forecast day as transform_forecast.
+    """
+    if not raw_json or not isinstance(raw_json, list):
+        return []
+    days = raw_json[0].get('prediccion', {}).get('dia', [])
+    if len(days) < 2:
+        return []
+
+    tomorrow = days[1]
+    day = forecast_date(tomorrow)
+
+    # Series key in the payload -> record key and converter
+    series = [
+        ('temperatura', 'temperature', to_float),
+        ('humedadRelativa', 'humidity', to_float),
+        ('precipitacion', 'precipitation', to_float),
+        ('probPrecipitacion', 'prob_precipitation', to_int),
+        ('probTormenta', 'prob_storm', to_int),
+    ]
+
+    hours = {}
+    for source, key, convert in series:
+        for entry in tomorrow.get(source) or []:
+            value = entry.get('value')
+            value = convert(value) if value != '' else None
+            for hour in period_hours(entry.get('periodo')):
+                record = hours.setdefault(hour, {
+                    'municipality_id': municipality_id,
+                    'date': day,
+                    'hour': hour,
+                    **{k: None for _, k, _ in series},
+                })
+                record[key] = value
+
+    return [hours[hour] for hour in sorted(hours)]
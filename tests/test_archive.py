@@ -0,0 +1,49 @@
+from datetime import datetime
+from archive import RawArchive, ALL
+
+def test_put_is_date_partitioned_and_round_trips(tmp_path):
+    # Payloads land under kind/YYYY/MM/YYYY-MM-DD and come back identical
+    archive = RawArchive(tmp_path)
+    payload = [{"prediccion": {"dia": []}, "nombre": "Alicante/Alacant"}]
+    archive.put("forecast", datetime(2025, 3, 9), 7, payload)
+
+    path = tmp_path / "forecast" / "2025" / "03" / "2025-03-09" / "7.json.gz"
+    assert path.exists()
+    assert RawArchive.load(path) == payload
+
+def test_put_observed_splits_by_day(tmp_path):
+    # A multi-day payload is stored as one file per 'fecha'
+    archive = RawArchive(tmp_path)
+    archive.put_observed([
+        {"fecha": "2025-03-01", "indicativo": "8025", "tmed": "14,2"},
+        {"fecha": "2025-03-02", "indicativo": "8025", "tmed": "15,0"},
+    ], key=3)
+
+    entries = archive.entries("observed", datetime(2025, 3, 1), datetime(2025, 3, 2))
+    assert [(day.day, key) for day, key, _ in entries] == [(1, 3), (2, 3)]
+    assert RawArchive.load(entries[1][2]) == [{"fecha": "2025-03-02", "indicativo": "8025", "tmed": "15,0"}]
+
+def test_all_stations_payloads_use_their_own_kind(tmp_path):
+    archive = RawArchive(tmp_path)
+    archive.put_observed([{"fecha": "2025-03-01", "indicativo": "8025"}])
+
+    assert archive.entries("observed", datetime(2025, 3, 1), datetime(2025, 3, 1)) == []
+    entries = archive.entries("observed_all", datetime(2025, 3, 1), datetime(2025, 3, 1))
+    assert [key for _, key, _ in entries] == [ALL]
+
+def test_empty_payloads_are_not_archived(tmp_path):
+    archive = RawArchive(tmp_path)
+    archive.put_observed(None, key=3)
+    archive.put_observed([], key=3)
+    assert list(tmp_path.iterdir()) == []
+
+def test_put_observed_skips_malformed_fecha(tmp_path):
+    # A bad date is dropped with a warning; the other days are still archived
+    archive = RawArchive(tmp_path)
+    archive.put_observed([
+        {"fecha": "2025-03-01", "indicativo": "8025"},
+        {"fecha": "01/03/2025", "indicativo": "8025"},
+    ], key=3)
+
+    entries = archive.entries("observed", datetime(2025, 3, 1), datetime(2025, 3, 1))
+    assert [key for _, key, _ in entries] == [3]
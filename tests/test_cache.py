@@ -0,0 +1,71 @@
+import os
+import time
+from cache import ResponseCache
+
+def test_put_then_get_roundtrip(tmp_path):
+    # Stored payloads come back identical and are written gzip-compressed
+    cache = ResponseCache(tmp_path)
+    payload = [{"indicativo": "8025", "nombre": "ALACANT/ALICANTE", "prec": "0,0"}]
+    cache.put("OBSERVED", "http://aemet/obs/8025", payload)
+    assert cache.get("OBSERVED", "http://aemet/obs/8025") == payload
+    files = list(tmp_path.glob("OBSERVED/*/*.json.gz"))
+    assert len(files) == 1
+    assert cache.hits == 1
+
+def test_key_depends_on_url_and_params():
+    # Same URL with different parameters must not collide; parameter order does not matter
+    assert ResponseCache.key("u") != ResponseCache.key("u", {"a": 1})
+    assert ResponseCache.key("u", {"a": 1, "b": 2}) == ResponseCache.key("u", {"b": 2, "a": 1})
+
+def test_miss_returns_none(tmp_path):
+    # Unknown entries are misses
+    cache = ResponseCache(tmp_path)
+    assert cache.get("FORECAST", "http://aemet/forecast/30030") is None
+    assert cache.misses == 1
+
+def test_forecast_entries_expire(tmp_path):
+    # An entry older than its class TTL is ignored
+    cache = ResponseCache(tmp_path, ttls={"FORECAST": 60})
+    cache.put("FORECAST", "http://f", {"ok": True})
+    path = next(tmp_path.glob("FORECAST/*/*.json.gz"))
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert cache.get("FORECAST", "http://f") is None
+
+def test_observed_entries_never_expire(tmp_path):
+    # Observed days are immutable: no TTL
+    cache = ResponseCache(tmp_path)
+    cache.put("OBSERVED", "http://o", [1])
+    path = next(tmp_path.glob("OBSERVED/*/*.json.gz"))
+    old = time.time() - 365 * 86400
+    os.utime(path, (old, old))
+    assert cache.get("OBSERVED", "http://o") == [1]
+
+def test_offline_serves_expired_entries(tmp_path):
+    # Replay mode prefers stale data over no data
+    cache = ResponseCache(tmp_path, ttls={"FORECAST": 60}, offline=True)
+    cache.put("FORECAST", "http://f", {"ok": True})
+    path = next(tmp_path.glob("FORECAST/*/*.json.gz"))
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+    assert cache.get("FORECAST", "http://f") == {"ok": True}
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    # Past max_bytes, the entries with the oldest access time go first
+    cache = ResponseCache(tmp_path, max_bytes=10**9)
+    for i in range(5):
+        cache.put("OBSERVED", f"http://o/{i}", {"data": "x" * 50, "i": i})
+    paths = {p.name: p for p in tmp_path.glob("OBSERVED/*/*.json.gz")}
+    # Make entry 0 the oldest access, entry 4 the newest
+    for i in range(5):
+        path = paths[f"{ResponseCache.key(f'http://o/{i}')}.json.gz"]
+        os.utime(path, (1000 + i, path.stat().st_mtime))
+    one_entry = next(iter(paths.values())).stat().st_size
+
+    cache.max_bytes = one_entry * 3
+    cache.put("OBSERVED", "http://o/new", {"data": "y"})
+
+    assert cache.get("OBSERVED", "http://o/0") is None
+    assert cache.get("OBSERVED", "http://o/new") == {"data": "y"}
+    total = sum(p.stat().st_size for p in tmp_path.glob("OBSERVED/*/*.json.gz"))
+    assert total <= cache.max_bytes
@@ -0,0 +1,38 @@
+import configparser
+from pathlib import Path
+
+import pytest
+
+from config import PROJECT_ROOT, REQUIRED, read_section
+
+def parser(text):
+    cfg = configparser.ConfigParser()
+    cfg.read_string(text)
+    return cfg
+
+def test_read_section_types_come_from_defaults():
+    # Present keys are parsed with the type of their default, missing ones fall back
+    cfg = parser("[pipeline]\nworkers = 8\nrequest_interval = 0.5\nenabled = no\nbase_url = http://x\n")
+    settings = read_section('pipeline', {
+        'workers': 4, 'request_interval': 1.2, 'enabled': True, 'base_url': 'http://y', 'loaders': 1,
+    }, cfg=cfg)
+    assert settings == {'workers': 8, 'request_interval': 0.5, 'enabled': False, 'base_url': 'http://x',
+                        'loaders': 1}
+
+def test_read_section_missing_section_gives_defaults():
+    assert read_section('gaps', {'lookback_days': 60}, cfg=parser("")) == {'lookback_days': 60}
+
+def test_read_section_explicit_types_and_paths():
+    # None defaults need a type; Path values are resolved against the project root
+    cfg = parser("[drought]\ncalibration_start = 1991\n[spool]\ndirectory = /var/spool/weather\n")
+    drought = read_section('drought', {'calibration_start': None, 'calibration_end': None},
+                           types={'calibration_start': int, 'calibration_end': int}, cfg=cfg)
+    assert drought == {'calibration_start': 1991, 'calibration_end': None}
+    assert read_section('spool', {'directory': Path('spool')}, cfg=cfg)['directory'] == Path('/var/spool/weather')
+    assert read_section('cache', {'directory': Path('cache')}, cfg=cfg)['directory'] == PROJECT_ROOT / 'cache'
+
+def test_read_section_required_keys():
+    cfg = parser("[database]\ndbname = weather\n")
+    assert read_section('database', {'dbname': REQUIRED}, cfg=cfg) == {'dbname': 'weather'}
+    with pytest.raises(KeyError):
+        read_section('database', {'dbname': REQUIRED, 'user': REQUIRED}, cfg=cfg)
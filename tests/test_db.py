@@ -0,0 +1,116 @@
+import threading
+import time
+import psycopg2
+import pytest
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+import db
+from db import ConnectionPool
+
+class FakeConnection:
+    """
+    Minimal stand-in for a psycopg2 connection.
+    """
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.closed = 0
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.broken = False
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+            def execute(self, sql):
+                if conn.broken:
+                    raise psycopg2.OperationalError("server closed the connection unexpectedly")
+                conn.in_transaction = True
+
+        return Cursor()
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_INTRANS if self.in_transaction else extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+
+@pytest.fixture
+def connections(monkeypatch):
+    # Every psycopg2.connect call made by the pool returns a new FakeConnection
+    created = []
+    def fake_connect(**kwargs):
+        conn = FakeConnection(**kwargs)
+        created.append(conn)
+        return conn
+    monkeypatch.setattr(db.psycopg2, "connect", fake_connect)
+    return created
+
+def test_connections_are_reused(connections):
+    # Sequential checkouts share one connection
+    pool = ConnectionPool(minconn=0, maxconn=2, dbname="weather")
+    for _ in range(3):
+        with pool.connection() as conn:
+            assert conn is connections[0]
+    assert len(connections) == 1
+    assert pool.stats()['acquired'] == 3
+
+def test_statement_timeout_is_set_on_connect(connections):
+    ConnectionPool(minconn=1, statement_timeout_ms=5000, dbname="weather")
+    assert connections[0].kwargs == {"dbname": "weather", "options": "-c statement_timeout=5000"}
+
+def test_uncommitted_work_is_rolled_back_on_return(connections):
+    # An exception inside the block leaves no open transaction behind
+    pool = ConnectionPool(minconn=0, maxconn=1)
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("UPDATE weather_records SET precipitation = 0;")
+            raise RuntimeError("load failed")
+    assert connections[0].rollbacks == 1
+    assert pool.stats()['idle'] == 1
+
+def test_broken_idle_connection_is_replaced(connections):
+    # The health check discards a connection the server dropped while it was idle
+    pool = ConnectionPool(minconn=1, maxconn=1, health_check_interval=0)
+    connections[0].broken = True
+    with pool.connection() as conn:
+        assert conn is connections[1]
+    assert connections[0].closed
+    assert pool.stats()['discarded'] == 1
+
+def test_waits_for_a_free_connection_and_records_it(connections):
+    # At maxconn a second caller blocks until the first returns its connection
+    pool = ConnectionPool(minconn=0, maxconn=1, acquire_timeout=5)
+    first = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(first,)).start()
+    with pool.connection() as conn:
+        assert conn is first
+    stats = pool.stats()
+    assert stats['waited'] == 1
+    assert stats['max_wait_seconds'] >= 0.04
+
+def test_acquire_timeout_raises_pool_error(connections):
+    pool = ConnectionPool(minconn=0, maxconn=1, acquire_timeout=0.05)
+    pool.getconn()
+    started = time.monotonic()
+    with pytest.raises(PoolError):
+        pool.getconn()
+    assert time.monotonic() - started >= 0.05
+
+def test_closed_pool_refuses_checkouts(connections):
+    pool = ConnectionPool(minconn=1)
+    pool.close()
+    assert connections[0].closed
+    with pytest.raises(PoolError):
+        pool.getconn()
@@ -0,0 +1,75 @@
+import math
+import statistics
+from datetime import date
+import numpy as np
+import pytest
+import drought
+
+def test_gammainc_matches_closed_forms():
+    # P(1, x) = 1 - e^-x, P(2, x) = 1 - e^-x (1 + x), P(1/2, x) = erf(sqrt(x))
+    x = np.array([0.0, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0])
+    assert np.allclose(drought.gammainc(1, x), 1 - np.exp(-x))
+    assert np.allclose(drought.gammainc(2, x), 1 - np.exp(-x) * (1 + x))
+    assert np.allclose(drought.gammainc(0.5, x), [math.erf(math.sqrt(v)) for v in x])
+    assert np.isnan(drought.gammainc(np.nan, 1.0))
+
+def test_norm_ppf_matches_the_standard_library():
+    p = np.array([1e-6, 0.01, 0.025, 0.3, 0.5, 0.9, 0.975, 0.999999])
+    expected = [statistics.NormalDist().inv_cdf(v) for v in p]
+    assert np.allclose(drought.norm_ppf(p), expected, atol=1e-8)
+    assert list(drought.norm_ppf([0.0, 1.0])) == [-np.inf, np.inf]
+
+def test_monthly_totals_require_coverage():
+    # Two municipalities over January and February 2025 (31 + 28 days)
+    daily = np.ones((2, 59))
+    daily[1, 31:40] = np.nan  # 19 of 28 February days: below 80% coverage
+    starts, months = drought.month_starts(date(2025, 1, 1), 59)
+    assert list(starts) == [0, 31]
+    assert [str(m) for m in months] == ['2025-01', '2025-02']
+
+    sums, means = drought.monthly_totals(daily, starts)
+    assert sums[0].tolist() == [31.0, 28.0]
+    assert sums[1, 0] == 31.0 and np.isnan(sums[1, 1])
+    assert means[0].tolist() == [1.0, 1.0]
+
+def test_rolling_sum_needs_every_month():
+    monthly = np.array([[1.0, 2.0, 3.0, np.nan, 5.0, 6.0]])
+    result = drought.rolling_sum(monthly, 2)
+    assert np.isnan(result[0, 0])
+    assert result[0, 1:3].tolist() == [3.0, 5.0]
+    assert np.isnan(result[0, 3]) and np.isnan(result[0, 4])
+    assert result[0, 5] == 11.0
+
+def test_spi_is_standard_normal_on_gamma_rainfall():
+    # 40 years of gamma-distributed monthly rain for 3 municipalities
+    rng = np.random.default_rng(1)
+    monthly = rng.gamma(2.0, 20.0, size=(3, 480))
+    values = drought.spi(monthly, np.datetime64('1980-01'), 3)
+    valid = values[~np.isnan(values)]
+    assert abs(valid.mean()) < 0.05
+    assert abs(valid.std() - 1) < 0.05
+    assert np.all(np.abs(valid) <= drought.SPI_LIMIT)
+    # The first two months have no 3-month accumulation yet
+    assert np.isnan(values[:, :2]).all() and not np.isnan(values[:, 2:]).any()
+
+def test_spi_undefined_without_enough_years():
+    monthly = np.full((1, 36), 10.0)
+    assert np.isnan(drought.spi(monthly, np.datetime64('2020-01'), 1, min_years=10)).all()
+
+def test_de_martonne_over_twelve_months():
+    # 600 mm a year at 20 degC: 600 / (20 + 10) = 20
+    precipitation = np.full((1, 12), 50.0)
+    temperature = np.full((1, 12), 20.0)
+    index = drought.de_martonne(precipitation, temperature)
+    assert np.isnan(index[0, :11]).all()
+    assert index[0, 11] == pytest.approx(20.0)
+
+@pytest.mark.parametrize('calibration, written_from', [(None, None), ((1991, 2020), date(2025, 3, 1))])
+def test_refresh_rewrites_everything_without_a_calibration_period(monkeypatch, calibration, written_from):
+    # Fits over every year move the SPI of past months, so `since` only holds with a fixed period
+    calls = []
+    monkeypatch.setattr(drought, 'load_daily', lambda cursor, today: ([1], date(2025, 1, 1), None, None))
+    monkeypatch.setattr(drought, 'compute_indices', lambda *args: ('months', 'indices'))
+    monkeypatch.setattr(drought, 'write_indices', lambda cursor, ids, months, indices, since: calls.append(since))
+    drought.refresh_drought_indices(None, since=date(2025, 3, 1), calibration=calibration, today=date(2025, 4, 1))
+    assert calls == [written_from]
@@ -0,0 +1,86 @@
+from datetime import date
+from unittest.mock import Mock, patch
+import events
+
+def observed(day, precipitation=0.0, temperature_max=25.0, municipality_id=1):
+    return {'municipality_id': municipality_id, 'date': day,
+            'precipitation': precipitation, 'temperature_max': temperature_max}
+
+def forecast(day, storm, rain='0', municipality_id=1):
+    return {'municipality_id': municipality_id, 'date': day,
+            'prob_storm': [{'value': '5', 'periodo': '0208'}, {'value': str(storm), 'periodo': '1420'}],
+            'precipitations': [{'value': rain, 'periodo': '15'}, {'value': 'Ip', 'periodo': '16'}]}
+
+def fold(records, fold=events.fold_observed, state=None):
+    state = state or events.empty_state()
+    emitted = []
+    for record in records:
+        state, new = fold(state, record)
+        emitted.append(new)
+    return state, emitted
+
+def test_heavy_rain_over_72_hours_starts_at_first_rainy_day():
+    # 40 + 35 + 30 mm: no single day reaches 60 mm, the third day crosses 100 mm in 72 h
+    state, emitted = fold([observed('2024-10-28', 0), observed('2024-10-29', 40),
+                           observed('2024-10-30', 35), observed('2024-10-31', 30),
+                           observed('2024-11-01', 0)])
+    assert emitted[:3] == [[], [], []]
+    assert emitted[3] == [{'municipality_id': 1, 'event_type': events.HEAVY_RAIN,
+                           'start_date': date(2024, 10, 29), 'end_date': date(2024, 10, 31),
+                           'days': 3, 'peak': 40, 'accumulated': 105}]
+    # A dry day closes the episode
+    assert emitted[4] == [] and state['rain_start'] is None
+    assert (state['rain_last'], state['rain_before']) == (0, 30)
+
+def test_heavy_rain_episode_extends_with_each_rainy_day():
+    _, emitted = fold([observed('2024-10-29', 180), observed('2024-10-30', 20)])
+    assert emitted[0][0]['days'] == 1
+    assert emitted[1][0]['start_date'] == date(2024, 10, 29)
+    assert (emitted[1][0]['days'], emitted[1][0]['peak'], emitted[1][0]['accumulated']) == (2, 180, 200)
+
+def test_heatwave_needs_consecutive_hot_days():
+    days = ['2025-07-01', '2025-07-02', '2025-07-03', '2025-07-04', '2025-07-06', '2025-07-07']
+    _, emitted = fold([observed(day, temperature_max=t) for day, t in zip(days, [39, 41, 38, 39, 40, 40])])
+    assert emitted[:2] == [[], []]
+    assert emitted[2][0]['event_type'] == events.HEATWAVE
+    assert (emitted[3][0]['start_date'], emitted[3][0]['days'], emitted[3][0]['peak']) == (date(2025, 7, 1), 4, 41)
+    # July 5th is missing: the run starts over
+    assert emitted[4:] == [[], []]
+
+def test_late_records_leave_the_state_alone():
+    state, _ = fold([observed('2025-07-02', 10)])
+    again, emitted = events.fold_observed(state, observed('2025-07-01', 90))
+    assert emitted is None and again is state
+
+def test_storm_forecast_from_highest_period_probability():
+    state, emitted = fold([forecast('2025-09-01', 80, '12.5'), forecast('2025-09-02', 75, '3'),
+                           forecast('2025-09-03', 20)], fold=events.fold_forecast)
+    assert emitted[0][0]['event_type'] == events.STORM_FORECAST
+    assert (emitted[1][0]['days'], emitted[1][0]['peak'], emitted[1][0]['accumulated']) == (2, 80, 15.5)
+    assert emitted[2] == [] and state['forecast_date'] == date(2025, 9, 3)
+
+def test_fold_records_keeps_the_latest_span_and_counts_late():
+    states = {2: dict(events.empty_state(), observed_date=date(2025, 1, 10))}
+    records = [observed('2024-10-30', 70), observed('2024-10-29', 80),
+               observed('2025-01-05', 90, municipality_id=2)]
+    states, found, late = events.fold_records(states, [], records)
+    assert late == 1
+    assert len(found) == 1 and found[0]['days'] == 2
+    assert states[1]['observed_date'] == date(2024, 10, 30)
+
+def test_detect_events_reads_and_writes_only_the_batch_state():
+    cursor = Mock()
+    cursor.fetchall.return_value = []
+    with patch.object(events, 'execute_values') as execute_values:
+        result = events.detect_events(cursor, [], [observed('2024-10-29', 150, municipality_id=7)])
+
+    assert result == {'events': 1, 'late': 0}
+    select = cursor.execute.call_args[0]
+    assert 'FOR UPDATE' in select[0] and select[1] == ([7],)
+    state_sql, event_sql = [c[0][1] for c in execute_values.call_args_list]
+    assert 'event_detector_state' in state_sql and 'extreme_events' in event_sql
+
+def test_detect_events_nothing_to_do():
+    cursor = Mock()
+    assert events.detect_events(cursor, [], []) == {'events': 0, 'late': 0}
+    cursor.execute.assert_not_called()
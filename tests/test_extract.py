@@ -1,20 +1,38 @@
 import datetime
+import threading
+import time
+import pytest
 import requests
 from extract import (
+    AemetClient,
+    BackoffPolicy,
+    CircuitBreaker,
+    CircuitOpenError,
+    RateLimiter,
+    SingleFlight,
+    fetch_datos,
     get_json_with_retry,
     get_data_url,
     get_observed_raw,
-    get_forecast_raw
+    get_observed_all_raw,
+    get_observed_range_raw,
+    get_forecast_raw,
+    endpoint_label,
+    iter_json_array,
+    stream_json_with_retry,
+    split_date_range
 )
+from metrics import Metrics
 
 class DummyResponse:
     """
     A fake response object to simulate requests.Response with controlled status and JSON data.
     """
-    def __init__(self, status_code, json_data=None, raise_exc=False):
+    def __init__(self, status_code, json_data=None, raise_exc=False, headers=None):
         self.status_code = status_code
         self._json_data = json_data or {}
         self._raise_exc = raise_exc # Flag to trigger an exception in raise_for_status
+        self.headers = headers or {}
 
     def raise_for_status(self):
         # Emulate HTTPError for status codes >=400 or if raise_exc=True
@@ -27,11 +45,26 @@ class DummyResponse:
         # Return the predefined JSON payload
         return self._json_data
 
+class FakeSession:
+    """
+    Stand-in for requests.Session that delegates GETs to a plain function.
+    """
+    def __init__(self, get):
+        self._get = get
+        self.adapters = {}
+
+    def get(self, url, headers=None, params=None, timeout=None, stream=False):
+        return self._get(url, headers=headers, params=params)
+
+def make_client(get, **kwargs):
+    # AemetClient wired to a fake session so no real HTTP happens
+    return AemetClient(session=FakeSession(get), **kwargs)
+
 def test_get_json_with_retry_success(monkeypatch):
     # Simulate a successful 200 OK response on first try
     resp = DummyResponse(200, {"foo": "bar"})
-    monkeypatch.setattr("extract.requests.get", lambda url, headers=None, params=None: resp)
-    result = get_json_with_retry("http://example.com")
+    client = make_client(lambda url, headers=None, params=None: resp)
+    result = get_json_with_retry("http://example.com", client=client)
     assert result == {"foo": "bar"}
 
 def test_get_json_with_retry_retries_then_success(monkeypatch):
@@ -39,9 +72,9 @@ def test_get_json_with_retry_retries_then_success(monkeypatch):
     calls = [DummyResponse(503), DummyResponse(200, {"ok": True})]
     def fake_get(url, headers=None, params=None):
         return calls.pop(0)
-    monkeypatch.setattr("extract.requests.get", fake_get)
+    client = make_client(fake_get)
     monkeypatch.setattr("extract.time.sleep", lambda s: None)
-    result = get_json_with_retry("url", query_type="Q", municipality_id=1)
+    result = get_json_with_retry("url", query_type="Q", municipality_id=1, client=client)
     assert result == {"ok": True}
 
 def test_get_json_with_retry_exception_and_final_failure(monkeypatch):
@@ -50,15 +83,128 @@ def test_get_json_with_retry_exception_and_final_failure(monkeypatch):
         err = requests.RequestException("fail")
         err.response = DummyResponse(500)
         raise err
-    monkeypatch.setattr("extract.requests.get", fake_get)
+    client = make_client(fake_get)
     monkeypatch.setattr("extract.time.sleep", lambda s: None)
-    result = get_json_with_retry("url")
+    result = get_json_with_retry("url", client=client)
     assert result is None
 
+def test_get_json_with_retry_acquires_rate_limiter(monkeypatch):
+    # Every attempt, including retries, must wait for a slot in the shared limiter
+    calls = [DummyResponse(503), DummyResponse(200, {"ok": True})]
+    monkeypatch.setattr("extract.time.sleep", lambda s: None)
+
+    class CountingLimiter:
+        acquired = 0
+        def acquire(self):
+            self.acquired += 1
+
+    limiter = CountingLimiter()
+    client = make_client(lambda url, headers=None, params=None: calls.pop(0), rate_limiter=limiter)
+    result = get_json_with_retry("url", client=client)
+    assert result == {"ok": True}
+    assert limiter.acquired == 2
+
+def test_rate_limiter_spaces_out_slots(monkeypatch):
+    # Three back-to-back acquisitions at the same instant wait 0, 1 and 2 intervals
+    waits = []
+    monkeypatch.setattr("extract.time.monotonic", lambda: 100.0)
+    monkeypatch.setattr("extract.time.sleep", waits.append)
+    limiter = RateLimiter(1.5)
+    for _ in range(3):
+        limiter.acquire()
+    assert waits == [1.5, 3.0]
+
+def test_backoff_policy_honours_retry_after_seconds():
+    # A numeric Retry-After header overrides the exponential schedule
+    policy = BackoffPolicy(base_delay=5)
+    resp = DummyResponse(429, headers={"Retry-After": "30"})
+    assert policy.delay(1, resp) == 30
+
+def test_backoff_policy_retry_after_is_capped():
+    # Absurd Retry-After values are clamped to max_delay
+    policy = BackoffPolicy(max_delay=60)
+    resp = DummyResponse(429, headers={"Retry-After": "3600"})
+    assert policy.delay(1, resp) == 60
+
+def test_backoff_policy_parses_retry_after_http_date():
+    # HTTP-date form is converted to the remaining number of seconds
+    policy = BackoffPolicy()
+    when = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=45)
+    resp = DummyResponse(503, headers={"Retry-After": when.strftime("%a, %d %b %Y %H:%M:%S GMT")})
+    assert 40 <= policy.delay(1, resp) <= 45
+
+def test_backoff_policy_exponential_with_jitter():
+    # Without Retry-After the delay doubles per attempt, jittered into [d*(1-jitter), d]
+    policy = BackoffPolicy(base_delay=2, factor=2, jitter=0.5, max_delay=100)
+    for attempt, full in [(1, 2), (2, 4), (3, 8)]:
+        delay = policy.delay(attempt)
+        assert full * 0.5 <= delay <= full
+    assert policy.delay(10) <= 100
+
+def test_get_json_with_retry_respects_deadline(monkeypatch):
+    # Once the next wait would overrun the call deadline, give up without sleeping
+    # Fake clock that only moves forward when the code sleeps
+    clock = [0.0]
+    sleeps = []
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+    monkeypatch.setattr("extract.time.monotonic", lambda: clock[0])
+    monkeypatch.setattr("extract.time.sleep", fake_sleep)
+    policy = BackoffPolicy(base_delay=10, jitter=0, deadline=25)
+    client = make_client(lambda url, headers=None, params=None: DummyResponse(503), backoff=policy)
+    assert get_json_with_retry("url", client=client) is None
+    assert sleeps == [10]
+
+def test_get_json_with_retry_shares_quota_wait(monkeypatch):
+    # A 429 defers the shared limiter instead of sleeping in the calling worker
+    calls = [DummyResponse(429, headers={"Retry-After": "7"}), DummyResponse(200, {"ok": True})]
+    sleeps = []
+    monkeypatch.setattr("extract.time.sleep", sleeps.append)
+
+    class RecordingLimiter:
+        deferred = []
+        def acquire(self):
+            pass
+        def defer(self, seconds):
+            self.deferred.append(seconds)
+
+    limiter = RecordingLimiter()
+    client = make_client(lambda url, headers=None, params=None: calls.pop(0), rate_limiter=limiter)
+    assert get_json_with_retry("url", client=client) == {"ok": True}
+    assert limiter.deferred == [7]
+    assert sleeps == []
+
+def test_aemet_client_reports_connection_reuse():
+    # Requests are counted on the client; connections come from the urllib3 pools
+    client = AemetClient()
+    client._requests = 3
+    assert client.connection_stats() == {'requests': 3, 'connections': 0, 'reused': 3, 'coalesced': 0}
+    client.close()
+
+def test_get_data_url_sends_api_key_header():
+    # The metadata call carries the API key; falls back to the client's key
+    seen = {}
+    def fake_get(url, headers=None, params=None):
+        seen['headers'] = headers
+        return DummyResponse(200, {"datos": "http://d"})
+    client = make_client(fake_get, api_key="client-key")
+    assert get_data_url("endpoint", 1, None, "T", client=client) == "http://d"
+    assert seen['headers'] == {"api_key": "client-key"}
+
+def test_get_observed_raw_uses_client_base_url(monkeypatch):
+    # Endpoints are built from the client's base_url so a local stand-in can be used
+    urls = []
+    monkeypatch.setattr("extract.get_data_url", lambda url, *a, **k: urls.append(url))
+    client = AemetClient(base_url="http://localhost:8000/api/")
+    get_observed_raw(1, "7178I", datetime.date(2025, 5, 3), "key", client=client)
+    assert urls[0].startswith("http://localhost:8000/api/valores/climatologicos/diarios/datos/")
+    assert urls[0].endswith("/estacion/7178I")
+
 def test_get_data_url_success(monkeypatch):
    # If get_json_with_retry returns a dict with 'datos', get_data_url should extract it
     monkeypatch.setattr("extract.get_json_with_retry",
-                        lambda endpoint_url, headers, params, query_type, municipality_id: {"datos": "http://data.url"})
+                        lambda endpoint_url, headers, params, query_type, municipality_id, **kwargs: {"datos": "http://data.url"})
     url = get_data_url("endpoint", municipality_id=42, api_key="key", query_type="T")
     assert url == "http://data.url"
 
@@ -95,3 +241,319 @@ def test_get_forecast_raw_short_circuit(monkeypatch):
     monkeypatch.setattr("extract.get_data_url", lambda *a, **k: None)
     res = get_forecast_raw("cid", "28079", "apikey")
     assert res is None
+
+def test_get_observed_all_raw_hits_todasestaciones(monkeypatch):
+    # The bulk fetch targets the all-stations endpoint and returns its payload
+    urls = []
+    def fake_get_data_url(url, *a, **k):
+        urls.append(url)
+        return "http://d"
+    monkeypatch.setattr("extract.get_data_url", fake_get_data_url)
+    monkeypatch.setattr("extract.get_json_with_retry", lambda url, **k: [{"indicativo": "8025"}])
+    res = get_observed_all_raw(datetime.date(2025, 5, 3), "apikey")
+    assert res == [{"indicativo": "8025"}]
+    assert urls[0].endswith("/fechaini/2025-05-03T00:00:00UTC/fechafin/2025-05-03T23:59:59UTC/todasestaciones")
+
+def test_get_observed_all_raw_short_circuit(monkeypatch):
+    # No 'datos' URL means no payload call
+    monkeypatch.setattr("extract.get_data_url", lambda *a, **k: None)
+    assert get_observed_all_raw(datetime.date(2025, 5, 3), "apikey") is None
+
+def test_split_date_range_windows():
+    # 40 days in windows of 15 -> 15 + 15 + 10, contiguous and inclusive
+    start = datetime.date(2025, 1, 1)
+    end = datetime.date(2025, 2, 9)
+    windows = split_date_range(start, end, 15)
+    assert windows == [
+        (datetime.date(2025, 1, 1), datetime.date(2025, 1, 15)),
+        (datetime.date(2025, 1, 16), datetime.date(2025, 1, 30)),
+        (datetime.date(2025, 1, 31), datetime.date(2025, 2, 9)),
+    ]
+    # A single day is a single window
+    assert split_date_range(start, start, 15) == [(start, start)]
+
+def test_get_observed_range_raw_uses_full_range(monkeypatch):
+    # fechaini is the start of the first day and fechafin the end of the last day
+    urls = []
+    def fake_get_data_url(url, *a, **k):
+        urls.append(url)
+        return "http://d"
+    monkeypatch.setattr("extract.get_data_url", fake_get_data_url)
+    monkeypatch.setattr("extract.get_json_with_retry", lambda url, **k: [{"fecha": "2025-01-01"}])
+    res = get_observed_range_raw(1, "8025", datetime.date(2025, 1, 1), datetime.date(2025, 1, 31), "key")
+    assert res == [{"fecha": "2025-01-01"}]
+    assert "/fechaini/2025-01-01T00:00:00UTC/fechafin/2025-01-31T23:59:59UTC/estacion/8025" in urls[0]
+
+class MemoryCache:
+    """
+    Dict-backed stand-in for ResponseCache.
+    """
+    def __init__(self, offline=False):
+        self.offline = offline
+        self.entries = {}
+
+    def get(self, endpoint_class, url, params=None):
+        return self.entries.get((endpoint_class, url) + ((tuple(sorted(params.items())),) if params else ()))
+
+    def put(self, endpoint_class, url, data, params=None):
+        self.entries[(endpoint_class, url) + ((tuple(sorted(params.items())),) if params else ())] = data
+
+def test_fetch_datos_stores_and_reuses_payload(monkeypatch):
+    # The first call hits the network and fills the cache; the second is served from it
+    calls = []
+    monkeypatch.setattr("extract.get_data_url", lambda *a, **k: calls.append("meta") or "http://d")
+    monkeypatch.setattr("extract.get_json_with_retry", lambda url, **k: calls.append("datos") or [{"v": 1}])
+    client = AemetClient(cache=MemoryCache())
+    assert fetch_datos("http://endpoint", 1, "key", "OBSERVED", client=client) == [{"v": 1}]
+    assert fetch_datos("http://endpoint", 1, "key", "OBSERVED", client=client) == [{"v": 1}]
+    assert calls == ["meta", "datos"]
+    assert client.cache.entries == {("OBSERVED", "http://endpoint"): [{"v": 1}]}
+
+def test_fetch_datos_offline_never_hits_network(monkeypatch):
+    # Offline replay: a miss returns None without any HTTP call
+    def fail(*a, **k):
+        raise AssertionError("network used in offline mode")
+    monkeypatch.setattr("extract.get_data_url", fail)
+    client = AemetClient(cache=MemoryCache(offline=True))
+    assert fetch_datos("http://endpoint", 1, "key", "FORECAST", client=client) is None
+
+def test_fetch_datos_does_not_cache_failures(monkeypatch):
+    # A failed payload fetch leaves the cache untouched
+    monkeypatch.setattr("extract.get_data_url", lambda *a, **k: "http://d")
+    monkeypatch.setattr("extract.get_json_with_retry", lambda url, **k: None)
+    client = AemetClient(cache=MemoryCache())
+    assert fetch_datos("http://endpoint", 1, "key", "FORECAST", client=client) is None
+    assert client.cache.entries == {}
+
+def test_repoll_of_same_window_reaches_network(monkeypatch):
+    # Gap re-polls refresh: a cached partial payload from an earlier run is not served again
+    payloads = [[{"fecha": "2025-05-01"}], [{"fecha": "2025-05-01"}, {"fecha": "2025-05-02"}]]
+    calls = []
+    monkeypatch.setattr("extract.get_data_url", lambda *a, **k: "http://d")
+    monkeypatch.setattr("extract.get_json_with_retry", lambda url, **k: calls.append(url) or payloads[len(calls) - 1])
+    cache = MemoryCache()
+    start, end = datetime.date(2025, 5, 1), datetime.date(2025, 5, 2)
+    for run in range(2):
+        client = AemetClient(cache=cache)  # A new client per run, the cache is shared
+        raw = get_observed_range_raw(1, "7178I", start, end, "key", client=client, refresh=True)
+        assert raw == payloads[run]
+    assert len(calls) == 2
+    assert list(cache.entries.values()) == [payloads[1]]
+
+def test_single_flight_shares_one_in_flight_fetch():
+    # Callers arriving while the first fetch runs wait for it instead of fetching again
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return [{"v": 1}]
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", fetch)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", fetch))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flight.hits < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert calls == [1]
+    assert results == [[{"v": 1}]] * 4
+    assert flight.hits == 3
+
+def test_single_flight_retries_failures_and_bounds_results():
+    # None is not kept, so the next caller fetches again; kept results are LRU-bounded
+    flight = SingleFlight(max_results=1)
+    assert flight.do("a", lambda: None) is None
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("a", lambda: 2) == 1
+    assert flight.do("b", lambda: 3) == 3
+    assert flight.do("a", lambda: 4) == 4
+    assert flight.hits == 1
+
+def test_fetch_datos_coalesces_shared_station(monkeypatch):
+    # Two municipalities on the same station and date cost one metadata + one payload call
+    calls = []
+    monkeypatch.setattr("extract.get_data_url", lambda *a, **k: calls.append("meta") or "http://d")
+    monkeypatch.setattr("extract.get_json_with_retry", lambda url, **k: calls.append("datos") or [{"v": 1}])
+    client = AemetClient()
+    day = datetime.date(2025, 5, 3)
+    assert get_observed_raw(1, "7178I", day, "key", client=client) == [{"v": 1}]
+    assert get_observed_raw(2, "7178I", day, "key", client=client) == [{"v": 1}]
+    get_observed_raw(3, "7178I", day + datetime.timedelta(days=1), "key", client=client)
+    assert calls == ["meta", "datos"] * 2
+    assert client.connection_stats()['coalesced'] == 1
+
+def test_filtered_all_stations_fetch_is_coalesced(monkeypatch):
+    # Same dates and station set (in any order) stream once; another set is its own fetch
+    streams = []
+    def fake_stream(url, municipality_id, api_key, query_type, client=None, keep=None):
+        streams.append(url)
+        return [record for record in [{"indicativo": "8025"}, {"indicativo": "7178I"}] if keep(record)]
+    monkeypatch.setattr("extract.stream_datos", fake_stream)
+    client = AemetClient()
+    day = datetime.date(2025, 5, 3)
+    assert get_observed_all_raw(day, "key", client=client, station_codes=["8025", "7178I"]) == [
+        {"indicativo": "8025"}, {"indicativo": "7178I"}]
+    get_observed_all_raw(day, "key", client=client, station_codes=["7178I", "8025"])
+    assert get_observed_all_raw(day, "key", client=client, station_codes=["8025"]) == [{"indicativo": "8025"}]
+    assert len(streams) == 2
+    assert client.connection_stats()['coalesced'] == 1
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_circuit_breaker_opens_probes_and_closes():
+    # Opens at the failure rate, fails fast during the cooldown, then one probe decides
+    clock = FakeClock()
+    breaker = CircuitBreaker("observed", failure_rate=0.5, window=4, min_calls=4, cooldown=30, clock=clock)
+    for success in (True, False, True):
+        assert breaker.allow()
+        breaker.record(success)
+    breaker.record(None)  # A 429 says nothing about the endpoint
+    assert breaker.state == "closed"
+    breaker.record(False)
+    assert breaker.state == "open" and breaker.opened == 1
+    assert not breaker.allow()
+
+    clock.now = 30
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.record(False)
+    assert breaker.state == "open" and breaker.opened == 2
+
+    clock.now = 60
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.rejected == 2
+
+def test_get_json_with_retry_fails_fast_when_circuit_opens(monkeypatch):
+    # Once the family's circuit opens, retries stop without sleeping and later calls skip the network
+    calls, sleeps = [], []
+    def fake_get(url, headers=None, params=None):
+        calls.append(url)
+        return DummyResponse(503)
+    monkeypatch.setattr("extract.time.sleep", sleeps.append)
+    client = make_client(fake_get, breaker={'failure_rate': 1.0, 'window': 2, 'min_calls': 2})
+    with pytest.raises(CircuitOpenError):
+        get_json_with_retry("url", query_type="FORECAST", client=client)
+    assert len(calls) == 2 and len(sleeps) == 1
+    with pytest.raises(CircuitOpenError):
+        get_json_with_retry("url2", query_type="FORECAST", client=client)
+    assert len(calls) == 2
+    # Other families keep their own circuit
+    assert client.breaker("observed_all") is client.breaker("observed")
+    assert client.breaker("observed").state == "closed"
+    assert client.breaker_stats()["forecast"] == {'state': 'open', 'opened': 1, 'failures': 2, 'rejected': 1}
+
+def test_tripping_failure_is_recorded_once(monkeypatch):
+    # The failure that opens the circuit counts once, whether it is a status or a network error
+    def refused(url, headers=None, params=None):
+        raise requests.ConnectionError("refused")
+    for fake_get in (lambda url, headers=None, params=None: DummyResponse(503), refused):
+        monkeypatch.setattr("extract.time.sleep", lambda s: None)
+        client = make_client(fake_get, breaker={'failure_rate': 1.0, 'window': 1, 'min_calls': 1})
+        with pytest.raises(CircuitOpenError) as raised:
+            get_json_with_retry("url", query_type="FORECAST", client=client)
+        assert client.breaker("forecast").failures == 1
+        assert not isinstance(raised.value.__context__, CircuitOpenError)  # Not re-raised by the handler
+
+def test_endpoint_label():
+    # Payload downloads are grouped under 'datos', metadata calls under their query type
+    assert endpoint_label("https://opendata.aemet.es/opendata/sh/abc123", "FORECAST") == "datos"
+    assert endpoint_label("https://opendata.aemet.es/opendata/api/prediccion", "FORECAST") == "forecast"
+    assert endpoint_label("url", None) == "unknown"
+
+def test_metrics_record_latency_and_retries(monkeypatch):
+    # A 503 then a 200: two latency observations and one retry for the endpoint
+    calls = [DummyResponse(503), DummyResponse(200, {"ok": True})]
+    metrics = Metrics()
+    client = make_client(lambda url, headers=None, params=None: calls.pop(0), metrics=metrics)
+    monkeypatch.setattr("extract.time.sleep", lambda s: None)
+    assert get_json_with_retry("url", query_type="OBSERVED", client=client) == {"ok": True}
+    assert metrics.http_latency[("observed", "503")].count == 1
+    assert metrics.http_latency[("observed", "200")].count == 1
+    assert metrics.http_retries == {"observed": 1}
+
+class StreamResponse(DummyResponse):
+    """
+    DummyResponse whose body is read in chunks, like a streamed requests.Response.
+    """
+    def __init__(self, body, chunk_size=7, encoding="ISO-8859-15"):
+        super().__init__(200)
+        self._body = body.encode(encoding)
+        self._chunk_size = chunk_size
+        self.encoding = encoding
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self._body), self._chunk_size):
+            yield self._body[i:i + self._chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+def test_iter_json_array_any_chunking():
+    # Elements come out whole however the text is split, numbers included
+    text = ' [ {"indicativo": "8025", "tmed": "18,5"}, 12345 , "a]b", [1, 2], null ]'
+    expected = [{"indicativo": "8025", "tmed": "18,5"}, 12345, "a]b", [1, 2], None]
+    for size in (1, 2, 5, len(text)):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert list(iter_json_array(chunks)) == expected
+
+def test_iter_json_array_rejects_non_arrays_and_truncation():
+    # An error object instead of a list, or a cut-off payload, is a ValueError
+    try:
+        list(iter_json_array(['{"estado": 404}']))
+        assert False
+    except ValueError:
+        pass
+    try:
+        list(iter_json_array(['[{"a": 1}, {"b"']))
+        assert False
+    except ValueError:
+        pass
+
+def test_stream_json_with_retry_decodes_and_counts_bytes():
+    # Latin-1 payload decoded incrementally; body bytes counted as they are read
+    body = '[{"nombre": "XÀTIVA"}, {"nombre": "ÁGUILAS"}]'
+    response = StreamResponse(body)
+    metrics = Metrics()
+    client = make_client(lambda url, headers=None, params=None: response, metrics=metrics)
+    records = list(stream_json_with_retry("http://x/opendata/sh/abc", query_type="OBSERVED_ALL", client=client))
+    assert records == [{"nombre": "XÀTIVA"}, {"nombre": "ÁGUILAS"}]
+    assert metrics.http_bytes == {"datos": len(body.encode("ISO-8859-15"))}
+    assert response.closed
+
+def test_get_observed_all_raw_streams_only_wanted_stations(monkeypatch):
+    # With station_codes the payload is streamed, filtered and the filtered list cached
+    body = '[{"indicativo": "8025", "tmed": "1"}, {"indicativo": "9999", "tmed": "2"}, {"indicativo": "7178I", "tmed": "3"}]'
+    monkeypatch.setattr("extract.get_data_url", lambda *a, **k: "http://d")
+    client = make_client(lambda url, headers=None, params=None: StreamResponse(body), cache=MemoryCache())
+    res = get_observed_all_raw(datetime.date(2025, 5, 3), "apikey", client=client, station_codes=["8025", "7178I"])
+    assert [r["indicativo"] for r in res] == ["8025", "7178I"]
+    assert list(client.cache.entries.values()) == [res]
+    # Second call is served from the cache
+    client.session = None
+    assert get_observed_all_raw(datetime.date(2025, 5, 3), "apikey", client=client,
+                                station_codes=["7178I", "8025"]) == res
+
+def test_get_observed_all_raw_stream_failure_returns_none(monkeypatch):
+    # A truncated payload is a failure, and nothing is cached
+    monkeypatch.setattr("extract.get_data_url", lambda *a, **k: "http://d")
+    client = make_client(lambda url, headers=None, params=None: StreamResponse('[{"indicativo": "8025"'),
+                         cache=MemoryCache())
+    assert get_observed_all_raw(datetime.date(2025, 5, 3), "apikey", client=client, station_codes=["8025"]) is None
+    assert client.cache.entries == {}
@@ -0,0 +1,56 @@
+import datetime
+from unittest.mock import Mock
+import gaps
+
+def day(n):
+    return datetime.date(2025, 3, 1) + datetime.timedelta(days=n)
+
+def test_plan_repoll_groups_days_of_a_station_into_one_window():
+    # Several gap days of one station cost a single range request
+    queue = [(1, "8025", day(10), 0), (1, "8025", day(2), 0), (2, "7178I", day(5), 0)]
+    requests = gaps.plan_repoll(queue, budget=10, max_days=180)
+    assert requests == [
+        gaps.RepollRequest(1, "8025", day(2), day(10), {day(2), day(10)}),
+        gaps.RepollRequest(2, "7178I", day(5), day(5), {day(5)}),
+    ]
+
+def test_plan_repoll_splits_windows_longer_than_the_endpoint_allows():
+    queue = [(1, "8025", day(0), 0), (1, "8025", day(3), 0), (1, "8025", day(4), 0)]
+    requests = gaps.plan_repoll(queue, budget=10, max_days=3)
+    assert [(r.start, r.end) for r in requests] == [(day(0), day(0)), (day(3), day(4))]
+
+def test_plan_repoll_respects_budget_and_priority_order():
+    # The first municipalities in the queue get the budget
+    queue = [(3, "C", day(9), 0), (1, "A", day(8), 0), (2, "B", day(7), 1)]
+    requests = gaps.plan_repoll(queue, budget=2, max_days=180)
+    assert [r.municipality_id for r in requests] == [3, 1]
+
+def test_plan_repoll_empty_queue():
+    assert gaps.plan_repoll([], budget=5, max_days=180) == []
+
+def test_scan_observed_gaps_uses_calendar_and_resolves_filled():
+    # One INSERT over generate_series, then removal of gaps filled since
+    cursor = Mock()
+    cursor.rowcount = 4
+    assert gaps.scan_observed_gaps(cursor, day(0), day(30)) == 4
+    (insert_sql, params), _ = cursor.execute.call_args_list[0]
+    assert "generate_series" in insert_sql
+    assert "ON CONFLICT (municipality_id, date) DO NOTHING" in insert_sql
+    assert params == (day(0), day(30))
+    delete_sql = cursor.execute.call_args_list[1][0][0]
+    assert "DELETE FROM observed_gaps" in delete_sql
+
+def test_next_gaps_orders_by_attempts_then_newest():
+    cursor = Mock()
+    cursor.fetchall.return_value = [(1, "8025", day(9), 0)]
+    assert gaps.next_gaps(cursor, max_attempts=8) == [(1, "8025", day(9), 0)]
+    sql, params = cursor.execute.call_args[0]
+    assert "ORDER BY g.attempts, g.date DESC" in sql
+    assert params == (8,)
+
+def test_record_attempts_covers_every_polled_day():
+    cursor = Mock()
+    gaps.record_attempts(cursor, [gaps.RepollRequest(1, "8025", day(2), day(3), {day(2), day(3)})])
+    _, (ids, dates) = cursor.execute.call_args[0]
+    assert ids == [1, 1]
+    assert sorted(dates) == [day(2), day(3)]
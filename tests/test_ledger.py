@@ -0,0 +1,58 @@
+import datetime
+from unittest.mock import Mock
+import ledger
+
+RUN_DATE = datetime.date(2025, 6, 1)
+
+def test_start_run_registers_every_kind(monkeypatch):
+    # A fresh run resets existing entries to pending; a resumed run leaves them alone
+    calls = []
+    monkeypatch.setattr(ledger, "execute_values", lambda cur, q, rows, **k: calls.append((q, rows)))
+    ledger.start_run(Mock(), RUN_DATE, {1: ledger.KINDS, 2: ["observed"]})
+    ledger.start_run(Mock(), RUN_DATE, {1: ledger.KINDS}, reset=False)
+
+    (fresh_q, rows), (resume_q, _) = calls
+    assert rows == [
+        (RUN_DATE, 1, "forecast", "pending"),
+        (RUN_DATE, 1, "observed", "pending"),
+        (RUN_DATE, 2, "observed", "pending"),
+    ]
+    assert "DO UPDATE SET status = EXCLUDED.status" in fresh_q
+    assert "DO NOTHING" in resume_q
+
+def test_start_run_without_work_is_noop(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ledger, "execute_values", lambda *a, **k: calls.append(a))
+    ledger.start_run(Mock(), RUN_DATE, {})
+    assert calls == []
+
+def test_pending_work_groups_kinds_by_municipality():
+    # Everything not done comes back, grouped per municipality
+    cursor = Mock()
+    cursor.fetchall.return_value = [(1, "observed"), (3, "forecast"), (3, "observed")]
+    assert ledger.pending_work(cursor, RUN_DATE) == {1: {"observed"}, 3: {"forecast", "observed"}}
+    _, params = cursor.execute.call_args[0]
+    assert params == (RUN_DATE, "done")
+
+def test_record_results_updates_in_one_statement(monkeypatch):
+    # Outcomes are applied with a single UPDATE ... FROM (VALUES ...) that bumps attempts
+    calls = []
+    monkeypatch.setattr(ledger, "execute_values", lambda cur, q, rows, **k: calls.append((q, rows)))
+    started = datetime.datetime(2025, 6, 1, 20, 0, tzinfo=datetime.timezone.utc)
+    finished = started + datetime.timedelta(seconds=3)
+    ledger.record_results(Mock(), RUN_DATE, [
+        (1, "forecast", ledger.DONE, started, finished, None),
+        (1, "observed", ledger.FAILED, started, finished, "no data"),
+    ])
+
+    (q, rows), = calls
+    assert "attempts = l.attempts + 1" in q
+    assert rows == [
+        (RUN_DATE, 1, "forecast", "done", started, finished, None),
+        (RUN_DATE, 1, "observed", "failed", started, finished, "no data"),
+    ]
+
+def test_summarize_counts_by_kind_and_status():
+    cursor = Mock()
+    cursor.fetchall.return_value = [("forecast", "done", 40), ("forecast", "failed", 3)]
+    assert ledger.summarize(cursor, RUN_DATE) == {("forecast", "done"): 40, ("forecast", "failed"): 3}
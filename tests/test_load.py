@@ -1,10 +1,12 @@
 import json
+from datetime import date, datetime
 from unittest.mock import Mock
 import load
 
 def test_load_observed_data_calls_execute_with_correct_parameters():
     # Prepare a fake cursor and sample data dict
     cursor = Mock()
+    cursor.fetchall.return_value = []  # The partition already exists
     data = {
         'temperature_avg': 20.5,
         'temperature_max': 25.0,
@@ -22,7 +24,7 @@ def test_load_observed_data_calls_execute_with_correct_parameters():
 
     # Expected SQL with placeholders matching order of params
     expected_query = """
-    INSERT INTO weather_records (
+    INSERT INTO weather_observations (
       municipality_id,
       date,
       temperature_observed_avg,
@@ -41,7 +43,24 @@ def test_load_observed_data_calls_execute_with_correct_parameters():
         humidity_observed_avg = EXCLUDED.humidity_observed_avg,
         humidity_observed_max = EXCLUDED.humidity_observed_max,
         humidity_observed_min = EXCLUDED.humidity_observed_min,
-        precipitation = EXCLUDED.precipitation;
+        precipitation = EXCLUDED.precipitation
+      WHERE (
+        weather_observations.temperature_observed_avg,
+        weather_observations.temperature_observed_max,
+        weather_observations.temperature_observed_min,
+        weather_observations.humidity_observed_avg,
+        weather_observations.humidity_observed_max,
+        weather_observations.humidity_observed_min,
+        weather_observations.precipitation
+      ) IS DISTINCT FROM (
+        EXCLUDED.temperature_observed_avg,
+        EXCLUDED.temperature_observed_max,
+        EXCLUDED.temperature_observed_min,
+        EXCLUDED.humidity_observed_avg,
+        EXCLUDED.humidity_observed_max,
+        EXCLUDED.humidity_observed_min,
+        EXCLUDED.precipitation
+      );
     """
 
     executed_query, params = cursor.execute.call_args[0]
@@ -52,6 +71,7 @@ def test_load_observed_data_calls_execute_with_correct_parameters():
 def test_load_forecast_data_calls_execute_with_correct_parameters():
     # Prepare fake cursor and sample forecast data
     cursor = Mock()
+    cursor.fetchall.return_value = []  # The partition already exists
     data = {
         'municipality_id': 456,
         'date': '2025-05-04',
@@ -70,7 +90,7 @@ def test_load_forecast_data_calls_execute_with_correct_parameters():
     load.load_forecast_data(cursor, data)
 
     expected_query = """
-    INSERT INTO weather_records (
+    INSERT INTO weather_forecasts (
       municipality_id,
       date,
       temperature_forecast_max,
@@ -93,7 +113,28 @@ def test_load_forecast_data_calls_execute_with_correct_parameters():
         humidity_forecast_min = EXCLUDED.humidity_forecast_min,
         precipitations = EXCLUDED.precipitations,
         prob_precipitation = EXCLUDED.prob_precipitation,
-        prob_storm = EXCLUDED.prob_storm;
+        prob_storm = EXCLUDED.prob_storm
+      WHERE (
+        weather_forecasts.temperature_forecast_max,
+        weather_forecasts.temperature_forecast_min,
+        weather_forecasts.temperature_forecast_avg,
+        weather_forecasts.humidity_forecast_avg,
+        weather_forecasts.humidity_forecast_max,
+        weather_forecasts.humidity_forecast_min,
+        weather_forecasts.precipitations,
+        weather_forecasts.prob_precipitation,
+        weather_forecasts.prob_storm
+      ) IS DISTINCT FROM (
+        EXCLUDED.temperature_forecast_max,
+        EXCLUDED.temperature_forecast_min,
+        EXCLUDED.temperature_forecast_avg,
+        EXCLUDED.humidity_forecast_avg,
+        EXCLUDED.humidity_forecast_max,
+        EXCLUDED.humidity_forecast_min,
+        EXCLUDED.precipitations,
+        EXCLUDED.prob_precipitation,
+        EXCLUDED.prob_storm
+      );
     """
 
     executed_query, params = cursor.execute.call_args[0]
@@ -110,3 +151,182 @@ def test_load_forecast_data_calls_execute_with_correct_parameters():
         json.dumps(data['prob_precipitation']),
         json.dumps(data['prob_storm'])
     )
+
+def test_load_observed_batch_sends_all_rows_in_one_statement(monkeypatch):
+    # All records go through a single execute_values call, in load_observed_data's column order
+    calls = []
+    monkeypatch.setattr(load, "execute_values", lambda cur, q, rows: calls.append((cur, q, rows)))
+    cursor = Mock()
+    cursor.fetchall.return_value = []  # The partition already exists
+    records = [
+        {'municipality_id': 1, 'date': '2025-01-01', 'temperature_avg': 10, 'temperature_max': 15,
+         'temperature_min': 5, 'humidity_avg': 70, 'humidity_max': 90, 'humidity_min': 50,
+         'precipitation': 0.0},
+        {'municipality_id': 1, 'date': '2025-01-02', 'temperature_avg': 11, 'temperature_max': 16,
+         'temperature_min': 6, 'humidity_avg': 71, 'humidity_max': 91, 'humidity_min': 51,
+         'precipitation': 1.2},
+    ]
+
+    load.load_observed_batch(cursor, records)
+
+    assert len(calls) == 1
+    _, query, rows = calls[0]
+    assert "VALUES %s" in query
+    assert "ON CONFLICT (municipality_id, date) DO UPDATE" in query
+    assert rows == [
+        (1, '2025-01-01', 10, 15, 5, 70, 90, 50, 0.0),
+        (1, '2025-01-02', 11, 16, 6, 71, 91, 51, 1.2),
+    ]
+
+def test_load_observed_batch_empty_is_noop(monkeypatch):
+    # Nothing to load means no statement at all
+    calls = []
+    monkeypatch.setattr(load, "execute_values", lambda *a: calls.append(a))
+    load.load_observed_batch(Mock(), [])
+    assert calls == []
+
+def test_bulk_load_records_copies_then_upserts_each_table():
+    # Valid records are streamed with one COPY, then each kind is upserted into its own table
+    cursor = Mock()
+    cursor.fetchall.return_value = []  # No unknown municipalities
+    cursor.rowcount = 1
+    copied = {}
+    cursor.copy_expert.side_effect = lambda sql, buf: copied.update(sql=sql, body=buf.read())
+
+    forecast = {
+        'municipality_id': 1, 'date': '2025-05-04', 'temperature_max': 30.0, 'temperature_min': 20.0,
+        'temperature_avg': 25, 'humidity_avg': 55, 'humidity_max': 70, 'humidity_min': 40,
+        'precipitations': [{'value': '0', 'periodo': '07'}], 'prob_precipitation': [], 'prob_storm': None
+    }
+    observed = {
+        'municipality_id': 2, 'date': '2025-04-28', 'temperature_avg': 20, 'temperature_max': 25,
+        'temperature_min': 15, 'humidity_avg': 60, 'humidity_max': 80, 'humidity_min': 40,
+        'precipitation': 1.5
+    }
+
+    report = load.bulk_load_records(cursor, [forecast], [observed])
+
+    assert report == {'staged': 2, 'merged': 2, 'rejected': []}
+    assert copied['sql'].startswith("COPY weather_records_staging (seq, kind, municipality_id, date,")
+    lines = copied['body'].splitlines()
+    assert lines[0].startswith('0,forecast,1,2025-05-04,25,30.0,20.0,55,70,40,')
+    # JSONB values are serialized and CSV-quoted; missing values become empty (NULL) fields
+    assert '"[{""value"": ""0"", ""periodo"": ""07""}]",[],,' in lines[0]
+    assert lines[1] == '1,observed,2,2025-04-28,,,,,,,,,,20,25,15,60,80,40,1.5'
+
+    statements = [c[0][0] for c in cursor.execute.call_args_list]
+    forecasts, observations = statements[-2:]
+    assert 'INSERT INTO weather_forecasts' in forecasts and "WHERE kind = 'forecast'" in forecasts
+    assert 'INSERT INTO weather_observations' in observations and "WHERE kind = 'observed'" in observations
+    # Unchanged rows are not rewritten
+    assert 'IS DISTINCT FROM (EXCLUDED.temperature_observed_avg' in observations
+    assert 'prob_storm' not in observations
+
+def test_bulk_load_records_reports_rejections():
+    # Bad keys are rejected before COPY; unknown municipalities are rejected by the staging check
+    cursor = Mock()
+    cursor.fetchall.return_value = [(1,)]  # seq 1 points at an unknown municipality
+    cursor.rowcount = 1
+    good = {'municipality_id': 1, 'date': '2025-04-28', 'precipitation': 0.0}
+    unknown = {'municipality_id': 999, 'date': '2025-04-28', 'precipitation': 0.0}
+    bad_date = {'municipality_id': 1, 'date': '28/04/2025'}
+    bad_id = {'municipality_id': None, 'date': '2025-04-28'}
+
+    report = load.bulk_load_records(cursor, [], [good, unknown, bad_date, bad_id])
+
+    assert report['staged'] == 2
+    reasons = {r['municipality_id']: reason for r, reason in report['rejected']}
+    assert reasons == {
+        999: "unknown municipality_id",
+        1: "invalid date '28/04/2025'",
+        None: "invalid municipality_id None",
+    }
+
+def test_bulk_load_records_nothing_to_load():
+    # No valid rows: no SQL at all
+    cursor = Mock()
+    report = load.bulk_load_records(cursor, [], [])
+    assert report == {'staged': 0, 'merged': 0, 'rejected': []}
+    cursor.execute.assert_not_called()
+
+def test_partition_for_bounds():
+    # weather_observations is partitioned by year, forecast_hourly by month
+    assert load.partition_for('forecast_hourly', '2025-12-31') == (
+        'forecast_hourly_2025_12', date(2025, 12, 1), date(2026, 1, 1))
+    assert load.partition_for('forecast_hourly', datetime(2025, 3, 9, 20)) == (
+        'forecast_hourly_2025_03', date(2025, 3, 1), date(2025, 4, 1))
+    assert load.partition_for('weather_observations', date(2025, 3, 9)) == (
+        'weather_observations_2025', date(2025, 1, 1), date(2026, 1, 1))
+
+def test_upcoming_partitions_and_retention_cutoff():
+    today = date(2025, 11, 20)
+    assert load.upcoming_partitions('forecast_hourly', today, 2) == [
+        date(2025, 11, 1), date(2025, 12, 1), date(2026, 1, 1)]
+    assert load.upcoming_partitions('weather_observations', today, 1) == [date(2025, 1, 1), date(2026, 1, 1)]
+    # Keeping 3 partitions: the current one and the two before it
+    assert load.retention_cutoff('forecast_hourly', today, 3) == date(2025, 9, 1)
+    assert load.retention_cutoff('weather_observations', today, 1) == date(2025, 1, 1)
+
+def test_ensure_partitions_locks_only_when_a_partition_is_missing():
+    # Existing partitions need one lookup and no lock
+    cursor = Mock()
+    cursor.fetchall.return_value = []
+    assert load.ensure_partitions(cursor, 'weather_observations', ['2025-03-01', '2026-01-01']) == [
+        'weather_observations_2025', 'weather_observations_2026']
+    assert cursor.execute.call_count == 1
+
+    # A missing one is created under the advisory lock, and only that one
+    cursor = Mock()
+    cursor.fetchall.return_value = [('weather_observations_2026',)]
+    load.ensure_partitions(cursor, 'weather_observations', ['2025-03-01', '2026-01-01'])
+    statements = [c[0][0] for c in cursor.execute.call_args_list]
+    assert 'pg_advisory_xact_lock' in statements[1]
+    assert len(statements) == 3 and 'weather_observations_2026 PARTITION OF' in statements[2]
+
+def test_drop_partitions_before_only_drops_fully_expired_ones():
+    cursor = Mock()
+    cursor.fetchall.return_value = [
+        ('weather_observations_2024', "FOR VALUES FROM ('2024-01-01') TO ('2025-01-01')"),
+        ('weather_observations_2023', "FOR VALUES FROM ('2023-01-01') TO ('2024-01-01')"),
+        ('weather_observations_2025', "FOR VALUES FROM ('2025-01-01') TO ('2026-01-01')"),
+        ('weather_observations_default', "DEFAULT"),
+    ]
+
+    dropped = load.drop_partitions_before(cursor, 'weather_observations', date(2025, 1, 1))
+
+    assert dropped == ['weather_observations_2023', 'weather_observations_2024']
+    statements = [c[0][0] for c in cursor.execute.call_args_list]
+    assert statements[1:] == ['DROP TABLE weather_observations_2023;', 'DROP TABLE weather_observations_2024;']
+
+def test_bulk_load_forecast_hourly_creates_partitions_then_copies():
+    # One CREATE per month touched, one COPY and one upsert
+    cursor = Mock()
+    cursor.fetchall.return_value = [('forecast_hourly_2025_05',), ('forecast_hourly_2025_06',)]  # Both missing
+    cursor.rowcount = 3
+    copied = {}
+    cursor.copy_expert.side_effect = lambda sql, buf: copied.update(sql=sql, body=buf.read())
+    records = [
+        {'municipality_id': 1, 'date': '2025-05-31', 'hour': 23, 'temperature': 20.5,
+         'humidity': 60.0, 'precipitation': None, 'prob_precipitation': 10, 'prob_storm': 0},
+        {'municipality_id': 1, 'date': '2025-06-01', 'hour': 0, 'temperature': 19.0,
+         'humidity': 65.0, 'precipitation': 0.2, 'prob_precipitation': None, 'prob_storm': None},
+        {'municipality_id': 2, 'date': date(2025, 6, 1), 'hour': 0, 'temperature': 18.0,
+         'humidity': 70.0, 'precipitation': 0.0, 'prob_precipitation': None, 'prob_storm': None},
+    ]
+
+    assert load.bulk_load_forecast_hourly(cursor, records) == 3
+
+    statements = [c[0][0] for c in cursor.execute.call_args_list]
+    created = [q for q in statements if 'PARTITION OF forecast_hourly' in q]
+    assert len(created) == 2
+    assert 'forecast_hourly_2025_05' in created[0] and 'forecast_hourly_2025_06' in created[1]
+    assert copied['body'].splitlines()[0] == '0,1,2025-05-31,23,20.5,60.0,,10,0'
+    assert copied['body'].splitlines()[2].startswith('2,2,2025-06-01,0,')
+    assert 'ON CONFLICT (municipality_id, date, hour)' in statements[-1]
+    # Unchanged rows are not rewritten
+    assert 'IS DISTINCT FROM (EXCLUDED.temperature, EXCLUDED.humidity' in statements[-1]
+
+def test_bulk_load_forecast_hourly_nothing_to_load():
+    cursor = Mock()
+    assert load.bulk_load_forecast_hourly(cursor, []) == 0
+    cursor.execute.assert_not_called()
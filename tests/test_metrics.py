@@ -0,0 +1,56 @@
+import json
+import time
+from metrics import Histogram, Metrics
+
+def test_histogram_buckets_and_quantile():
+    # Observations land in the first bucket whose bound contains them
+    h = Histogram(buckets=(1, 2, float('inf')))
+    for value in (0.5, 0.5, 1.5, 10):
+        h.observe(value)
+    assert h.counts == [2, 1, 1]
+    assert h.count == 4
+    assert h.sum == 12.5
+    # Median falls at the top of the first bucket; p99 in the +Inf bucket reports its lower bound
+    assert h.quantile(0.5) == 1
+    assert h.quantile(0.99) == 2
+
+def test_empty_histogram_has_no_quantile():
+    assert Histogram().quantile(0.5) is None
+
+def test_prometheus_text_format():
+    # Histograms are cumulative, with _sum and _count, labels quoted
+    m = Metrics()
+    m.observe_http('forecast', 200, 0.2, 1024)
+    m.observe_http('forecast', 200, 3, 2048)
+    m.inc_retry('datos')
+    m.add_rows('load_forecast', 12)
+    text = m.to_prometheus()
+    assert '# TYPE aemet_http_request_duration_seconds histogram' in text
+    assert 'aemet_http_request_duration_seconds_bucket{endpoint="forecast",status="200",le="0.25"} 1' in text
+    assert 'aemet_http_request_duration_seconds_bucket{endpoint="forecast",status="200",le="+Inf"} 2' in text
+    assert 'aemet_http_request_duration_seconds_count{endpoint="forecast",status="200"} 2' in text
+    assert 'aemet_http_response_bytes_total{endpoint="forecast"} 3072' in text
+    assert 'aemet_http_retries_total{endpoint="datos"} 1' in text
+    assert 'pipeline_rows_upserted_total{stage="load_forecast"} 12' in text
+
+def test_timer_records_stage_even_on_error():
+    # A failing block is still timed
+    m = Metrics()
+    try:
+        with m.timer('load'):
+            raise ValueError('boom')
+    except ValueError:
+        pass
+    with m.timer('load'):
+        time.sleep(0.001)
+    assert m.stage_latency['load'].count == 2
+
+def test_write_creates_prom_and_json(tmp_path):
+    m = Metrics()
+    m.observe_http('observed_all', 429, 0.1)
+    m.observe_stage('transform_forecast', 0.01)
+    m.write(tmp_path)
+    assert (tmp_path / 'metrics.prom').read_text().startswith('# HELP')
+    summary = json.loads((tmp_path / 'metrics.json').read_text())
+    assert summary['http']['observed_all 429']['count'] == 1
+    assert summary['stages']['transform_forecast']['count'] == 1
@@ -0,0 +1,26 @@
+# pipeline.py uses relative imports, so it is imported through the src package
+from src import pipeline
+
+def test_get_pool_is_created_once(monkeypatch):
+    created = []
+
+    def fake_pool(**kwargs):
+        created.append(kwargs)
+        return object()
+
+    monkeypatch.setattr(pipeline, '_pool', None)
+    monkeypatch.setattr(pipeline, 'ConnectionPool', fake_pool)
+    monkeypatch.setattr(pipeline, 'read_db_config', lambda: ('weather', 'user', 'pwd', 'localhost', '5432'))
+    monkeypatch.setattr(pipeline, 'read_pool_config', lambda: {'minconn': 1, 'maxconn': 2})
+
+    pool = pipeline.get_pool()
+    assert pipeline.get_pool() is pool
+    assert created == [{'dbname': 'weather', 'user': 'user', 'password': 'pwd', 'host': 'localhost',
+                        'port': '5432', 'minconn': 1, 'maxconn': 2}]
+
+def test_archive_safely_logs_instead_of_raising(caplog):
+    def put(*args):
+        raise OSError("No space left on device")
+
+    pipeline.archive_safely(put, [{'fecha': '2025-03-01'}], 3)
+    assert "No space left on device" in caplog.text
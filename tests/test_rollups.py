@@ -0,0 +1,27 @@
+from unittest.mock import Mock
+import rollups
+
+def test_update_rollups_refreshes_each_level_once():
+    # Months from days, hydrological years from months, then provinces, all under one lock
+    cursor = Mock()
+    cursor.rowcount = 2
+    months = rollups.update_rollups(cursor, [(3, '2024-09-30'), (3, '2024-10-01'), (3, '2024-10-01')])
+
+    assert months == 2
+    statements = [c[0] for c in cursor.execute.call_args_list]
+    assert "pg_advisory_xact_lock" in statements[0][0]
+    monthly, yearly, provinces = statements[1:]
+    assert monthly[1] == ([3, 3], ['2024-09-30', '2024-10-01'])
+    assert 'JOIN weather_observations w' in monthly[0]
+    assert "'hydro_year'" in yearly[0] and 'JOIN municipality_rollups r' in yearly[0]
+    assert 'INSERT INTO province_rollups' in provinces[0]
+
+def test_hydrological_year_starts_in_october():
+    # The SQL expression shifts October to January before truncating to the year
+    expression = rollups.HYDRO_YEAR_START.format(d='d')
+    assert expression == "(date_trunc('year', d + interval '3 months') - interval '3 months')::date"
+
+def test_update_rollups_nothing_to_do():
+    cursor = Mock()
+    assert rollups.update_rollups(cursor, []) == 0
+    cursor.execute.assert_not_called()
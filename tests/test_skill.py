@@ -0,0 +1,31 @@
+from unittest.mock import Mock
+import skill
+
+def test_rolling_columns_cover_every_variable_and_window():
+    columns = skill.rolling_columns()
+    assert len(columns) == len(skill.ROLLING_COLUMNS) * len(skill.WINDOWS) * 2
+    assert 'temperature_max_mae_7d' in columns
+    assert 'humidity_avg_bias_30d' in columns
+
+def test_update_forecast_errors_upserts_then_refreshes_windows():
+    # Duplicate keys collapse; dates are passed as ISO strings whatever their type
+    cursor = Mock()
+    cursor.rowcount = 2
+    written = skill.update_forecast_errors(cursor, [(3, '2025-05-04'), (3, '2025-05-04'), (1, '2025-05-03')])
+
+    assert written == 2
+    (upsert, upsert_params), (rolling, rolling_params) = [c[0] for c in cursor.execute.call_args_list]
+    assert upsert_params == ([1, 3], ['2025-05-03', '2025-05-04'])
+    assert 'o.temperature_observed_max - f.temperature_forecast_max' in upsert
+    assert 'JOIN weather_forecasts f' in upsert
+    assert 'ON CONFLICT (municipality_id, date) DO UPDATE' in upsert
+    # Rolling windows are calendar ranges, and reach as far ahead as the longest window
+    assert "RANGE BETWEEN INTERVAL '6 days' PRECEDING AND CURRENT ROW" in rolling
+    assert "RANGE BETWEEN INTERVAL '29 days' PRECEDING AND CURRENT ROW" in rolling
+    assert 't.last_day + 29' in rolling
+    assert rolling_params == upsert_params
+
+def test_update_forecast_errors_nothing_to_do():
+    cursor = Mock()
+    assert skill.update_forecast_errors(cursor, []) == 0
+    cursor.execute.assert_not_called()
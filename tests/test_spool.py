@@ -0,0 +1,53 @@
+from datetime import date
+from unittest.mock import patch
+import pytest
+import spool
+from spool import Spool
+
+def test_records_round_trip_once_closed(tmp_path):
+    # The file keeps its .part suffix (invisible to flushes) until the run closes it
+    s = Spool(tmp_path, date(2026, 10, 18))
+    s.append('forecast', [{'municipality_id': 1, 'date': '2026-10-19', 'prob_storm': [{'value': '10'}]}])
+    s.append('observed', [{'municipality_id': 1, 'date': date(2026, 10, 12), 'precipitation': 0.4}])
+    assert spool.spool_files(tmp_path) == []
+    assert spool.unfinished_files(tmp_path) == [s.path]
+
+    path = s.close()
+    assert spool.spool_files(tmp_path) == [path] and spool.unfinished_files(tmp_path) == []
+    assert s.records == 2
+    runs = spool.read_spool(path)
+    assert list(runs) == ['2026-10-18']
+    assert runs['2026-10-18']['forecast'][0]['prob_storm'] == [{'value': '10'}]
+    # Dates are written as ISO strings, which the loaders accept
+    assert runs['2026-10-18']['observed'] == [{'municipality_id': 1, 'date': '2026-10-12', 'precipitation': 0.4}]
+    assert runs['2026-10-18']['hourly'] == []
+
+def test_one_fsync_per_batch(tmp_path):
+    s = Spool(tmp_path, '2026-10-18')
+    with patch.object(spool.os, 'fsync') as fsync:
+        s.append('hourly', [{'municipality_id': 1, 'hour': hour} for hour in range(24)])
+        s.append('hourly', [])
+    assert fsync.call_count == 1
+    s.close()
+
+def test_nothing_spooled_leaves_no_file(tmp_path):
+    s = Spool(tmp_path, '2026-10-18')
+    assert s.close() is None
+    assert list(tmp_path.iterdir()) == []
+
+def test_torn_last_line_is_skipped(tmp_path):
+    s = Spool(tmp_path, '2026-10-18')
+    s.append('forecast', [{'municipality_id': 1, 'date': '2026-10-19'}])
+    path = s.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"kind": "forecast", "run_da')
+    assert len(spool.read_spool(path)['2026-10-18']['forecast']) == 1
+
+def test_unknown_kind_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        Spool(tmp_path, '2026-10-18').append('observed_all', [{}])
+
+def test_municipalities_snapshot(tmp_path):
+    assert spool.load_municipalities(tmp_path) is None
+    spool.save_municipalities(tmp_path, [(1, '03014', '8025'), (2, '30030', '7178I')])
+    assert spool.load_municipalities(tmp_path) == [(1, '03014', '8025'), (2, '30030', '7178I')]
@@ -0,0 +1,89 @@
+import threading
+import time
+import stages
+
+def test_run_stages_moves_every_item_through_all_stages():
+    # Each item is extracted, transformed and loaded exactly once
+    loaded = []
+    failures = stages.run_stages(
+        range(10),
+        extract=lambda item: item * 10,
+        transform=lambda item, raw: raw + 1,
+        load=loaded.extend,
+        workers=3,
+        queue_size=2,
+        batch_size=4,
+    )
+    assert failures == []
+    assert sorted(loaded) == [(i, i * 10 + 1) for i in range(10)]
+
+def test_run_stages_batches_loads():
+    # The loader receives batches of at most batch_size items, plus a final partial one
+    batches = []
+    stages.run_stages(range(7), lambda i: i, lambda i, raw: raw, batches.append, workers=2, batch_size=3)
+    assert [len(b) for b in batches] == [3, 3, 1]
+
+def test_run_stages_routes_poisoned_items_to_failure_channel():
+    # Failing items are reported with their stage while the rest keep flowing
+    def extract(item):
+        if item == 2:
+            raise ValueError("boom")
+        return item
+
+    def transform(item, raw):
+        if item == 5:
+            raise KeyError("bad payload")
+        return raw
+
+    def load(batch):
+        if any(item == 8 for item, _ in batch):
+            raise RuntimeError("db down")
+        loaded.extend(batch)
+
+    loaded = []
+    failures = stages.run_stages(range(10), extract, transform, load, workers=2, batch_size=1)
+
+    assert {(f.item, f.stage) for f in failures} == {(2, 'extract'), (5, 'transform'), (8, 'load')}
+    assert sorted(item for item, _ in loaded) == [0, 1, 3, 4, 6, 7, 9]
+
+def test_run_stages_applies_backpressure():
+    # With a slow loader, extractors may run ahead only as far as the bounded queues allow
+    extracted = []
+    lock = threading.Lock()
+    max_ahead = [0]
+    loaded_count = [0]
+
+    def extract(item):
+        with lock:
+            extracted.append(item)
+            max_ahead[0] = max(max_ahead[0], len(extracted) - loaded_count[0])
+        return item
+
+    def load(batch):
+        time.sleep(0.01)
+        with lock:
+            loaded_count[0] += len(batch)
+
+    stages.run_stages(range(40), extract, lambda i, raw: raw, load, workers=2, queue_size=2, batch_size=1)
+
+    # transform queue + load queue + one item in each thread (2 extractors, transformer, loader batch)
+    assert loaded_count[0] == 40
+    assert max_ahead[0] <= 2 + 2 + 2 + 1 + 1
+
+def test_run_stages_with_several_loaders():
+    # Every item is loaded exactly once, by more than one loader thread
+    loaded = []
+    threads = set()
+    lock = threading.Lock()
+
+    def load(batch):
+        time.sleep(0.01)
+        with lock:
+            loaded.extend(batch)
+            threads.add(threading.current_thread().name)
+
+    failures = stages.run_stages(range(20), lambda i: i, lambda i, raw: raw, load,
+                                 workers=2, batch_size=2, loaders=3)
+    assert failures == []
+    assert sorted(item for item, _ in loaded) == list(range(20))
+    assert len(threads) > 1
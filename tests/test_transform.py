@@ -96,3 +96,115 @@ def test_transform_forecast_correct_values():
     assert out['prob_storm'] == [{'value': '5'}]
 
     assert out['municipality_id'] == 123
+
+def test_index_by_station_groups_records():
+    # Records are grouped by 'indicativo'; entries without one are ignored
+    raw = [
+        {'indicativo': '8025', 'fecha': '2025-05-03'},
+        {'indicativo': '7178I', 'fecha': '2025-05-03'},
+        {'indicativo': '8025', 'fecha': '2025-05-04'},
+        {'nombre': 'SIN CODIGO'},
+    ]
+    index = transform.index_by_station(raw)
+    assert set(index) == {'8025', '7178I'}
+    assert [r['fecha'] for r in index['8025']] == ['2025-05-03', '2025-05-04']
+    assert transform.index_by_station(None) == {}
+
+def test_transform_observed_bulk_fans_out_to_municipalities():
+    # Every municipality gets its station's values; shared stations are reused, missing ones skipped
+    raw = [
+        {'indicativo': '8025', 'prec': '0,0', 'tmed': '20,4', 'tmax': '25,1', 'tmin': '15,0',
+         'hrMedia': '60', 'hrMax': '80', 'hrMin': '40'},
+        {'indicativo': '2885K', 'prec': '1,0'},
+    ]
+    municipalities = [(1, '8025'), (2, '8025'), (3, '7178I')]
+    out = transform.transform_observed_bulk(raw, municipalities, date(2025, 5, 3))
+    assert set(out) == {1, 2}
+    assert out[1]['temperature_avg'] == 20
+    assert out[2]['municipality_id'] == 2
+    assert out[2]['date'] == '2025-05-03'
+
+def test_transform_observed_range_one_record_per_day():
+    # Each payload entry becomes a record dated from its own 'fecha'
+    raw = [
+        {'fecha': '2025-01-01', 'prec': '0,2', 'tmed': '9,6', 'hrMedia': '70'},
+        {'fecha': '2025-01-02', 'prec': 'Ip', 'tmed': '11,4', 'hrMedia': '65'},
+        {'prec': '3,0'},
+    ]
+    out = transform.transform_observed_range(raw, municipality_id=7)
+    assert [r['date'] for r in out] == ['2025-01-01', '2025-01-02']
+    assert out[0]['precipitation'] == 0.2
+    assert out[1]['precipitation'] is None
+    assert out[1]['temperature_avg'] == 11
+    assert all(r['municipality_id'] == 7 for r in out)
+    assert transform.transform_observed_range(None, municipality_id=7) == []
+
+def test_transform_observed_range_skips_malformed_fecha(caplog):
+    # A bad date drops that day only, with a warning, instead of the whole station batch
+    data = [
+        {'fecha': '2025-01-01', 'tmed': '9,6'},
+        {'fecha': '2025-13-45', 'tmed': '10,0'},
+        {'fecha': 20250103, 'tmed': '10,0'},
+        {'fecha': '2025-01-04', 'tmed': '11,4'},
+    ]
+    records = transform.transform_observed_range(data, municipality_id=7)
+    assert [r['date'] for r in records] == ['2025-01-01', '2025-01-04']
+    assert "malformed fecha '2025-13-45'" in caplog.text
+
+def test_transform_forecast_date_comes_from_payload():
+    # The forecast day's 'fecha' wins over the clock, so archived payloads reprocess identically
+    data = [{'prediccion': {'dia': [
+        {'fecha': '2025-06-01T00:00:00'},
+        {'fecha': '2025-06-02T00:00:00', 'temperatura': [{'value': '20'}], 'humedadRelativa': []},
+    ]}}]
+    assert transform.transform_forecast(data, municipality_id=1)['date'] == '2025-06-02'
+
+def test_daily_and_hourly_forecasts_share_the_date():
+    # Both tables take the day from the same helper, with or without 'fecha'
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    assert transform.forecast_date({'fecha': '2025-06-02T00:00:00'}) == '2025-06-02'
+    assert transform.forecast_date({}) == tomorrow
+    data = [{'prediccion': {'dia': [{}, {'temperatura': [{'value': '20', 'periodo': '07'}]}]}}]
+    assert transform.transform_forecast(data, municipality_id=1)['date'] == tomorrow
+    assert [r['date'] for r in transform.transform_forecast_hourly(data, municipality_id=1)] == [tomorrow]
+
+@pytest.mark.parametrize("periodo, expected", [
+    ('07', [7]),
+    ('0208', [2, 3, 4, 5, 6, 7]),
+    ('2002', [20, 21, 22, 23]),
+    ('', []),
+    (None, []),
+])
+def test_period_hours(periodo, expected):
+    assert transform.period_hours(periodo) == expected
+
+def test_transform_forecast_hourly_one_typed_record_per_hour():
+    # Hourly series map to their hour; period probabilities to every hour of the period
+    data = [{'prediccion': {'dia': [
+        {'fecha': '2025-06-01T00:00:00'},
+        {
+            'fecha': '2025-06-02T00:00:00',
+            'temperatura': [{'value': '21', 'periodo': '07'}, {'value': '41', 'periodo': '14'}],
+            'humedadRelativa': [{'value': '80', 'periodo': '07'}],
+            'precipitacion': [{'value': 'Ip', 'periodo': '07'}, {'value': '0,4', 'periodo': '14'}],
+            'probPrecipitacion': [{'value': '10', 'periodo': '0814'}, {'value': '', 'periodo': '1420'}],
+            'probTormenta': [{'value': '5', 'periodo': '1420'}],
+        },
+    ]}}]
+    records = transform.transform_forecast_hourly(data, municipality_id=3)
+
+    by_hour = {r['hour']: r for r in records}
+    assert by_hour[7] == {
+        'municipality_id': 3, 'date': '2025-06-02', 'hour': 7, 'temperature': 21.0,
+        'humidity': 80.0, 'precipitation': None, 'prob_precipitation': None, 'prob_storm': None,
+    }
+    assert by_hour[14]['temperature'] == 41.0
+    assert by_hour[14]['precipitation'] == 0.4
+    assert by_hour[14]['prob_storm'] == 5
+    assert by_hour[14]['prob_precipitation'] is None
+    assert by_hour[9]['prob_precipitation'] == 10
+    assert [r['hour'] for r in records] == sorted(by_hour)
+
+def test_transform_forecast_hourly_invalid_input():
+    assert transform.transform_forecast_hourly(None, municipality_id=1) == []
+    assert transform.transform_forecast_hourly([{'prediccion': {'dia': [{}]}}], municipality_id=1) == []
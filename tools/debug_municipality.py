@@ -9,9 +9,9 @@ from datetime import datetime, timedelta
 
 from dotenv import load_dotenv
 
-from src.extract import get_observed_raw, get_forecast_raw
+from src.extract import AemetClient, get_observed_raw, get_forecast_raw
 from src.transform import transform_observed, transform_forecast
-from src.pipeline import get_connection
+from src.pipeline import get_pool, build_cache, report_connection_stats
 
 # Helper
 def pretty_print(obj: object):
@@ -37,14 +37,12 @@ def main():
     args = parser.parse_args()
 
     # Look up the municipality in the database to obtain its postal and station codes
-    conn, cur = get_connection()
-    cur.execute(
-        "SELECT postal_code, station_code FROM municipalities WHERE municipality_id = %s;",
-        (args.municipality_id,),
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT postal_code, station_code FROM municipalities WHERE municipality_id = %s;",
+            (args.municipality_id,),
+        )
+        row = cur.fetchone()
 
     if row is None:
         print(f"[ERROR] municipality_id {args.municipality_id} not found in table 'municipalities'.")
@@ -66,9 +64,12 @@ def main():
     )
     print(f"Target historic date: {target_date.strftime('%Y-%m-%d')}\n")
 
+    # Both fetches share one pooled keep-alive session and reuse cached payloads
+    client = AemetClient(api_key, cache=build_cache())
+
     # OBSERVED extraction
     print("=> Fetching OBSERVED …")
-    raw_observed = get_observed_raw(args.municipality_id, station_code, target_date, api_key)
+    raw_observed = get_observed_raw(args.municipality_id, station_code, target_date, api_key, client=client)
     if raw_observed is None:
         print("❌  OBSERVED fetch failed (check messages above).")
     else:
@@ -78,7 +79,7 @@ def main():
 
     # FORECAST extraction
     print("\n=> Fetching FORECAST …")
-    raw_forecast = get_forecast_raw(args.municipality_id, postal_code, api_key)
+    raw_forecast = get_forecast_raw(args.municipality_id, postal_code, api_key, client=client)
     if raw_forecast is None:
         print("❌  FORECAST fetch failed (check messages above).")
     else:
@@ -86,5 +87,9 @@ def main():
         print("Transformed record:")
         print(pretty_print(transform_forecast(raw_forecast, args.municipality_id)))
 
+    print()
+    report_connection_stats(client)
+    client.close()
+
 if __name__ == "__main__":
     main()
@@ -1,40 +1,47 @@
+"""
+Usage
+-----
+    python -m tools.get_all_stations
+"""
+import json
+import os
 import requests
 from datetime import datetime, timedelta
-import os
 from dotenv import load_dotenv
 
-def get_data_url(url):
-    """
-    Make a request to the given URL and retrieve JSON data.
-    """
-    load_dotenv()
+from src.extract import AemetClient, stream_datos
+from src.pipeline import report_connection_stats
 
-    api_key = os.getenv('API_KEY_WEATHER')
-
-    headers = {
-        "accept": "application/json",
-        "api_key": api_key
-    }
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        data = response.json()
-        if 'datos' in data:
-            return data['datos']
-        
-def fetch_and_save(url):
+def fetch_and_save(url, client, path="tools/all_stations.txt"):
     """
-    Fetch data from the URL and save it as a JSON file.
+    Stream the payload from the URL into a JSON file, one station record at a time.
     """
-    data_url = get_data_url(url)
-    if data_url:
-        response = requests.get(data_url)
-        if response.status_code == 200:
-            with open("tools/all_stations.txt", 'w', encoding='utf-8') as f:
-                f.write(response.text)
+    tmp_path = f"{path}.tmp"
+    count = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for record in stream_datos(url, None, client.api_key, "STATIONS", client=client):
+                f.write(',\n  ' if count else '\n  ')
+                json.dump(record, f, ensure_ascii=False)
+                count += 1
+            f.write('\n]\n')
+    except (requests.RequestException, ValueError) as e:
+        os.remove(tmp_path)
+        print(f"Fetch failed: {e}")
+        return
+
+    # Only replace the previous file once the whole payload has been written
+    os.replace(tmp_path, path)
+    print(f"{count} records written to {path}")
 
 if __name__ == "__main__":
 
+    load_dotenv()
+
+    # Metadata and payload calls share one pooled keep-alive session
+    client = AemetClient(os.getenv('API_KEY_WEATHER'))
+
     date = datetime.now() - timedelta(days=4)
 
     date = date.strftime('%Y-%m-%d')
@@ -43,6 +50,9 @@ if __name__ == "__main__":
     fechaFinStr = f"{date}T23:59:59UTC"
 
     # URLs for API requests
-    url= f"https://opendata.aemet.es/opendata/api/valores/climatologicos/diarios/datos/fechaini/{fechaIniStr}/fechafin/{fechaFinStr}/todasestaciones"
+    url= f"{client.base_url}/valores/climatologicos/diarios/datos/fechaini/{fechaIniStr}/fechafin/{fechaFinStr}/todasestaciones"
+
+    fetch_and_save(url, client)
 
-    fetch_and_save(url)
\ No newline at end of file
+    report_connection_stats(client)
+    client.close()
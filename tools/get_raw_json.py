@@ -11,8 +11,8 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
-from src.extract import get_observed_raw, get_forecast_raw
-from src.pipeline import get_connection
+from src.extract import AemetClient, get_observed_raw, get_forecast_raw
+from src.pipeline import get_pool, build_cache, report_connection_stats
 
 def main():
     parser = argparse.ArgumentParser(
@@ -37,14 +37,12 @@ def main():
         return
 
     # Look up the municipality in the database to obtain its postal and station codes
-    conn, cur = get_connection()
-    cur.execute(
-        "SELECT postal_code, station_code FROM municipalities WHERE municipality_id = %s;",
-        (args.municipality_id,),
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT postal_code, station_code FROM municipalities WHERE municipality_id = %s;",
+            (args.municipality_id,),
+        )
+        row = cur.fetchone()
 
     if row is None:
         print(f"[ERROR] municipality_id {args.municipality_id} not found in table 'municipalities'.")
@@ -54,8 +52,11 @@ def main():
     target_date = datetime.now() - timedelta(days=6)
     date_tag = target_date.strftime("%Y-%m-%d")
 
+    # Both fetches share one pooled keep-alive session and reuse cached payloads
+    client = AemetClient(api_key, cache=build_cache())
+
     # Fetch OBSERVED data
-    raw_observed = get_observed_raw(args.municipality_id, station_code, target_date, api_key)
+    raw_observed = get_observed_raw(args.municipality_id, station_code, target_date, api_key, client=client)
     if raw_observed is None:
         print("❌  OBSERVED fetch failed (check messages above).")
     else:
@@ -66,7 +67,7 @@ def main():
         print(f"✅  OBSERVED JSON guardado en tools/{observed_filename}")
 
     # Fetch FORECAST data
-    raw_forecast = get_forecast_raw(args.municipality_id, postal_code, api_key)
+    raw_forecast = get_forecast_raw(args.municipality_id, postal_code, api_key, client=client)
     if raw_forecast is None:
         print("❌  FORECAST fetch failed (check messages above).")
     else:
@@ -77,6 +78,9 @@ def main():
             json.dump(raw_forecast, f, ensure_ascii=False, indent=2)
         print(f"✅  FORECAST JSON guardado en tools/{forecast_filename}")
 
+    report_connection_stats(client)
+    client.close()
+
 
 if __name__ == "__main__":
     main()
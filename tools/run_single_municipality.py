@@ -17,10 +17,10 @@ from datetime import datetime, timedelta
 import logging
 
 from dotenv import load_dotenv
-from src.extract import get_observed_raw, get_forecast_raw
+from src.extract import AemetClient, get_observed_raw, get_forecast_raw
 from src.transform import transform_observed, transform_forecast
 from src.load import load_observed_data, load_forecast_data
-from src.pipeline import get_connection
+from src.pipeline import get_pool, build_cache, report_connection_stats, update_observed_aggregates
 
 def get_municipality(cur, municipality_id):
     """Fetch postal and station codes for a municipality."""
@@ -59,12 +59,11 @@ def main():
         target_date = datetime.now() - timedelta(days=6)
         run_observed, run_forecast = True, True
     
-    conn, cur = get_connection()
-    municipality = get_municipality(cur, args.municipality_id)
+    pool = get_pool()
+    with pool.connection() as conn, conn.cursor() as cur:
+        municipality = get_municipality(cur, args.municipality_id)
     if municipality is None:
         print(f"[ERROR] municipality_id {args.municipality_id} not found in 'municipalities' table.")
-        cur.close()
-        conn.close()
         return
 
     postal_code, station_code = municipality
@@ -73,23 +72,23 @@ def main():
     api_key = os.getenv("API_KEY_WEATHER")
     if not api_key:
         print("[ERROR] Environment variable API_KEY_WEATHER is not set.")
-        cur.close()
-        conn.close()
         return
     
     # Suppress error and warning logs to keep output clean
     logging.disable(logging.ERROR)
 
     # --------- Extract ---------
+    # Both calls share one pooled keep-alive session and reuse cached payloads
+    client = AemetClient(api_key, cache=build_cache())
     raw_observed = None
     raw_forecast = None
     if run_observed:
         raw_observed = get_observed_raw(
-            args.municipality_id, station_code, target_date, api_key
+            args.municipality_id, station_code, target_date, api_key, client=client
         )
     if run_forecast:
         raw_forecast = get_forecast_raw(
-            args.municipality_id, postal_code, api_key
+            args.municipality_id, postal_code, api_key, client=client
         )
 
     # --------- Transform ---------
@@ -104,26 +103,28 @@ def main():
     # --------- Load ---------
     forecast_loaded = False
     observed_loaded = False
-    if forecast_data:
-        load_forecast_data(cur, forecast_data)
-        forecast_loaded = True
-    if observed_data:
-        load_observed_data(cur, observed_data)
-        observed_loaded = True
-
-    if forecast_loaded and observed_loaded:  
-        conn.commit()
-        print("✅ Data committed to database successfully.")
-    elif forecast_loaded or observed_loaded:
-        conn.commit()
-        loaded = 'FORECAST' if forecast_loaded else 'OBSERVED'
-        missing = 'OBSERVED' if forecast_loaded else 'FORECAST'
-        print(f"⚠️  {loaded} data loaded, but {missing} data was not loaded.")
-    else:
-        print("❌ Nothing written to DB.")
-
-    cur.close()
-    conn.close()
+    with pool.connection() as conn, conn.cursor() as cur:
+        if forecast_data:
+            load_forecast_data(cur, forecast_data)
+            forecast_loaded = True
+        if observed_data:
+            load_observed_data(cur, observed_data)
+            update_observed_aggregates(cur, [observed_data])
+            observed_loaded = True
+
+        if forecast_loaded and observed_loaded:  
+            conn.commit()
+            print("✅ Data committed to database successfully.")
+        elif forecast_loaded or observed_loaded:
+            conn.commit()
+            loaded = 'FORECAST' if forecast_loaded else 'OBSERVED'
+            missing = 'OBSERVED' if forecast_loaded else 'FORECAST'
+            print(f"⚠️  {loaded} data loaded, but {missing} data was not loaded.")
+        else:
+            print("❌ Nothing written to DB.")
+
+    report_connection_stats(client)
+    client.close()
 
 if __name__ == "__main__":
     main()